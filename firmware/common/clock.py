@@ -0,0 +1,63 @@
+"""Monotonic time for the nodes: one clock interface, real or simulated.
+
+Times are integer milliseconds/microseconds from `ticks_ms()`/`ticks_us()` (small
+ints on MicroPython, so no allocation) and are only ever compared through
+`ticks_diff`, which handles the MicroPython tick wrap. Never use wall-clock time
+(`time.time()`) for intervals: it has 1 s resolution on MicroPython and jumps
+when the RTC is set.
+
+- `MONOTONIC`: time.ticks_ms/ticks_us on MicroPython, time.monotonic under CPython
+- `SimClock`: advances only when told to, so timeouts of minutes can be tested
+  in microseconds of real time
+
+Everything that measures time (safety primitives, controllers, the loop
+scheduler, the tank reader, GC instrumentation) takes a clock and defaults to
+`MONOTONIC`; a boot loop creates one clock and passes it to all of them.
+"""
+
+import time
+
+try:
+    from time import ticks_ms, ticks_us, ticks_diff, ticks_add  # type: ignore  # MicroPython
+except ImportError:
+    def ticks_ms() -> int:
+        return int(time.monotonic() * 1000)
+
+    def ticks_us() -> int:
+        return int(time.monotonic() * 1000000)
+
+    def ticks_diff(a: int, b: int) -> int:
+        return a - b
+
+    def ticks_add(t: int, delta: int) -> int:
+        return t + delta
+
+
+class MonotonicClock:
+    def ticks_ms(self) -> int:
+        return ticks_ms()
+
+    def ticks_us(self) -> int:
+        return ticks_us()
+
+
+class SimClock:
+    """Simulated time, starting at `start_ms` and moved by `advance()`/`sleep_ms()`."""
+
+    def __init__(self, start_ms: int = 0):
+        self._us = start_ms * 1000
+
+    def ticks_ms(self) -> int:
+        return self._us // 1000
+
+    def ticks_us(self) -> int:
+        return self._us
+
+    def advance(self, ms: float):
+        self._us += int(ms * 1000)
+
+    def sleep_ms(self, ms: int):
+        self.advance(ms)
+
+
+MONOTONIC = MonotonicClock()
@@ -51,13 +51,31 @@ class TankLevelConfig(NamedTuple):
 
 class BusConfig(NamedTuple):
     # Modbus/RS485 bus configuration and addresses
-    baudrate: int = 9600
+    baudrate: int = 9600  # power-up rate; the master can switch the bus to a faster one
+    baudrates: tuple = (9600, 19200, 38400, 115200)  # rates nodes accept in REG_BAUD
     addr_pump: int = 1
     addr_autofill: int = 2
     addr_boiler: int = 3
     addr_master: int = 10
 
 
+class PollConfig(NamedTuple):
+    # Master-side Modbus polling cadence (seconds) and bus budget
+    idle_period_s: float = 1.0     # node idle/ok/inhibit
+    active_period_s: float = 0.1   # status run/fill/heat: catch brew start/stop quickly
+    fault_period_s: float = 5.0    # faulted node; also the ceiling for timeout backoff
+    max_utilisation: float = 0.5   # fraction of wire time the poller may occupy
+    turnaround_s: float = 0.005    # assumed node turnaround counted against the budget
+
+
+class AdcConfig(NamedTuple):
+    # Node analog inputs: burst sampling in the HAL (median / trimmed mean + EMA, integer math)
+    burst: int = 8              # samples per burst, into a preallocated buffer
+    trim: int = 2               # drop this many lowest and highest samples; (burst - 1) // 2 = median
+    ema_shift: int = 2          # EMA over bursts, alpha = 1 / 2**shift; 0 disables
+    sample_period_ms: int = 20  # burst rate (sampling task), independent of the control period
+
+
 class Pins(NamedTuple):
     # Assign actual GPIOs during bring-up
     heater_ssr: int = 25
@@ -91,5 +109,7 @@ autofill = AutofillConfig()
 pump = PumpConfig()
 tank = TankLevelConfig()
 bus = BusConfig()
+poll = PollConfig()
+adc = AdcConfig()
 pins = Pins()
 system = System()
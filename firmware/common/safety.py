@@ -1,7 +1,7 @@
 # Safety primitives for autonomous core nodes
 # Portable subset for MicroPython and CPython (tests)
 
-import time
+from firmware.common.clock import MONOTONIC, ticks_diff
 
 
 class LatchingFault(Exception):
@@ -29,25 +29,156 @@ class FaultLatch:
 
 
 class Watchdog:
-    def __init__(self, timeout_s: float):
-        self.timeout_s = timeout_s
-        self._last_kick = time.time()
+    def __init__(self, timeout_s: float, clock=MONOTONIC):
+        self.timeout_ms = int(timeout_s * 1000)
+        self.clock = clock
+        self._last_kick = clock.ticks_ms()
+
+    @property
+    def timeout_s(self) -> float:
+        return self.timeout_ms / 1000
 
     def kick(self):
-        self._last_kick = time.time()
+        self._last_kick = self.clock.ticks_ms()
 
     def expired(self) -> bool:
-        return (time.time() - self._last_kick) > self.timeout_s
+        return ticks_diff(self.clock.ticks_ms(), self._last_kick) > self.timeout_ms
+
+
+# Rate limiting: constant time per call, fixed memory, one shared clock.
+# Methods take the caller's `now_ms` (ticks_ms) when it has one, else read the clock.
+# ticks_diff is only valid within +-2**29 ms (about 6.2 days), so a stamp left
+# alone longer would compare as recent again: call `expire()` from every control
+# tick so stamps are dropped as soon as they no longer limit anything.
 
+class MinIntervalLimiter:
+    """At least `min_interval_s` between marks (e.g. rest after a pump run)."""
+
+    def __init__(self, min_interval_s: float, clock=MONOTONIC):
+        self.min_interval_ms = int(min_interval_s * 1000)
+        self.clock = clock
+        self._marked = False
+        self._last = 0
+
+    def mark(self, now_ms=None):
+        self._last = self.clock.ticks_ms() if now_ms is None else now_ms
+        self._marked = True
+
+    def ready(self, now_ms=None) -> bool:
+        if not self._marked:
+            return True
+        now = self.clock.ticks_ms() if now_ms is None else now_ms
+        return ticks_diff(now, self._last) >= self.min_interval_ms
 
-class RateLimiter:
-    def __init__(self, min_interval_s: float):
-        self.min_interval_s = min_interval_s
-        self._last_time = 0.0
+    def expire(self, now_ms=None):
+        if self._marked and self.ready(now_ms):
+            self._marked = False
 
+    def try_acquire(self, now_ms=None) -> bool:
+        now = self.clock.ticks_ms() if now_ms is None else now_ms
+        if not self.ready(now):
+            return False
+        self.mark(now)
+        return True
+
+
+class RateLimiter(MinIntervalLimiter):
     def allow(self) -> bool:
-        now = time.time()
-        if now - self._last_time >= self.min_interval_s:
-            self._last_time = now
+        return self.try_acquire()
+
+
+class SlidingWindowCounter:
+    """At most `limit` events in any `window_s` (e.g. pump starts per minute).
+
+    Keeps the times of the last `limit` events in a ring: the window is full
+    exactly when the oldest of them is still inside it.
+    """
+
+    def __init__(self, limit: int, window_s: float, clock=MONOTONIC):
+        self.limit = limit
+        self.window_ms = int(window_s * 1000)
+        self.clock = clock
+        self._times = [0] * max(limit, 0)
+        self._n = 0
+        self._i = 0  # oldest event once the ring is full, next slot to write
+
+    def allow(self, now_ms=None) -> bool:
+        if self._n < self.limit:
             return True
-        return False
+        if self.limit <= 0:
+            return False
+        now = self.clock.ticks_ms() if now_ms is None else now_ms
+        return ticks_diff(now, self._times[self._i]) > self.window_ms
+
+    def record(self, now_ms=None):
+        if self.limit <= 0:
+            return
+        self._times[self._i] = self.clock.ticks_ms() if now_ms is None else now_ms
+        self._i = (self._i + 1) % self.limit
+        if self._n < self.limit:
+            self._n += 1
+
+    def expire(self, now_ms=None):
+        n = self._n
+        if not n:
+            return
+        now = self.clock.ticks_ms() if now_ms is None else now_ms
+        times, limit, window = self._times, self.limit, self.window_ms
+        # Drop events that left the window, oldest first
+        while n and ticks_diff(now, times[(self._i - n) % limit]) > window:
+            n -= 1
+        self._n = n
+
+    def try_acquire(self, now_ms=None) -> bool:
+        now = self.clock.ticks_ms() if now_ms is None else now_ms
+        if not self.allow(now):
+            return False
+        self.record(now)
+        return True
+
+
+class TokenBucket:
+    """`rate_per_s` tokens per second, up to `burst` saved up.
+
+    Tokens are kept in integer micro-tokens, refilled from the elapsed ms on use;
+    the sub-micro-token remainder of each refill is carried, so slow rates (one
+    token per half hour) keep their rate.
+    """
+
+    _UNIT = 1000000
+
+    def __init__(self, rate_per_s: float, burst: int, clock=MONOTONIC):
+        self.clock = clock
+        self.capacity = burst * self._UNIT
+        self._per_s = int(round(rate_per_s * self._UNIT))  # micro-tokens per second
+        self._fill_ms = -(-self.capacity * 1000 // self._per_s) if self._per_s else -1
+        self._tokens = self.capacity
+        self._rem = 0  # micro-token thousandths carried between refills
+        self._last = clock.ticks_ms()
+
+    def _refill(self, now: int):
+        elapsed = ticks_diff(now, self._last)
+        self._last = now
+        if elapsed <= 0 or self._per_s == 0:
+            return
+        if elapsed >= self._fill_ms:
+            self._tokens, self._rem = self.capacity, 0
+            return
+        q, self._rem = divmod(elapsed * self._per_s + self._rem, 1000)
+        t = self._tokens + q
+        if t >= self.capacity:
+            self._tokens, self._rem = self.capacity, 0
+        else:
+            self._tokens = t
+
+    def tokens(self, now_ms=None) -> float:
+        self._refill(self.clock.ticks_ms() if now_ms is None else now_ms)
+        return self._tokens / self._UNIT
+
+    def try_acquire(self, n: int = 1, now_ms=None) -> bool:
+        self._refill(self.clock.ticks_ms() if now_ms is None else now_ms)
+        need = n * self._UNIT
+        if self._tokens < need:
+            return False
+        self._tokens -= need
+        return True
@@ -1,25 +1,76 @@
 """Utility helpers for calibration and mapping."""
 
-from typing import List, Tuple
+from typing import List, Sequence, Tuple
+
+try:
+    import numpy as np  # optional: vectorized Linearizer.map under CPython
+except ImportError:
+    np = None
 
 
 class Linearizer:
-    """Piecewise-linear mapping built from (x, y) pairs sorted by x."""
+    """Piecewise-linear mapping built from (x, y) pairs sorted by x.
+
+    Breakpoints and per-segment slopes are precomputed. A lookup first tries the
+    segment of the previous call (slowly varying sensor inputs stay in it), then
+    binary-searches the breakpoints, so large calibration tables cost O(log n).
+    Inputs outside the table clamp to the first/last y. At a repeated x (a step)
+    the segment ending there applies, i.e. the y of the first of the repeated points.
+    """
 
     def __init__(self, points: List[Tuple[float, float]]):
         if len(points) < 2:
             raise ValueError("At least two points required")
         self.points = sorted(points, key=lambda p: p[0])
+        self.xs = [p[0] for p in self.points]
+        self.ys = [p[1] for p in self.points]
+        xs, ys = self.xs, self.ys
+        # Zero-width segments (repeated x) are never selected; slope 0 keeps them harmless
+        self.slopes = [(ys[i + 1] - ys[i]) / (xs[i + 1] - xs[i]) if xs[i + 1] != xs[i] else 0.0
+                       for i in range(len(xs) - 1)]
+        self._seg = 0  # segment of the last lookup
+        if np is not None:
+            self._np = (np.array(xs, dtype=float), np.array(ys, dtype=float), np.array(self.slopes, dtype=float))
+
+    def _segment(self, x: float) -> int:
+        """Index i with xs[i] < x <= xs[i + 1], for x strictly inside the table."""
+        xs = self.xs
+        i = self._seg
+        if xs[i] < x <= xs[i + 1]:
+            return i
+        lo, hi = 0, len(xs) - 1
+        while hi - lo > 1:
+            mid = (lo + hi) >> 1
+            if x <= xs[mid]:
+                hi = mid
+            else:
+                lo = mid
+        self._seg = lo
+        return lo
 
     def __call__(self, x: float) -> float:
-        pts = self.points
-        if x <= pts[0][0]:
-            return pts[0][1]
-        if x >= pts[-1][0]:
-            return pts[-1][1]
-        for (x0, y0), (x1, y1) in zip(pts, pts[1:]):
-            if x0 <= x <= x1:
-                # linear interpolation
-                t = (x - x0) / (x1 - x0)
-                return y0 + t * (y1 - y0)
-        return pts[-1][1]
+        xs = self.xs
+        if x <= xs[0]:
+            return self.ys[0]
+        if x >= xs[-1]:
+            return self.ys[-1]
+        i = self._segment(x)
+        return self.ys[i] + (x - xs[i]) * self.slopes[i]
+
+    def map(self, values: Sequence[float]):
+        """Map a whole sequence (calibration, log reprocessing).
+
+        With NumPy available the mapping is vectorized and a NumPy array in gives a
+        NumPy array out; otherwise, or for plain sequences without NumPy, a list is
+        returned. Both give exactly the values of calling the Linearizer per input
+        (`numpy.interp` is not used: it takes the right y at a step).
+        """
+        if np is not None:
+            xs, ys, slopes = self._np
+            v = np.asarray(values, dtype=float)
+            i = np.clip(np.searchsorted(xs, v, side="left") - 1, 0, len(xs) - 2)
+            out = ys[i] + (v - xs[i]) * slopes[i]
+            out = np.where(v <= xs[0], ys[0], np.where(v >= xs[-1], ys[-1], out))
+            return out if isinstance(values, np.ndarray) else out.tolist()
+        f = self.__call__
+        return [f(x) for x in values]
@@ -1,61 +1,77 @@
 # Autofill Controller: manages boiler level probe and fill valve interlocks
 
 from firmware.common import config
-from firmware.common.safety import FaultLatch, Watchdog
+from firmware.common.clock import MONOTONIC, ticks_diff
+from firmware.common.safety import FaultLatch, Watchdog, MinIntervalLimiter
 
 
 class AutofillController:
-    def __init__(self, hal, cfg: config.AutofillConfig = config.autofill):
+    def __init__(self, hal, cfg: config.AutofillConfig = config.autofill, clock=MONOTONIC):
         self.cfg = cfg
         self.hal = hal
         self.latch = FaultLatch()
-        self.wd = Watchdog(timeout_s=2.0)
+        self.wd = Watchdog(timeout_s=2.0, clock=clock)
+        self.state = "ok"
+        self.reason = None
+        # Limits in integer ms, so step() does no float arithmetic
+        self.refill = MinIntervalLimiter(cfg.min_refill_interval_s, clock)
+        self._timeout_ms = int(cfg.fill_timeout_s * 1000)
         self._fill_active = False
-        self._fill_start_s = 0.0
-        self._last_fill_end_s = -1e9
+        self._fill_start_ms = 0
 
-    def tick(self, now_s: float, probe_wet: bool, tank_ok: bool = True):
+    def _valve_off(self):
+        self.hal.fill_valve(False)
+        self._fill_active = False
+
+    def step(self, now_ms: int, probe_wet: bool, tank_ok: bool = True):
+        """Allocation-free tick: `now_ms` in ticks_ms; result in self.state / self.reason."""
         self.wd.kick()
+        self.refill.expire(now_ms)
         if self.wd.expired():
             self.latch.trip("watchdog_expired")
 
         if self.latch.tripped:
-            self.hal.fill_valve(False)
-            self._fill_active = False
-            return "fault", self.latch.reason
+            self._valve_off()
+            self.state, self.reason = "fault", self.latch.reason
+            return
 
         # Debounced semantics handled by higher layer or HAL conditioning assumed
         # Tank interlock: never autofill if tank is not OK
         if not tank_ok:
-            self.hal.fill_valve(False)
-            self._fill_active = False
-            return "inhibit", "tank_not_ok"
+            self._valve_off()
+            self.state, self.reason = "inhibit", "tank_not_ok"
+            return
 
         if probe_wet:
             # Level OK
             if self._fill_active:
-                self.hal.fill_valve(False)
-                self._fill_active = False
-                self._last_fill_end_s = now_s
-            return "ok", None
-        else:
-            # Level low; check rate limiting
-            if (now_s - self._last_fill_end_s) < self.cfg.min_refill_interval_s:
-                self.hal.fill_valve(False)
-                self._fill_active = False
-                return "inhibit", "rate_limit"
-
-            # Start or continue fill
-            if not self._fill_active:
-                self._fill_active = True
-                self._fill_start_s = now_s
-            self.hal.fill_valve(True)
-
-            # Timeout safety
-            if (now_s - self._fill_start_s) > self.cfg.fill_timeout_s:
-                self.latch.trip("fill_timeout")
-                self.hal.fill_valve(False)
-                self._fill_active = False
-                return "fault", self.latch.reason
-
-            return "fill", None
+                self._valve_off()
+                self.refill.mark(now_ms)
+            self.state, self.reason = "ok", None
+            return
+
+        # Level low; check rate limiting
+        if not self.refill.ready(now_ms):
+            self._valve_off()
+            self.state, self.reason = "inhibit", "rate_limit"
+            return
+
+        # Start or continue fill
+        if not self._fill_active:
+            self._fill_active = True
+            self._fill_start_ms = now_ms
+        self.hal.fill_valve(True)
+
+        # Timeout safety
+        if ticks_diff(now_ms, self._fill_start_ms) > self._timeout_ms:
+            self.latch.trip("fill_timeout")
+            self._valve_off()
+            self.state, self.reason = "fault", self.latch.reason
+            return
+
+        self.state, self.reason = "fill", None
+
+    def tick(self, now_s: float, probe_wet: bool, tank_ok: bool = True):
+        """step() with a timestamp in seconds; returns (state, reason)."""
+        self.step(int(now_s * 1000), probe_wet, tank_ok)
+        return self.state, self.reason
@@ -2,18 +2,28 @@
 # Runs as an autonomous node on ESP32-WROOM-32E
 
 from firmware.common import config
+from firmware.common.clock import MONOTONIC, ticks_diff
 from firmware.common.safety import FaultLatch, Watchdog
 
 
 class BoilerController:
-    def __init__(self, hal, cfg: config.BoilerConfig = config.boiler):
+    def __init__(self, hal, cfg: config.BoilerConfig = config.boiler, lut=None, clock=MONOTONIC):
         self.cfg = cfg
         self.hal = hal
+        self.lut = lut  # PressureLut for step_counts() (temp control mode)
         self.latch = FaultLatch()
-        self.wd = Watchdog(timeout_s=2.0)
+        self.wd = Watchdog(timeout_s=2.0, clock=clock)
+        self.state = "idle"
+        self.reason = None
+        # Thresholds precomputed once: no float arithmetic in step()
+        self._on_below = cfg.target_bar - cfg.hysteresis_bar
+        self._off_above = cfg.target_bar + cfg.hysteresis_bar
+        self._max_on_ms = int(cfg.max_continuous_on_s * 1000)
+        self._recovery_ms = int(cfg.min_off_recovery_s * 1000)
         self._heater_on = False
-        self._last_on_time = 0.0
-        self._last_off_time = 0.0
+        self._last_on_ms = 0
+        self._off_seen = False  # _last_off_ms holds a switch-off; heating is allowed at boot
+        self._last_off_ms = 0
 
     def _plausibility(self, p_bar: float) -> bool:
         return self.cfg.sensor_min_bar <= p_bar <= self.cfg.sensor_max_bar
@@ -22,10 +32,22 @@ class BoilerController:
         self.hal.heater(False)
         self._heater_on = False
 
-    def tick(self, now_s: float, p_bar: float, autofill_active: bool = False):
-        """Advance control one cycle.
-        Returns (state, reason) where state in {heat, idle, hold, inhibit, fault}.
+    def step(self, now_ms: int, p_bar: float, autofill_active: bool = False):
+        """Allocation-free tick: `now_ms` in ticks_ms; result in self.state / self.reason.
+
+        state in {heat, idle, hold, inhibit, fault}.
         """
+        self._decide(now_ms, self._plausibility(p_bar), p_bar < self._on_below, p_bar > self._off_above,
+                     autofill_active)
+
+    def step_counts(self, now_ms: int, counts: int, autofill_active: bool = False):
+        """step() on raw thermistor ADC counts: integer comparisons against the lut's thresholds."""
+        lut = self.lut
+        self._decide(now_ms, lut.plausible_lo <= counts <= lut.plausible_hi, counts > lut.heat_above,
+                     counts <= lut.idle_upto, autofill_active)
+
+    def _decide(self, now_ms: int, plausible: bool, below: bool, above: bool, autofill_active: bool):
+        # below: under target - hysteresis (heat); above: over target + hysteresis (idle)
         self.wd.kick()
         # Watchdog
         if self.wd.expired():
@@ -33,44 +55,52 @@ class BoilerController:
 
         if self.latch.tripped:
             self._safe_off()
-            return "fault", self.latch.reason
+            self.state, self.reason = "fault", self.latch.reason
+            return
 
         # Sensor plausibility
-        if not self._plausibility(p_bar):
+        if not plausible:
             self.latch.trip("sensor_out_of_range")
             self._safe_off()
-            return "fault", self.latch.reason
+            self.state, self.reason = "fault", self.latch.reason
+            return
 
         # Autofill interlock: do not heat during fill
         if autofill_active:
             self._safe_off()
-            return "inhibit", "autofill"
-
-        target = self.cfg.target_bar
-        hyster = self.cfg.hysteresis_bar
+            self.state, self.reason = "inhibit", "autofill"
+            return
 
         # Safety timeout on continuous ON
-        if self._heater_on and (now_s - self._last_on_time) > self.cfg.max_continuous_on_s:
+        if self._heater_on and ticks_diff(now_ms, self._last_on_ms) > self._max_on_ms:
             self.latch.trip("heater_on_timeout")
             self._safe_off()
-            return "fault", self.latch.reason
+            self.state, self.reason = "fault", self.latch.reason
+            return
 
         # Control logic
-        if p_bar < (target - hyster):
+        if below:
             # Respect minimum off recovery
-            if (now_s - self._last_off_time) >= self.cfg.min_off_recovery_s:
+            if not self._off_seen or ticks_diff(now_ms, self._last_off_ms) >= self._recovery_ms:
                 self.hal.heater(True)
                 if not self._heater_on:
                     self._heater_on = True
-                    self._last_on_time = now_s
-            state = "heat"
-        elif p_bar > (target + hyster):
+                    self._last_on_ms = now_ms
+            self.state = "heat"
+        elif above:
             self._safe_off()
-            self._last_off_time = now_s
-            state = "idle"
+            self._off_seen = True
+            self._last_off_ms = now_ms
+            self.state = "idle"
         else:
             # inside band: hold state, but ensure hardware state matches
             self.hal.heater(self._heater_on)
-            state = "hold" if self._heater_on else "idle"
+            self.state = "hold" if self._heater_on else "idle"
+        self.reason = None
 
-        return state, None
+    def tick(self, now_s: float, p_bar: float, autofill_active: bool = False):
+        """Advance control one cycle.
+        Returns (state, reason) where state in {heat, idle, hold, inhibit, fault}.
+        """
+        self.step(int(now_s * 1000), p_bar, autofill_active)
+        return self.state, self.reason
@@ -4,22 +4,27 @@ from firmware.core.hal_mpy import HAL
 from firmware.core.autofill_controller import AutofillController
 from firmware.core.tank_monitor import TankMonitor
 from firmware.core.modbus_rtu import SimpleSlave
-from firmware.core.modbus_maps import AutofillMap
+from firmware.core.rs485_link import Rs485Link
+from firmware.core.node_runtime import NodeRuntime
+from firmware.core.gc_monitor import GcMonitor
+from firmware.core.modbus_schema import AUTOFILL
+from firmware.core.modbus_maps import AutofillMap, INP_OVERRUNS
 from firmware.common import config
+from firmware.common.clock import MONOTONIC
 try:
     from machine import UART, Pin
 except Exception:  # pragma: no cover
     UART = None
     Pin = None
-import time
 
 
 def main():
+    clock = MONOTONIC  # one clock for the controllers, the tank reader and the scheduler
     hal = HAL()
-    tank = TankMonitor()
-    ctrl = AutofillController(hal)
+    tank = TankMonitor(clock=clock)
+    ctrl = AutofillController(hal, clock=clock)
     reg = AutofillMap()
-    slave = SimpleSlave(config.bus.addr_autofill, reg.read, reg.write)
+    slave = SimpleSlave(config.bus.addr_autofill, reg.read_image, reg.write, input_cb=reg.read_input_image, generation=reg.generation)
     uart = None
     de = None
     if UART is not None:
@@ -28,36 +33,25 @@ def main():
             de = Pin(config.pins.rs485_de, Pin.OUT, value=0)
         except Exception:
             uart = None
-    while True:
-        now = time.time()
-        tank.sample()
+    link = Rs485Link(uart, de, slave, reg.reg) if uart is not None else None
+    # Code tables are built once by the schema, not per iteration
+    status_f, reason_f, inp_f = AUTOFILL.status, AUTOFILL.reason, AUTOFILL.inputs["tank_level_pct"]
+
+    def control(now):
+        # Allocation-free: integer ticks, controller state in place, dict lookups
         wet = hal.probe_wet()
-        state, reason = ctrl.tick(now_s=now, probe_wet=wet, tank_ok=tank.tank_ok)
-        # Publish
-        status_code = {"ok": 0, "fill": 1, "inhibit": 2, "fault": 3}.get(state, 0)
-        reason_code = {
-            None: 0,
-            "rate_limit": 1,
-            "tank_not_ok": 2,
-            "fill_timeout": 3,
-            "watchdog_expired": 4,
-        }.get(reason, 0)
-        reg.reg[0] = status_code
-        reg.reg[1] = reason_code
-        reg.reg[2] = 1 if tank.tank_ok else 0
+        ctrl.step(now, wet, tank.tank_ok)
+        reg.publish(status_f.encode(ctrl.state), reason_f.encode(ctrl.reason), tank.tank_ok)
+        reg.inp[INP_OVERRUNS] = rt.sched.overruns
+
+    def sample():
+        # The level's float scaling runs here at the sensor rate, not in the control tick
+        tank.sample()
+        reg.inp[inp_f.addr] = inp_f.encode(tank.level_pct)
 
-        if uart is not None:
-            data = uart.read()
-            if data:
-                resp = slave.feed_uart(data)
-                if resp:
-                    if de is not None:
-                        de.value(1)
-                    uart.write(resp)
-                    uart.flush()
-                    if de is not None:
-                        de.value(0)
-        hal.sleep_ms(100)
+    rt = NodeRuntime(control, 100, link, sample=sample, sample_period_ms=1000 // config.tank.sample_hz,
+                     clock=clock, gc_monitor=GcMonitor(clock=clock))
+    rt.start()
 
 
 if __name__ == "__main__":
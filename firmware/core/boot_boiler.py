@@ -2,12 +2,17 @@
 Wire up HAL and BoilerController and run periodic control loop.
 """
 
-import time
 from firmware.core.hal_mpy import HAL
 from firmware.core.boiler_controller import BoilerController
+from firmware.core.pressure_lut import PressureLut
 from firmware.core.modbus_rtu import SimpleSlave
-from firmware.core.modbus_maps import BoilerMap
+from firmware.core.rs485_link import Rs485Link
+from firmware.core.node_runtime import NodeRuntime
+from firmware.core.gc_monitor import GcMonitor
+from firmware.core.modbus_schema import BOILER
+from firmware.core.modbus_maps import BoilerMap, INP_OVERRUNS
 from firmware.common import config
+from firmware.common.clock import MONOTONIC
 try:
     from machine import UART, Pin
 except Exception:  # pragma: no cover
@@ -16,10 +21,13 @@ except Exception:  # pragma: no cover
 
 
 def main():
+    clock = MONOTONIC  # one clock for the controller and the scheduler
     hal = HAL()
-    ctrl = BoilerController(hal)
+    temp_mode = config.boiler.control_mode == "temp"
+    # Thermistor mode: the lookup table is built here once, not per tick
+    ctrl = BoilerController(hal, lut=PressureLut() if temp_mode else None, clock=clock)
     reg = BoilerMap()
-    slave = SimpleSlave(config.bus.addr_boiler, reg.read, reg.write)
+    slave = SimpleSlave(config.bus.addr_boiler, reg.read_image, reg.write, input_cb=reg.read_input_image, generation=reg.generation)
     uart = None
     de = None
     if UART is not None:
@@ -28,29 +36,34 @@ def main():
             de = Pin(config.pins.rs485_de, Pin.OUT, value=0)
         except Exception:
             uart = None
-    while True:
-        now = time.time()
-        p = hal.pressure_bar()
-        # Autofill coordination is decentralized; if a shared signal exists, read it here.
-        state, reason = ctrl.tick(now_s=now, p_bar=p, autofill_active=False)
-        # Publish status
-        status_code = {"idle": 0, "heat": 1, "hold": 1, "inhibit": 2, "fault": 3}.get(state, 0)
-        reason_code = {None: 0, "autofill": 1, "sensor_out_of_range": 2, "heater_on_timeout": 3, "watchdog_expired": 4}.get(reason, 0)
-        reg.reg[0] = status_code
-        reg.reg[1] = reason_code
-
-        if uart is not None:
-            data = uart.read()
-            if data:
-                resp = slave.feed_uart(data)
-                if resp:
-                    if de is not None:
-                        de.value(1)
-                    uart.write(resp)
-                    uart.flush()
-                    if de is not None:
-                        de.value(0)
-        hal.sleep_ms(200)
+    link = Rs485Link(uart, de, slave, reg.reg) if uart is not None else None
+    # Code tables are built once by the schema, not per iteration
+    status_f, reason_f, inp_f = BOILER.status, BOILER.reason, BOILER.inputs["pressure_bar"]
+
+    if temp_mode:
+        # ADC counts straight to decisions and telemetry, integers only
+        lut = ctrl.lut
+
+        def control(now):
+            c = hal.read_boiler_counts()
+            # Autofill coordination is decentralized; if a shared signal exists, read it here.
+            ctrl.step_counts(now, c, False)
+            reg.publish(status_f.encode(ctrl.state), reason_f.encode(ctrl.reason))
+            reg.inp[inp_f.addr] = lut.mbar(c)
+            reg.inp[INP_OVERRUNS] = rt.sched.overruns
+    else:
+        def control(now):
+            # Allocation-free apart from the pressure reading itself
+            p = hal.read_pressure_bar()
+            ctrl.step(now, p, False)
+            reg.publish(status_f.encode(ctrl.state), reason_f.encode(ctrl.reason))
+            reg.inp[inp_f.addr] = inp_f.encode(p)
+            reg.inp[INP_OVERRUNS] = rt.sched.overruns
+
+    # ADC bursts run in the sampling task, several per control tick
+    rt = NodeRuntime(control, 200, link, sample=hal.sample_adcs, sample_period_ms=config.adc.sample_period_ms,
+                     clock=clock, gc_monitor=GcMonitor(clock=clock))
+    rt.start()
 
 
 if __name__ == "__main__":
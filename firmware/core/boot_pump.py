@@ -1,12 +1,16 @@
 """MicroPython entrypoint for Pump/Brew Node."""
 
-import time
 from firmware.core.hal_mpy import HAL
 from firmware.core.pump_controller import PumpController
 from firmware.core.tank_monitor import TankMonitor
 from firmware.core.modbus_rtu import SimpleSlave
-from firmware.core.modbus_maps import PumpMap
+from firmware.core.rs485_link import Rs485Link
+from firmware.core.node_runtime import NodeRuntime
+from firmware.core.gc_monitor import GcMonitor
+from firmware.core.modbus_schema import PUMP
+from firmware.core.modbus_maps import PumpMap, INP_OVERRUNS
 from firmware.common import config
+from firmware.common.clock import MONOTONIC
 
 try:
     from machine import UART, Pin
@@ -16,11 +20,12 @@ except Exception:  # pragma: no cover
 
 
 def main():
+    clock = MONOTONIC  # one clock for the controllers, the tank reader and the scheduler
     hal = HAL()
-    tank = TankMonitor()
-    ctrl = PumpController(hal)
+    tank = TankMonitor(clock=clock)
+    ctrl = PumpController(hal, clock=clock)
     reg = PumpMap()
-    slave = SimpleSlave(config.bus.addr_pump, reg.read, reg.write)
+    slave = SimpleSlave(config.bus.addr_pump, reg.read_image, reg.write, input_cb=reg.read_input_image, generation=reg.generation)
 
     uart = None
     de = None
@@ -30,38 +35,25 @@ def main():
             de = Pin(config.pins.rs485_de, Pin.OUT, value=0)
         except Exception:
             uart = None
-    while True:
-        now = time.time()
-        tank.sample()
+    link = Rs485Link(uart, de, slave, reg.reg) if uart is not None else None
+    # Code tables are built once by the schema, not per iteration
+    status_f, reason_f, inp_f = PUMP.status, PUMP.reason, PUMP.inputs["tank_level_pct"]
+
+    def control(now):
+        # Allocation-free: integer ticks, controller state in place, dict lookups
         brew = hal.brew_switch()
-        state, reason = ctrl.tick(now_s=now, brew_switch=brew, tank_ok=tank.tank_ok)
-        # Publish registers
-        status_code = {"idle": 0, "run": 1, "inhibit": 2, "fault": 3}.get(state, 0)
-        reason_code = {
-            None: 0,
-            "rest": 1,
-            "rate_limit": 2,
-            "tank_not_ok": 3,
-            "watchdog_expired": 4,
-            "pump_run_timeout": 5,
-        }.get(reason, 0)
-        reg.reg[0] = status_code
-        reg.reg[1] = reason_code
-        reg.reg[2] = 1 if tank.tank_ok else 0
+        ctrl.step(now, brew, tank.tank_ok)
+        reg.publish(status_f.encode(ctrl.state), reason_f.encode(ctrl.reason), tank.tank_ok)
+        reg.inp[INP_OVERRUNS] = rt.sched.overruns
+
+    def sample():
+        # The level's float scaling runs here at the sensor rate, not in the control tick
+        tank.sample()
+        reg.inp[inp_f.addr] = inp_f.encode(tank.level_pct)
 
-        # Handle Modbus if UART available
-        if uart is not None:
-            data = uart.read()
-            if data:
-                resp = slave.feed_uart(data)
-                if resp:
-                    if de is not None:
-                        de.value(1)
-                    uart.write(resp)
-                    uart.flush()
-                    if de is not None:
-                        de.value(0)
-        hal.sleep_ms(50)
+    rt = NodeRuntime(control, 50, link, sample=sample, sample_period_ms=1000 // config.tank.sample_hz,
+                     clock=clock, gc_monitor=GcMonitor(clock=clock))
+    rt.start()
 
 
 if __name__ == "__main__":
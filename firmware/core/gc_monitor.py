@@ -0,0 +1,97 @@
+"""Heap and GC instrumentation for the node control loop.
+
+Per control tick it records the bytes allocated (drop of `gc.mem_free()` across
+the tick; a rise means an automatic collection ran inside the tick) and, after
+the tick, runs `gc.collect()` in the loop's slack time once `budget_bytes` have
+been allocated since the last collection, timing the pause. Collecting early
+and on our own schedule keeps the unpredictable automatic collections (the
+main source of control-loop jitter) out of the ticks.
+
+`gc.mem_free` exists only on MicroPython; under CPython pass `mem_free`
+(tests). Without it the allocations are unknown: the monitor then collects
+every `budget_ticks` ticks instead and only times those collections.
+"""
+
+import gc
+
+from firmware.common.clock import MONOTONIC, ticks_diff
+
+
+class GcMonitor:
+    def __init__(self, budget_bytes: int = 4096, mem_free=None, collect=gc.collect, clock=MONOTONIC,
+                 budget_ticks: int = 50):
+        self.budget_bytes = budget_bytes
+        self.budget_ticks = budget_ticks  # without mem_free
+        self.mem_free = mem_free or getattr(gc, "mem_free", None)
+        self.collect = collect
+        self.clock = clock
+        self.ticks = 0
+        self.alloc_bytes = 0  # last tick
+        self.max_alloc_bytes = 0
+        self.total_alloc_bytes = 0
+        self.alloc_ticks = 0  # ticks that allocated at all
+        self.auto_collections = 0  # automatic collections seen inside a tick
+        self.collections = 0
+        self.pause_us = 0
+        self.max_pause_us = 0
+        self._pause_sum_us = 0
+        self._since_collect = 0
+        self._collect_tick = 0  # self.ticks at the last collection
+        self._free0 = 0
+
+    def begin(self):
+        mf = self.mem_free
+        if mf is not None:
+            self._free0 = mf()
+
+    def end(self):
+        self.ticks += 1
+        mf = self.mem_free
+        if mf is None:
+            return
+        used = self._free0 - mf()
+        if used < 0:
+            self.auto_collections += 1
+            self._since_collect = 0
+            used = 0
+        self.alloc_bytes = used
+        if used:
+            self.alloc_ticks += 1
+            self.total_alloc_bytes += used
+            self._since_collect += used
+            if used > self.max_alloc_bytes:
+                self.max_alloc_bytes = used
+
+    def idle(self):
+        """Collect in the slack after a tick once the allocation (or tick) budget is used up."""
+        if self.mem_free is not None:
+            if self._since_collect < self.budget_bytes:
+                return
+        elif self.ticks - self._collect_tick < self.budget_ticks:
+            return
+        t0 = self.clock.ticks_us()
+        self.collect()
+        pause = ticks_diff(self.clock.ticks_us(), t0)
+        self.collections += 1
+        self.pause_us = pause
+        self._pause_sum_us += pause
+        if pause > self.max_pause_us:
+            self.max_pause_us = pause
+        self._since_collect = 0
+        self._collect_tick = self.ticks
+
+    def as_dict(self) -> dict:
+        mf = self.mem_free
+        return {
+            "ticks": self.ticks,
+            "mem_free": mf() if mf is not None else None,
+            "alloc_bytes": self.alloc_bytes,
+            "max_alloc_bytes": self.max_alloc_bytes,
+            "total_alloc_bytes": self.total_alloc_bytes,
+            "alloc_ticks": self.alloc_ticks,
+            "auto_collections": self.auto_collections,
+            "collections": self.collections,
+            "pause_us": self.pause_us,
+            "max_pause_us": self.max_pause_us,
+            "mean_pause_us": self._pause_sum_us // self.collections if self.collections else 0,
+        }
@@ -10,9 +10,61 @@ except ImportError:  # allow import under CPython for tooling
     ADC = object  # type: ignore
     import time
 
+import math
+from array import array
+
 from firmware.common import config
 
 
+class AdcFilter:
+    """Burst acquisition for one ADC channel, integer math and no allocation per burst.
+
+    `sample()` reads `burst` samples into a preallocated buffer (insertion-sorted as
+    they arrive), averages what is left after dropping `trim` samples at each end
+    (trim = (burst - 1) // 2 is the median) and smooths bursts with an EMA kept in
+    fixed point (4 fractional bits). `value` is the latest filtered count.
+    """
+
+    def __init__(self, read, burst: int = 8, trim: int = 2, ema_shift: int = 2):
+        if burst - 2 * trim < 1:
+            raise ValueError("trim leaves no samples")
+        self.read = read
+        self.buf = array("H", [0] * burst)
+        self.trim = trim
+        self.ema_shift = ema_shift
+        self.bursts = 0
+        self._acc = -1  # EMA << 4; -1 until the first burst
+        self.value = self.sample()
+
+    def sample(self) -> int:
+        buf = self.buf
+        read = self.read
+        n = len(buf)
+        for i in range(n):
+            v = read()
+            j = i
+            while j > 0 and buf[j - 1] > v:
+                buf[j] = buf[j - 1]
+                j -= 1
+            buf[j] = v
+        k = self.trim
+        m = n - 2 * k
+        s = 0
+        for i in range(k, n - k):
+            s += buf[i]
+        x = (s + (m >> 1)) // m
+        sh = self.ema_shift
+        if sh:
+            if self._acc < 0:
+                self._acc = x << 4
+            else:
+                self._acc += ((x << 4) - self._acc) >> sh
+            x = (self._acc + 8) >> 4
+        self.value = x
+        self.bursts += 1
+        return x
+
+
 class HAL:
     def __init__(self, pins: config.Pins = config.pins):
         self.pins = pins
@@ -59,11 +111,32 @@ class HAL:
             if getattr(pins, "status_led", None) is not None:
                 self._led_pin = Pin(pins.status_led, Pin.OUT, value=0)
 
+        # Filtered acquisition of the analog inputs (sample_adcs() from the sampling task)
+        self.pressure_filter = None
+        self.temp_filter = None
+        if self._pressure_adc is not None:
+            self.pressure_filter = self._filter(self._pressure_adc)
+        if self._temp_adc is not None:
+            self.temp_filter = self._filter(self._temp_adc)
+
         # Software mirror for CPython and for state reporting
         self.heater_state = False
         self.fill_valve_state = False
         self.pump_state = False
 
+    @staticmethod
+    def _filter(adc, cfg: config.AdcConfig = config.adc) -> AdcFilter:
+        return AdcFilter(adc.read, cfg.burst, cfg.trim, cfg.ema_shift)
+
+    def sample_adcs(self):
+        """One burst per analog input; bounded work, run at config.adc.sample_period_ms."""
+        f = self.pressure_filter
+        if f is not None:
+            f.sample()
+        f = self.temp_filter
+        if f is not None:
+            f.sample()
+
     # Actuators
     def heater(self, on: bool):
         self.heater_state = bool(on)
@@ -83,8 +156,8 @@ class HAL:
     # Sensors
     def read_pressure_bar(self) -> float:
         """Linear mapping for a typical 0.5–4.5V ratiometric sensor to 0–3 bar. Calibrate on hardware."""
-        if MICROPY and self._pressure_adc is not None:
-            raw = self._pressure_adc.read()
+        if self.pressure_filter is not None:
+            raw = self.pressure_filter.value
             volts = (raw / 4095.0) * 3.6
         else:
             volts = 0.0
@@ -98,25 +171,28 @@ class HAL:
         return (v_eff - v_min) * (bar_max / (v_max - v_min))
 
     # Thermistor path
-    def read_boiler_temp_c(self) -> float:
-        if MICROPY and self._temp_adc is not None:
-            counts = self._temp_adc.read()
-        else:
-            counts = config.thermistor.adc_fullscale_counts // 2
-        cfg = config.thermistor
+    def read_boiler_counts(self) -> int:
+        """Thermistor ADC counts (see pressure_lut for the integer control path)."""
+        if self.temp_filter is not None:
+            return self.temp_filter.value  # latest filtered burst, no ADC access here
+        return config.thermistor.adc_fullscale_counts // 2
+
+    @staticmethod
+    def temp_c_from_counts(counts: int, cfg: config.ThermistorConfig = config.thermistor) -> float:
         v = (counts / cfg.adc_fullscale_counts) * cfg.vref_v
         if v <= 0.001 or v >= (cfg.vref_v - 0.001):
             return 25.0
         rt = cfg.pullup_ohm * (v / (cfg.vref_v - v))
-        import math
         t0_k = (cfg.t0_c + 273.15)
         inv_t = (1.0 / t0_k) + (1.0 / cfg.beta) * math.log(rt / cfg.r0_ohm)
         t_k = 1.0 / inv_t
         return t_k - 273.15
 
+    def read_boiler_temp_c(self) -> float:
+        return self.temp_c_from_counts(self.read_boiler_counts())
+
     @staticmethod
     def steam_pressure_from_temp_c(temp_c: float) -> float:
-        import math
         A, B, C = 8.14019, 1810.94, 244.485
         p_mmHg = 10 ** (A - (B / (C + temp_c)))
         p_bar_abs = p_mmHg / 750.062
@@ -0,0 +1,93 @@
+"""Fixed-rate scheduling for the node control loops.
+
+Deadlines are kept on an absolute grid (start + n * period) in monotonic
+millisecond ticks, so the time spent in the control tick does not add to the
+period and the loop does not drift. Per tick the scheduler records:
+- jitter: how late the tick started against its deadline
+- overruns: ticks whose work ran past the next deadline; the missed slots are
+  skipped (counted in `skipped`) instead of being run back to back
+
+`begin()` hands the controllers the tick's ticks_ms value (a small int, so the
+tick path allocates nothing; compare with ticks_diff). `now_s()` gives seconds
+since `start()`, accumulated tick by tick so the ticks_ms wrap on MicroPython
+does not matter.
+"""
+
+from firmware.common.clock import MONOTONIC, ticks_diff, ticks_add
+
+
+class LoopScheduler:
+    def __init__(self, period_ms: int, clock=MONOTONIC):
+        self.period_ms = period_ms
+        self.ticks = clock.ticks_ms
+        self.runs = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.jitter_ms = 0
+        self.max_jitter_ms = 0
+        self.max_work_ms = 0
+        self._jitter_sum_ms = 0
+        self._deadline = 0
+        self._begun = 0
+        self._last = 0
+        self._elapsed_ms = 0
+
+    def start(self):
+        t = self.ticks()
+        self._deadline = t
+        self._begun = t
+        self._last = t
+        self._elapsed_ms = 0
+
+    def now_s(self) -> float:
+        """Seconds since start(), millisecond resolution."""
+        return (self._elapsed_ms + ticks_diff(self.ticks(), self._last)) / 1000
+
+    def begin(self) -> int:
+        """Mark the start of a tick; returns its ticks_ms timestamp for the controllers."""
+        t = self.ticks()
+        self._elapsed_ms += ticks_diff(t, self._last)
+        self._last = t
+        self._begun = t
+        late = ticks_diff(t, self._deadline)
+        if late < 0:
+            late = 0
+        self.jitter_ms = late
+        self._jitter_sum_ms += late
+        if late > self.max_jitter_ms:
+            self.max_jitter_ms = late
+        self.runs += 1
+        return t
+
+    def end(self) -> int:
+        """Mark the end of a tick; returns the milliseconds to sleep until the next one."""
+        t = self.ticks()
+        work = ticks_diff(t, self._begun)
+        if work > self.max_work_ms:
+            self.max_work_ms = work
+        period = self.period_ms
+        deadline = ticks_add(self._deadline, period)
+        wait = ticks_diff(deadline, t)
+        if wait < 0:
+            self.overruns += 1
+            missed = (period - 1 - wait) // period
+            self.skipped += missed
+            deadline = ticks_add(deadline, missed * period)
+            wait = ticks_diff(deadline, t)
+        self._deadline = deadline
+        return wait
+
+    def mean_jitter_ms(self) -> float:
+        return self._jitter_sum_ms / self.runs if self.runs else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "period_ms": self.period_ms,
+            "runs": self.runs,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "jitter_ms": self.jitter_ms,
+            "max_jitter_ms": self.max_jitter_ms,
+            "mean_jitter_ms": round(self.mean_jitter_ms(), 2),
+            "max_work_ms": self.max_work_ms,
+        }
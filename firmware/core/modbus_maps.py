@@ -4,28 +4,118 @@ Conventions (Holding Registers 0x03):
 - 0x0000: status code (0=idle/ok, 1=run/fill, 2=inhibit, 3=fault)
 - 0x0001: reason code (implementation-defined small ints)
 - 0x0002: tank_ok (0/1)
-- 0x0003: reserved
+- 0x0003: change sequence: incremented (mod 2^16) whenever status, reason or tank_ok
+  changes, so the master can poll this one register and fetch the block only when it moves
+- 0x000F: bus baud rate / 100; writing a rate from config.bus.baudrates switches the
+  node after it acknowledges (see rs485_link.Rs485Link)
+
+Input Registers (0x04, read-only telemetry):
+- 0x0000: pump/autofill: tank level in 0.1 % (0xFFFF = unknown); boiler: pressure in mbar
+- 0x0001: control-loop overruns since boot (mod 2^16, see loop_scheduler)
+
+Registers live in `RegisterBank`s that keep the big-endian wire image current on
+every write, so the slave answers reads from a memoryview of that image. Each bank
+counts the writes that actually changed a value (`generation`), which lets the
+slave reuse a previously built response while nothing has changed.
 """
 
-from typing import Tuple
+from array import array
+from typing import Optional, Tuple
+
+from firmware.common import config
+
+
+class RegisterBank:
+    """Fixed-size bank of 16-bit registers plus its big-endian byte image."""
+
+    def __init__(self, size: int = 16):
+        self.values = array("H", [0] * size)
+        self.image = bytearray(2 * size)
+        self._view = memoryview(self.image)
+        self.generation = 0
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, i: int) -> int:
+        return self.values[i]
+
+    def __setitem__(self, i: int, v: int):
+        v &= 0xFFFF
+        if self.values[i] == v:
+            return
+        self.generation += 1
+        self.values[i] = v
+        self.image[2 * i] = v >> 8
+        self.image[2 * i + 1] = v & 0xFF
+
+    def read(self, start: int, count: int) -> Tuple[bool, Tuple[int, ...]]:
+        if start < 0 or start + count > len(self.values):
+            return False, ()
+        return True, tuple(self.values[start:start + count])
+
+    def view(self, start: int, count: int) -> Optional[memoryview]:
+        """Wire-order bytes of registers [start, start+count), without copying."""
+        if start < 0 or start + count > len(self.values):
+            return None
+        return self._view[2 * start:2 * (start + count)]
+
+
+REG_STATUS = 0
+REG_REASON = 1
+REG_TANK_OK = 2
+REG_SEQ = 3
+REG_BAUD = 15
+
+INP_OVERRUNS = 1
 
 
 class PumpMap:
     def __init__(self):
-        self.reg = [0] * 16
+        self.reg = RegisterBank(16)
+        self.inp = RegisterBank(16)
+
+    def generation(self) -> int:
+        """Changes whenever any holding or input register value changes."""
+        return self.reg.generation + self.inp.generation
 
     def read(self, start: int, count: int) -> Tuple[bool, Tuple[int, ...]]:
-        if start + count > len(self.reg):
-            return False, ()
-        return True, tuple(self.reg[start:start + count])
+        return self.reg.read(start, count)
+
+    def read_input(self, start: int, count: int) -> Tuple[bool, Tuple[int, ...]]:
+        return self.inp.read(start, count)
+
+    # Zero-copy variants for SimpleSlave: (ok, memoryview of the wire image)
+    def read_image(self, start: int, count: int):
+        mv = self.reg.view(start, count)
+        return mv is not None, mv
+
+    def read_input_image(self, start: int, count: int):
+        mv = self.inp.view(start, count)
+        return mv is not None, mv
+
+    def publish(self, status: int, reason: int, tank_ok: Optional[bool] = None) -> bool:
+        """Update the status block; bumps the change sequence and returns True if anything changed."""
+        reg = self.reg
+        g = reg.generation
+        reg[REG_STATUS] = status
+        reg[REG_REASON] = reason
+        if tank_ok is not None:
+            reg[REG_TANK_OK] = 1 if tank_ok else 0
+        if reg.generation == g:
+            return False
+        reg[REG_SEQ] = reg[REG_SEQ] + 1
+        return True
 
     def write(self, start: int, values: Tuple[int, ...]) -> bool:
         if start + len(values) > len(self.reg):
             return False
+        if start <= REG_BAUD < start + len(values) and values[REG_BAUD - start] * 100 not in config.bus.baudrates:
+            return False
         # For now, accept writes only to reserved area (e.g., control commands could be added)
         for i, v in enumerate(values):
             if start + i >= 8:
-                self.reg[start + i] = v & 0xFFFF
+                self.reg[start + i] = v
         return True
 
 
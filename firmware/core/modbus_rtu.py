@@ -1,86 +1,475 @@
 """Minimal Modbus RTU helpers for MicroPython nodes.
 
 Provides:
-- CRC16 (Modbus) calculator
+- CRC16 (Modbus) calculator, table-driven with an incremental update API and a
+  scan for the first CRC-valid prefix (frames of functions we cannot size)
 - RTU PDU/ADU helpers (build, parse)
 - Simple, non-blocking slave that serves a user-provided register map
 
 This is intentionally tiny and synchronous to keep footprint small.
 """
 
-from typing import Callable, Dict, Tuple, Optional
+from array import array
+from typing import Callable, Dict, List, Tuple, Optional
 
 
-def crc16(data: bytes) -> int:
-    crc = 0xFFFF
-    for b in data:
-        crc ^= b
+CRC16_INIT = 0xFFFF
+
+
+def _crc16_table():
+    # 256 x 16-bit entries for the reflected 0xA001 polynomial, kept in an
+    # array('H') (512 bytes) rather than a list of ints to save RAM on the nodes.
+    tbl = array("H", [0] * 256)
+    for i in range(256):
+        crc = i
         for _ in range(8):
             if crc & 1:
                 crc = (crc >> 1) ^ 0xA001
             else:
                 crc >>= 1
-    crc &= 0xFFFF
+        tbl[i] = crc
+    return tbl
+
+
+_CRC_TABLE = _crc16_table()
+
+
+def crc16_update(crc: int, data) -> int:
+    """Fold `data` into a running CRC register and return the new register.
+
+    Start from CRC16_INIT. The register is in wire order: low byte is sent first.
+    Feeding a complete frame including its trailing CRC yields 0 when the CRC is valid.
+    """
+    tbl = _CRC_TABLE
+    for b in data:
+        crc = (crc >> 8) ^ tbl[(crc ^ b) & 0xFF]
+    return crc
+
+
+def crc16_scan(buf, i: int, n: int, max_len: int) -> int:
+    """Length of the first CRC-valid frame at buf[i] for a function we cannot size.
+
+    Runs the CRC over buf[i:n] byte by byte (no slicing) and returns the first
+    prefix of at least 4 and at most `max_len` bytes that leaves a zero register,
+    or 0 if there is none among the bytes so far.
+    """
+    tbl = _CRC_TABLE
+    crc = CRC16_INIT
+    end = min(n, i + max_len)
+    j = i
+    while j < end:
+        crc = (crc >> 8) ^ tbl[(crc ^ buf[j]) & 0xFF]
+        j += 1
+        if crc == 0 and j - i >= 4:
+            return j - i
+    return 0
+
+
+def crc16(data: bytes) -> int:
+    crc = crc16_update(CRC16_INIT, data)
     # Return in high-byte-first numeric form (e.g., 0xC5CD for [0xCD, 0xC5])
     return ((crc & 0xFF) << 8) | (crc >> 8)
 
 
 def build_adu(addr: int, pdu: bytes) -> bytes:
-    adu = bytes([addr]) + pdu
-    # Compute raw LSB-first word for wire by swapping numeric
-    c = crc16(adu)
-    c_lsb_first = ((c & 0xFF) << 8) | (c >> 8)
-    return adu + bytes([c_lsb_first & 0xFF, (c_lsb_first >> 8) & 0xFF])
+    adu = bytearray(len(pdu) + 3)
+    adu[0] = addr
+    adu[1:-2] = pdu
+    c = crc16_update(CRC16_INIT, memoryview(adu)[:-2])
+    adu[-2] = c & 0xFF
+    adu[-1] = c >> 8
+    return bytes(adu)
 
 
 def check_and_strip_adu(frame: bytes) -> Tuple[int, bytes]:
     if len(frame) < 4:
         raise ValueError("short_frame")
-    addr = frame[0]
-    data = frame[:-2]
-    rx_crc_le = frame[-2] | (frame[-1] << 8)
-    # Convert to big-endian numeric like crc16() returns
-    rx_crc_be = ((rx_crc_le & 0xFF) << 8) | (rx_crc_le >> 8)
-    if crc16(data) != rx_crc_be:
+    # Running the CRC over data + received CRC leaves a zero register on a good frame
+    if crc16_update(CRC16_INIT, frame) != 0:
         raise ValueError("bad_crc")
-    return addr, frame[1:-2]
+    return frame[0], bytes(frame[1:-2])
+
+
+def frame_gap_us(baudrate: int) -> int:
+    """3.5 character times (11-bit characters) of bus silence that delimit RTU frames.
+
+    The spec fixes the gap at 1750 us above 19200 baud.
+    """
+    if baudrate > 19200:
+        return 1750
+    return (38_500_000 + baudrate - 1) // baudrate
+
+
+# Function codes whose frame length the decoder knows up front
+_FIXED_REQ = (0x03, 0x04, 0x06, 0x08)
+_FIXED_RSP = (0x06, 0x08, 0x10)
+_COUNTED_RSP = (0x03, 0x04, 0x17)
+_KNOWN = _FIXED_REQ + _FIXED_RSP + _COUNTED_RSP + (0x10, 0x17)
+
+
+def rtu_frame_len(buf, i: int, n: int, responses: bool = False) -> int:
+    """Expected ADU length (incl. address and CRC) of the frame starting at buf[i].
+
+    Returns 0 if more bytes are needed to tell, -1 if the header is not a frame
+    we know how to size (unknown function or inconsistent byte count).
+    """
+    if n - i < 2:
+        return 0
+    func = buf[i + 1]
+    if func & 0x80:
+        return 5  # exception: addr, func, code, crc
+    if responses:
+        if func in _FIXED_RSP:
+            return 8
+        if func in _COUNTED_RSP:
+            if n - i < 3:
+                return 0
+            nbytes = buf[i + 2]
+            return 5 + nbytes if nbytes and not nbytes & 1 else -1
+        return -1
+    if func in _FIXED_REQ:
+        return 8
+    if func == 0x10:
+        if n - i < 7:
+            return 0
+        count = (buf[i + 4] << 8) | buf[i + 5]
+        nbytes = buf[i + 6]
+        if count < 1 or count > 123 or nbytes != count * 2:
+            return -1
+        return 9 + nbytes
+    if func == 0x17:
+        if n - i < 11:
+            return 0
+        rcount = (buf[i + 4] << 8) | buf[i + 5]
+        wcount = (buf[i + 8] << 8) | buf[i + 9]
+        nbytes = buf[i + 10]
+        if rcount < 1 or rcount > 125 or wcount < 1 or wcount > 121 or nbytes != wcount * 2:
+            return -1
+        return 13 + nbytes
+    return -1
+
+
+def rtu_frame_lens(buf, i: int, n: int) -> Tuple[int, int]:
+    """(request length, response length) of the frame at buf[i], as `rtu_frame_len`.
+
+    For listeners that do not know the direction; headers of unknown functions
+    (most positions while hunting through noise) are rejected without sizing.
+    """
+    if n - i < 2:
+        return 0, 0
+    func = buf[i + 1]
+    if func & 0x80:
+        return 5, 5
+    if func not in _KNOWN:
+        return -1, -1
+    return rtu_frame_len(buf, i, n, False), rtu_frame_len(buf, i, n, True)
+
+
+class RtuFrameDecoder:
+    """Incremental RTU frame splitter.
+
+    The expected length comes from the function code, so each candidate frame is
+    CRC-checked once, when its last byte has arrived, and one feed can yield
+    several frames.
+
+    With `addr` set, only frames for that address are returned. Bytes of frames
+    for other addresses are skipped without a CRC: if the caller passes `now_us`
+    (and `gap_us` > 0) the decoder ignores everything up to the next 3.5-character
+    silence; otherwise it hunts forward for the next byte that could start a frame
+    for `addr`. Only pass timestamps when reading the UART faster than the gap,
+    otherwise bytes sitting in the FIFO look like silence.
+
+    `responses` selects master-side sizing (responses) instead of requests.
+
+    Counters (plain ints, never reset except by clear_counters()):
+    - frames: CRC-valid frames returned
+    - crc_errors: frames that failed the CRC check
+    - foreign: frames for other addresses (without timestamps, each stretch of
+      foreign traffic between two of our frames counts once)
+    - resyncs: times the decoder lost framing and discarded bytes (unknown header,
+      partial frame cut by a gap, buffer overflow)
+    """
+
+    def __init__(self, addr: Optional[int] = None, responses: bool = False, gap_us: int = 0, max_frame: int = 256):
+        self.addr = addr
+        self.responses = responses
+        self.gap_us = gap_us
+        self.max_frame = max_frame
+        self._buf = bytearray()
+        self._last_us = None
+        self._skip = False
+        self._hunt = False
+        self.clear_counters()
+
+    def clear_counters(self):
+        self.frames = 0
+        self.crc_errors = 0
+        self.foreign = 0
+        self.resyncs = 0
+
+    def reset(self):
+        self._buf = bytearray()
+        self._skip = False
+
+    def feed(self, data, now_us: Optional[int] = None) -> List[Tuple[int, bytes]]:
+        """Feed raw bytes; return a list of (addr, pdu) for every complete, CRC-valid frame."""
+        timed = now_us is not None and self.gap_us > 0
+        if timed:
+            last = self._last_us
+            if last is not None:
+                dt = now_us - last
+                if dt < 0 or dt >= self.gap_us:
+                    # Silence on the bus: a buffered partial frame can never complete
+                    if self._buf and not self._skip:
+                        self.resyncs += 1
+                    self.reset()
+            if data:
+                # Time of the last received byte; empty polls must not hide the gap
+                self._last_us = now_us
+        if self._skip:
+            return []
+        buf = self._buf
+        buf.extend(data)
+        out = []
+        own = self.addr
+        n = len(buf)
+        i = 0
+        while n - i >= 4:
+            a = buf[i]
+            if own is not None and a != own:
+                if timed:
+                    # Foreign frame: discard until the next gap
+                    self.foreign += 1
+                    self._skip = True
+                    i = n
+                    break
+                if not self._hunt:
+                    self.foreign += 1
+                    self._hunt = True
+                i += 1
+                continue
+            ln = rtu_frame_len(buf, i, n, self.responses)
+            if ln == 0:
+                break
+            if ln < 0:
+                # Unknown function: the first prefix whose running CRC hits zero is the frame
+                ln = crc16_scan(buf, i, n, self.max_frame) if (own is not None or timed) else 0
+                if ln == 0:
+                    if timed:
+                        self.resyncs += 1
+                        self._skip = True
+                        i = n
+                        break
+                    if not self._hunt:
+                        self.resyncs += 1
+                        self._hunt = True
+                    i += 1
+                    continue
+            if n - i < ln:
+                break
+            if crc16_update(CRC16_INIT, memoryview(buf)[i:i + ln]) != 0:
+                if timed:
+                    self.crc_errors += 1
+                    self._skip = True
+                    i = n
+                    break
+                # While hunting, a failed candidate is just a misaligned start
+                if not self._hunt:
+                    self.crc_errors += 1
+                    self._hunt = True
+                i += 1
+                continue
+            self.frames += 1
+            self._hunt = False
+            out.append((a, bytes(buf[i + 1:i + ln - 2])))
+            i += ln
+        # MicroPython bytearrays cannot delete a slice: compact by rebinding
+        if i:
+            buf = self._buf = buf[i:]
+        if len(buf) > self.max_frame:
+            self.resyncs += 1
+            self._buf = buf[len(buf) - self.max_frame:]
+        return out
+
+
+# Diagnostics block: input registers served by SimpleSlave itself (not the node map)
+DIAG_BASE = 0x0100
+DIAG_FRAMES = 0
+DIAG_CRC_ERRORS = 1
+DIAG_FOREIGN = 2
+DIAG_EXCEPTIONS = 3
+DIAG_RESYNCS = 4
+DIAG_COUNT = 5
+DIAG_NAMES = ("frames", "crc_errors", "foreign", "exceptions", "resyncs")
+
+# 0x08 Diagnostics sub-functions (numbers as in the Modbus spec)
+DIAG_SUB_QUERY_DATA = 0x00
+DIAG_SUB_CLEAR_COUNTERS = 0x0A
+DIAG_SUB_BUS_MESSAGES = 0x0B
+DIAG_SUB_BUS_CRC_ERRORS = 0x0C
+DIAG_SUB_BUS_EXCEPTIONS = 0x0D
+DIAG_SUB_NODE_MESSAGES = 0x0E
 
 
 class SimpleSlave:
-    """Tiny Modbus RTU slave. Handles 0x03 (Read Holding), 0x06 (Write Single), 0x10 (Write Multiple).
+    """Tiny Modbus RTU slave. Handles 0x03 (Read Holding), 0x04 (Read Input), 0x06 (Write Single),
+    0x08 (Diagnostics), 0x10 (Write Multiple) and 0x17 (Read/Write Multiple).
 
     reg_read: Callable[[int, int], Tuple[bool, Tuple[int, ...]]]
-      Given (start, count) -> (ok, values)
+      Given (start, count) -> (ok, values). values may also be the registers'
+      big-endian bytes (e.g. a RegisterBank.view); they are then copied as-is.
     reg_write: Callable[[int, Tuple[int, ...]], bool]
       Given (start, values) -> ok
+    input_cb: optional, same signature as reg_read, serves the read-only input bank (0x04).
+      Without it 0x04 answers "illegal function".
+    generation: optional Callable[[], int] that changes whenever any register value
+      changes (e.g. PumpMap.generation). With it, complete 0x03/0x04 responses are
+      cached per (function, start, count) and reused while the generation is unchanged.
+
+    Bus counters (frames, CRC errors, foreign frames, exceptions sent, resyncs) are
+    readable as input registers DIAG_BASE.. (0x04, always available) and through the
+    0x08 sub-functions above; all counters are reported mod 2^16.
     """
 
-    def __init__(self, addr: int, read_cb: Callable[[int, int], Tuple[bool, Tuple[int, ...]]], write_cb: Callable[[int, Tuple[int, ...]], bool]):
+    CACHE_SLOTS = 4
+
+    def __init__(self, addr: int, read_cb: Callable[[int, int], Tuple[bool, Tuple[int, ...]]], write_cb: Callable[[int, Tuple[int, ...]], bool], gap_us: int = 0,
+                 input_cb: Optional[Callable[[int, int], Tuple[bool, Tuple[int, ...]]]] = None,
+                 generation: Optional[Callable[[], int]] = None):
         self.addr = addr
         self.read_cb = read_cb
         self.write_cb = write_cb
-        self._buf = bytearray()
+        self.input_cb = input_cb
+        self.generation = generation
+        # [key, generation, adu] slots, replaced round-robin
+        self._cache = []
+        self._cache_next = 0
+        self.gap_us = gap_us
+        self._dec = RtuFrameDecoder(addr, gap_us=gap_us)
+        self._tx = bytearray(255)
+        self._txv = memoryview(self._tx)
+        self.exceptions = 0
 
     def _exception(self, func: int, code: int) -> bytes:
+        self.exceptions += 1
         return build_adu(self.addr, bytes([func | 0x80, code]))
 
+    def set_gap_us(self, gap_us: int):
+        """New inter-frame gap after a baud change (see frame_gap_us)."""
+        self.gap_us = gap_us
+        self._dec.gap_us = gap_us
+        self._dec.reset()
+
+    def diag_counters(self) -> Tuple[int, ...]:
+        """Counters in DIAG_* order, mod 2^16."""
+        d = self._dec
+        return (d.frames & 0xFFFF, d.crc_errors & 0xFFFF, d.foreign & 0xFFFF,
+                self.exceptions & 0xFFFF, d.resyncs & 0xFFFF)
+
+    def clear_counters(self):
+        self._dec.clear_counters()
+        self.exceptions = 0
+
+    def _diag_read(self, start: int, count: int):
+        start -= DIAG_BASE
+        if start < 0 or start + count > DIAG_COUNT:
+            return False, ()
+        return True, self.diag_counters()[start:start + count]
+
+    def _diagnostics(self, pdu: bytes) -> bytes:
+        if len(pdu) != 5:
+            return self._exception(0x08, 0x03)
+        sub = (pdu[1] << 8) | pdu[2]
+        if sub == DIAG_SUB_QUERY_DATA:
+            return build_adu(self.addr, pdu)
+        if sub == DIAG_SUB_CLEAR_COUNTERS:
+            self.clear_counters()
+            return build_adu(self.addr, pdu)
+        d = self._dec
+        if sub == DIAG_SUB_BUS_MESSAGES:
+            v = d.frames + d.foreign
+        elif sub == DIAG_SUB_BUS_CRC_ERRORS:
+            v = d.crc_errors
+        elif sub == DIAG_SUB_BUS_EXCEPTIONS:
+            v = self.exceptions
+        elif sub == DIAG_SUB_NODE_MESSAGES:
+            v = d.frames
+        else:
+            return self._exception(0x08, 0x01)
+        return build_adu(self.addr, bytes([0x08, pdu[1], pdu[2], (v >> 8) & 0xFF, v & 0xFF]))
+
+    def _read_response(self, func: int, cb, start: int, count: int):
+        # Built in the reusable tx buffer; the returned view is valid until the next request.
+        if count < 1 or count > 125:
+            return self._exception(func, 0x03)
+        ok, vals = cb(start, count)
+        if not ok:
+            return self._exception(func, 0x02)
+        n = 2 * count
+        tx = self._tx
+        if isinstance(vals, (bytes, bytearray, memoryview)):
+            if len(vals) != n:
+                return self._exception(func, 0x03)
+            tx[3:3 + n] = vals
+        else:
+            if len(vals) != count:
+                return self._exception(func, 0x03)
+            i = 3
+            for v in vals:
+                tx[i] = (v >> 8) & 0xFF
+                tx[i + 1] = v & 0xFF
+                i += 2
+        tx[0] = self.addr
+        tx[1] = func
+        tx[2] = n
+        c = crc16_update(CRC16_INIT, self._txv[:3 + n])
+        tx[3 + n] = c & 0xFF
+        tx[4 + n] = c >> 8
+        return self._txv[:5 + n]
+
+    def _cached_read(self, func: int, start: int, count: int):
+        if count < 1 or count > 125:
+            return self._exception(func, 0x03)
+        gen = self.generation()
+        # 0x03/0x04, start and count packed into a small int (no allocation on MicroPython)
+        key = ((func & 1) << 23) | (start << 7) | count
+        for slot in self._cache:
+            if slot[0] == key:
+                if slot[1] == gen:
+                    return slot[2]
+                break
+        else:
+            slot = None
+        resp = self._read_response(func, self.read_cb if func == 0x03 else self.input_cb, start, count)
+        if resp[1] & 0x80:
+            return resp  # don't cache exceptions
+        if slot is None:
+            if len(self._cache) < self.CACHE_SLOTS:
+                slot = [key, gen, bytearray(resp)]
+                self._cache.append(slot)
+                return slot[2]
+            slot = self._cache[self._cache_next]
+            self._cache_next = (self._cache_next + 1) % self.CACHE_SLOTS
+            slot[0] = key
+        slot[1] = gen
+        if len(slot[2]) == len(resp):
+            slot[2][:] = resp
+        else:
+            slot[2] = bytearray(resp)
+        return slot[2]
+
     def _handle_pdu(self, pdu: bytes) -> bytes:
         func = pdu[0]
-        if func == 0x03:  # Read Holding Registers
+        if func == 0x04 and len(pdu) == 5 and ((pdu[1] << 8) | pdu[2]) >= DIAG_BASE:  # Diagnostics block
+            return self._read_response(func, self._diag_read, (pdu[1] << 8) | pdu[2], (pdu[3] << 8) | pdu[4])
+        if func == 0x03 or (func == 0x04 and self.input_cb is not None):  # Read Holding / Input Registers
             if len(pdu) != 5:
                 return self._exception(func, 0x03)
             start = (pdu[1] << 8) | pdu[2]
             count = (pdu[3] << 8) | pdu[4]
-            ok, vals = self.read_cb(start, count)
-            if not ok:
-                return self._exception(func, 0x02)
-            if len(vals) != count:
-                return self._exception(func, 0x03)
-            by = bytearray([func, count * 2])
-            for v in vals:
-                by.append((v >> 8) & 0xFF)
-                by.append(v & 0xFF)
-            return build_adu(self.addr, bytes(by))
+            if self.generation is None:
+                return self._read_response(func, self.read_cb if func == 0x03 else self.input_cb, start, count)
+            return self._cached_read(func, start, count)
         elif func == 0x06:  # Write Single Register
             if len(pdu) != 5:
                 return self._exception(func, 0x03)
@@ -108,24 +497,42 @@ class SimpleSlave:
                 return self._exception(func, 0x02)
             # Echo start & count
             return build_adu(self.addr, bytes([func, (start >> 8) & 0xFF, start & 0xFF, (count >> 8) & 0xFF, count & 0xFF]))
+        elif func == 0x17:  # Read/Write Multiple: write first, then read
+            if len(pdu) < 10:
+                return self._exception(func, 0x03)
+            rstart = (pdu[1] << 8) | pdu[2]
+            rcount = (pdu[3] << 8) | pdu[4]
+            wstart = (pdu[5] << 8) | pdu[6]
+            wcount = (pdu[7] << 8) | pdu[8]
+            nbytes = pdu[9]
+            if nbytes != wcount * 2 or len(pdu) != 10 + nbytes or rcount < 1 or rcount > 125:
+                return self._exception(func, 0x03)
+            vals = []
+            i = 10
+            for _ in range(wcount):
+                vals.append((pdu[i] << 8) | pdu[i + 1])
+                i += 2
+            if not self.write_cb(wstart, tuple(vals)):
+                return self._exception(func, 0x02)
+            return self._read_response(func, self.read_cb, rstart, rcount)
+        elif func == 0x08:
+            return self._diagnostics(pdu)
         else:
             return self._exception(func, 0x01)
 
-    def feed_uart(self, data: bytes) -> Optional[bytes]:
+    def feed_uart(self, data: bytes, now_us: Optional[int] = None):
         """Feed raw UART bytes; returns a response ADU or None if incomplete/ignored.
         Caller is responsible for turnaround timing (DE toggling) and inter-frame gap if needed.
+
+        Read responses are a memoryview into the slave's tx buffer: write it out
+        (or copy it) before feeding the next request.
+
+        Every complete request in `data` is executed; only the response to the last
+        one is returned since the master has given up on the earlier ones.
+        Pass `now_us` (e.g. time.ticks_us()) only when polling the UART faster than the
+        inter-frame gap; see RtuFrameDecoder.
         """
-        self._buf.extend(data)
-        # Try to find a complete frame (we assume clean frame boundaries or single frame bursts)
-        if len(self._buf) < 4:
-            return None
-        # Attempt CRC check on current buffer; if bad, drop first byte and resync
-        try:
-            addr, pdu = check_and_strip_adu(bytes(self._buf))
-        except ValueError:
-            self._buf = self._buf[1:]
-            return None
-        self._buf.clear()
-        if addr != self.addr:
-            return None
-        return self._handle_pdu(pdu)
+        resp = None
+        for _, pdu in self._dec.feed(data, now_us):
+            resp = self._handle_pdu(pdu)
+        return resp
@@ -0,0 +1,143 @@
+"""Register-map schema shared by the nodes and the master.
+
+One declaration per node kind lists its holding and input registers with their
+enums and scaling (see docs/developer_guide.md for the register map). From it,
+at import time, each `Field` builds the lookup it needs once:
+- nodes: name -> code dicts for the status/reason enums and `encode()` for scaled
+  values, so the control loops do a single dict lookup per publish
+- master: code -> name tuples and a per-address decoder table, so
+  `NodeSchema.decode_holding()` turns a whole register block into a dict in one pass
+"""
+
+from typing import Dict, Optional, Tuple
+
+from firmware.common import config
+from firmware.core.modbus_maps import REG_STATUS, REG_REASON, REG_TANK_OK, REG_SEQ, REG_BAUD, INP_OVERRUNS
+
+ENUM = "enum"
+BOOL = "bool"
+U16 = "u16"
+
+
+class Field:
+    """One 16-bit register.
+
+    enum: tuple of names, index = code (ENUM); aliases map extra names onto a code name.
+    div / mul: raw = value * div / mul, value = raw * mul / div (U16).
+    unknown: raw value that means "no reading" (decodes to None, encodes None).
+    """
+
+    def __init__(self, name: str, addr: int, kind: str = U16, enum: Tuple = (), aliases: Optional[Dict] = None,
+                 div: int = 1, mul: int = 1, unknown: Optional[int] = None):
+        self.name = name
+        self.addr = addr
+        self.kind = kind
+        self.enum = enum
+        self.div = div
+        self.mul = mul
+        self.unknown = unknown
+        codes = {n: i for i, n in enumerate(enum)}
+        for alias, target in (aliases or {}).items():
+            codes[alias] = codes[target]
+        self.codes = codes
+        self._max = 0xFFFE if unknown == 0xFFFF else 0xFFFF
+
+    def encode(self, value) -> int:
+        if self.kind == ENUM:
+            return self.codes.get(value, 0)
+        if value is None:
+            return 0 if self.unknown is None else self.unknown
+        if self.kind == BOOL:
+            return 1 if value else 0
+        raw = int(value * self.div) // self.mul
+        return 0 if raw < 0 else (raw if raw < self._max else self._max)
+
+    def decode(self, raw: int):
+        if self.kind == ENUM:
+            return self.enum[raw] if raw < len(self.enum) else raw
+        if self.kind == BOOL:
+            return bool(raw)
+        if raw == self.unknown:
+            return None
+        if self.div == 1:
+            return raw * self.mul
+        return raw * self.mul / self.div
+
+
+class NodeSchema:
+    def __init__(self, kind: str, holding: Tuple[Field, ...], inputs: Tuple[Field, ...] = ()):
+        self.kind = kind
+        self.holding = {f.name: f for f in holding}
+        self.inputs = {f.name: f for f in inputs}
+        self.status = self.holding["status"]
+        self.reason = self.holding["reason"]
+        self._hold_tbl = self._table(holding)
+        self._inp_tbl = self._table(inputs)
+
+    @staticmethod
+    def _table(fields) -> Tuple[Optional[Field], ...]:
+        size = max((f.addr for f in fields), default=-1) + 1
+        tbl = [None] * size
+        for f in fields:
+            tbl[f.addr] = f
+        return tuple(tbl)
+
+    @staticmethod
+    def _decode(tbl, values, start: int) -> dict:
+        out = {}
+        n = len(tbl)
+        for i, raw in enumerate(values):
+            a = start + i
+            if a < n:
+                f = tbl[a]
+                if f is not None:
+                    out[f.name] = f.decode(raw)
+        return out
+
+    def decode_holding(self, values, start: int = 0) -> dict:
+        """Named, scaled values for a block of holding registers read from `start`."""
+        return self._decode(self._hold_tbl, values, start)
+
+    def decode_input(self, values, start: int = 0) -> dict:
+        return self._decode(self._inp_tbl, values, start)
+
+
+def _status_block(status: Tuple, reason: Tuple, tank_ok: bool, aliases: Optional[Dict] = None) -> Tuple[Field, ...]:
+    fields = [
+        Field("status", REG_STATUS, ENUM, status, aliases),
+        Field("reason", REG_REASON, ENUM, reason),
+        Field("seq", REG_SEQ),
+        Field("baud", REG_BAUD, mul=100),
+    ]
+    if tank_ok:
+        fields.append(Field("tank_ok", REG_TANK_OK, BOOL))
+    return tuple(fields)
+
+
+PUMP = NodeSchema(
+    "pump",
+    _status_block(("idle", "run", "inhibit", "fault"),
+                  (None, "rest", "rate_limit", "tank_not_ok", "watchdog_expired", "pump_run_timeout"), tank_ok=True),
+    (Field("tank_level_pct", 0, div=10, unknown=0xFFFF), Field("overruns", INP_OVERRUNS)),
+)
+AUTOFILL = NodeSchema(
+    "autofill",
+    _status_block(("ok", "fill", "inhibit", "fault"),
+                  (None, "rate_limit", "tank_not_ok", "fill_timeout", "watchdog_expired"), tank_ok=True),
+    (Field("tank_level_pct", 0, div=10, unknown=0xFFFF), Field("overruns", INP_OVERRUNS)),
+)
+BOILER = NodeSchema(
+    "boiler",
+    _status_block(("idle", "heat", "inhibit", "fault"),
+                  (None, "autofill", "sensor_out_of_range", "heater_on_timeout", "watchdog_expired"), tank_ok=False,
+                  aliases={"hold": "heat"}),
+    (Field("pressure_bar", 0, div=1000), Field("overruns", INP_OVERRUNS)),
+)
+
+NODES = {"pump": PUMP, "autofill": AUTOFILL, "boiler": BOILER}
+
+
+def for_addr(addr: int) -> Optional[NodeSchema]:
+    """Schema of the node at a configured bus address."""
+    bus = config.bus
+    return {bus.addr_pump: PUMP, bus.addr_autofill: AUTOFILL, bus.addr_boiler: BOILER}.get(addr)
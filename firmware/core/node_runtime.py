@@ -0,0 +1,82 @@
+"""Cooperative runtime for the node entrypoints (uasyncio on the nodes, asyncio under CPython).
+
+Runs as independent tasks:
+- sampling (e.g. TankMonitor.sample) at the sensor rate
+- the controller tick and register publish at the control period, on the
+  fixed-rate grid of a `LoopScheduler` (jitter/overrun counters in `rt.sched`);
+  `control` gets the tick's ticks_ms value, and an optional `GcMonitor`
+  measures its allocations and collects garbage in the slack after it
+- Modbus serving, woken by UART readiness, so a request is answered within a
+  few milliseconds whatever the control period is
+
+Tasks only share the register map, which is updated in place; nothing blocks
+except the short UART write of a response.
+"""
+
+try:
+    import uasyncio as asyncio  # type: ignore
+except ImportError:
+    import asyncio
+
+from typing import Callable, Optional
+
+from firmware.common.clock import MONOTONIC
+from firmware.core.loop_scheduler import LoopScheduler
+
+try:
+    sleep_ms = asyncio.sleep_ms  # uasyncio: no float per sleep
+except AttributeError:
+    def sleep_ms(ms: int):
+        return asyncio.sleep(ms / 1000)
+
+
+class NodeRuntime:
+    def __init__(self, control: Callable[[int], None], control_period_ms: int, link=None,
+                 sample: Optional[Callable[[], None]] = None, sample_period_ms: int = 100,
+                 clock=MONOTONIC, reader=None, gc_monitor=None):
+        self.control = control
+        self.control_period_ms = control_period_ms
+        self.link = link
+        self.sample = sample
+        self.sample_period_ms = sample_period_ms
+        self.sched = LoopScheduler(control_period_ms, clock)
+        self.reader = reader  # stream for Rs485Link.serve; None wraps the link's UART
+        self.gc_monitor = gc_monitor
+        self.ticks = 0
+
+    async def _sample_task(self):
+        period_ms = self.sample_period_ms
+        while True:
+            self.sample()
+            await sleep_ms(period_ms)
+
+    async def _control_task(self):
+        sched = self.sched
+        link = self.link
+        gcm = self.gc_monitor
+        control = self.control
+        while True:
+            if gcm is not None:
+                gcm.begin()
+            control(sched.begin())
+            if gcm is not None:
+                gcm.end()
+            self.ticks += 1
+            if link is not None and link.switch_pending:
+                link.check_fallback(sched.now_s())
+            if gcm is not None:
+                gcm.idle()
+            await sleep_ms(sched.end())
+
+    async def run(self):
+        self.sched.start()
+        tasks = [asyncio.create_task(self._control_task())]
+        if self.sample is not None:
+            tasks.append(asyncio.create_task(self._sample_task()))
+        if self.link is not None:
+            tasks.append(asyncio.create_task(self.link.serve(self.sched.now_s, self.reader)))
+        await asyncio.gather(*tasks)
+
+    def start(self):
+        """Run forever (node entrypoint)."""
+        asyncio.run(self.run())
@@ -0,0 +1,76 @@
+"""ADC-count lookup for the boiler's thermistor (temp) control mode.
+
+Built once at boot from ThermistorConfig, the saturation curve in
+`HAL.steam_pressure_from_temp_c` and BoilerConfig, so the control tick needs
+no floating point or transcendental math:
+- the plausibility range and the heat/idle thresholds are translated into ADC
+  counts (pressure falls as counts rise: a hotter NTC pulls the divider down),
+  found by bisection on the exact float conversion, so decisions match it
+- `mbar(counts)` looks telemetry (input register 0x0000, encoded by the schema)
+  up in a per-count table covering the counts between 0 bar and 65.535 bar
+
+Counts outside the conversion's valid divider range read as 25 °C there, i.e.
+implausible; they fall outside the plausible count range here too.
+"""
+
+from array import array
+
+from firmware.common import config
+from firmware.core.hal_mpy import HAL
+from firmware.core.modbus_schema import BOILER
+
+
+class PressureLut:
+    def __init__(self, therm: config.ThermistorConfig = config.thermistor,
+                 boiler: config.BoilerConfig = config.boiler):
+        self.therm = therm
+        full = therm.adc_fullscale_counts
+        self.full = full
+
+        def bar(c):
+            return HAL.steam_pressure_from_temp_c(HAL.temp_c_from_counts(c, therm))
+
+        # Counts whose divider voltage the float conversion accepts
+        vref = therm.vref_v
+        lo = 0
+        while lo < full and (lo / full) * vref <= 0.001:
+            lo += 1
+        hi = full
+        while hi > lo and (hi / full) * vref >= vref - 0.001:
+            hi -= 1
+
+        def last(pred):
+            # Largest c in [lo, hi] with pred(bar(c)) for a predicate true on a prefix (lo - 1 if none)
+            a, b = lo, hi + 1
+            while a < b:
+                m = (a + b) // 2
+                if pred(bar(m)):
+                    a = m + 1
+                else:
+                    b = m
+            return a - 1
+
+        on_below = boiler.target_bar - boiler.hysteresis_bar
+        off_above = boiler.target_bar + boiler.hysteresis_bar
+        # plausible: sensor_min_bar <= p <= sensor_max_bar
+        self.plausible_lo = last(lambda p: p > boiler.sensor_max_bar) + 1
+        self.plausible_hi = last(lambda p: p >= boiler.sensor_min_bar)
+        # heat: p < on_below; idle: p > off_above
+        self.heat_above = last(lambda p: p >= on_below)
+        self.idle_upto = last(lambda p: p > off_above)
+
+        # Telemetry table: one entry per count from the first count below 65.535 bar
+        # to the first at 0 bar (100 °C), a few hundred entries
+        self.valid_lo = lo
+        self.base = last(lambda p: p * 1000 >= 0xFFFF) + 1
+        end = last(lambda p: p > 0) + 1
+        encode = BOILER.inputs["pressure_bar"].encode
+        self.table = array("H", [encode(bar(c)) for c in range(self.base, end)])
+
+    def mbar(self, counts: int) -> int:
+        """Pressure in mbar (gauge) for raw counts, clamped to 0..0xFFFF."""
+        i = counts - self.base
+        if i < 0:
+            return 0 if counts < self.valid_lo else 0xFFFF
+        t = self.table
+        return t[i] if i < len(t) else 0
@@ -5,79 +5,96 @@ Controls pump based on brew switch input with safety limits:
 - Min rest time between runs
 - Starts-per-minute limit
 
-Inputs: now_s (float), brew_switch (bool)
-Outputs: pump actuator state via HAL
+Inputs: now_ms (ticks) or now_s (float), brew_switch (bool)
+Outputs: pump actuator state via HAL; state/reason attributes
 """
 
 from firmware.common import config
-from firmware.common.safety import FaultLatch, Watchdog, RateLimiter
+from firmware.common.clock import MONOTONIC, ticks_diff
+from firmware.common.safety import FaultLatch, Watchdog, MinIntervalLimiter, SlidingWindowCounter
 
 
 class PumpController:
-    def __init__(self, hal, cfg: config.PumpConfig = config.pump):
+    def __init__(self, hal, cfg: config.PumpConfig = config.pump, clock=MONOTONIC):
         self.cfg = cfg
         self.hal = hal
         self.latch = FaultLatch()
-        self.wd = Watchdog(timeout_s=2.0)
+        self.wd = Watchdog(timeout_s=2.0, clock=clock)
+        self.state = "idle"
+        self.reason = None
 
+        # Limits in integer ms, so step() does no float arithmetic
+        self._max_run_ms = int(cfg.max_run_s * 1000)
+        self.rest = MinIntervalLimiter(cfg.min_rest_s, clock)
+        self.starts = SlidingWindowCounter(cfg.max_starts_per_min, 60, clock)
         self._pump_on = False
-        self._run_start_s = 0.0
-        self._last_stop_s = -1e9
-        self._start_times = []  # timestamps of recent starts (for per-minute limit)
+        self._now_ms = 0
+        self._run_start_ms = 0
 
-    def _enforce_limits_prestart(self, now_s: float):
+    def _enforce_limits_prestart(self, now_ms: int) -> bool:
         # Min rest between runs
-        if (now_s - self._last_stop_s) < self.cfg.min_rest_s:
-            return "inhibit", "rest"
+        if not self.rest.ready(now_ms):
+            self.state, self.reason = "inhibit", "rest"
+            return False
         # Starts per minute
-        window = 60.0
-        self._start_times = [t for t in self._start_times if (now_s - t) <= window]
-        if len(self._start_times) >= self.cfg.max_starts_per_min:
-            return "inhibit", "rate_limit"
-        return None, None
+        if not self.starts.allow(now_ms):
+            self.state, self.reason = "inhibit", "rate_limit"
+            return False
+        return True
 
     def _safe_off(self):
         self.hal.pump(False)
         if self._pump_on:
             self._pump_on = False
-            self._last_stop_s = self._last_time
+            self.rest.mark(self._now_ms)
 
-    def tick(self, now_s: float, brew_switch: bool, tank_ok: bool = True):
-        self._last_time = now_s
+    def step(self, now_ms: int, brew_switch: bool, tank_ok: bool = True):
+        """Allocation-free tick: `now_ms` in ticks_ms; result in self.state / self.reason."""
+        self._now_ms = now_ms
+        self.wd.kick()
+        self.rest.expire(now_ms)
+        self.starts.expire(now_ms)
         if self.wd.expired():
             self.latch.trip("watchdog_expired")
 
         if self.latch.tripped:
             self._safe_off()
-            return "fault", self.latch.reason
+            self.state, self.reason = "fault", self.latch.reason
+            return
 
         # Tank interlock: do not run if tank is not OK
         if not tank_ok and brew_switch:
             self._safe_off()
-            return "inhibit", "tank_not_ok"
+            self.state, self.reason = "inhibit", "tank_not_ok"
+            return
 
         if not brew_switch:
             # command off
             self._safe_off()
-            return "idle", None
+            self.state, self.reason = "idle", None
+            return
 
         # command on
         if not self._pump_on:
-            state, reason = self._enforce_limits_prestart(now_s)
-            if state:
+            if not self._enforce_limits_prestart(now_ms):
                 self._safe_off()
-                return state, reason
+                return
             # Start pump
             self.hal.pump(True)
             self._pump_on = True
-            self._run_start_s = now_s
-            self._start_times.append(now_s)
-            return "run", None
+            self._run_start_ms = now_ms
+            self.starts.record(now_ms)
+        elif ticks_diff(now_ms, self._run_start_ms) > self._max_run_ms:
+            # already running, run-time limit
+            self.latch.trip("pump_run_timeout")
+            self._safe_off()
+            self.state, self.reason = "fault", self.latch.reason
+            return
         else:
-            # already running, check run-time limit
-            if (now_s - self._run_start_s) > self.cfg.max_run_s:
-                self.latch.trip("pump_run_timeout")
-                self._safe_off()
-                return "fault", self.latch.reason
             self.hal.pump(True)
-            return "run", None
+        self.state, self.reason = "run", None
+
+    def tick(self, now_s: float, brew_switch: bool, tank_ok: bool = True):
+        """step() with a timestamp in seconds; returns (state, reason)."""
+        self.step(int(now_s * 1000), brew_switch, tank_ok)
+        return self.state, self.reason
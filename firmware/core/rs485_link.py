@@ -0,0 +1,96 @@
+"""RS485 serving loop shared by the node entrypoints.
+
+Reads the UART, feeds `SimpleSlave`, drives the DE pin around responses and
+applies coordinated baud switches:
+- holding register REG_BAUD holds the current rate / 100 (96, 192, 384, 1152)
+- the master writes the new rate there; the node acknowledges at the old rate,
+  then re-initialises the UART at the new one
+- if no valid request arrives within `fallback_s` after a switch (the master never
+  followed), the node returns to the previous rate
+
+Switches are not persisted: after a reset the node starts at config.bus.baudrate and
+the master finds it again with `ModbusMaster.detect_baudrate`.
+"""
+
+try:
+    import uasyncio as asyncio  # type: ignore
+except ImportError:
+    import asyncio
+
+from firmware.common import config
+from firmware.core.modbus_maps import REG_BAUD
+from firmware.core.modbus_rtu import SimpleSlave, frame_gap_us
+
+
+class Rs485Link:
+    def __init__(self, uart, de, slave: SimpleSlave, bank, baudrate: int = config.bus.baudrate, fallback_s: float = 10.0):
+        self.uart = uart
+        self.de = de
+        self.slave = slave
+        self.bank = bank
+        self.baudrate = baudrate
+        self.fallback_s = fallback_s
+        self.switches = 0
+        self._prev_baud = None
+        self._switched_s = 0.0
+        bank[REG_BAUD] = baudrate // 100
+
+    def _send(self, resp):
+        de = self.de
+        if de is not None:
+            de.value(1)
+        self.uart.write(resp)
+        self.uart.flush()  # returns once the last stop bit is out
+        if de is not None:
+            de.value(0)
+
+    def _set_baud(self, baudrate: int):
+        self.uart.init(baudrate=baudrate)
+        if self.slave.gap_us:
+            self.slave.set_gap_us(frame_gap_us(baudrate))
+        self.baudrate = baudrate
+        self.bank[REG_BAUD] = baudrate // 100
+        self.switches += 1
+
+    def handle(self, data, now_s: float):
+        """Serve the requests in `data` and apply a baud switch they asked for."""
+        if data:
+            resp = self.slave.feed_uart(data)
+            if resp:
+                self._send(resp)
+                # A request decoded at the new rate confirms the switch
+                self._prev_baud = None
+        want = self.bank[REG_BAUD] * 100
+        if want != self.baudrate:
+            prev = self.baudrate
+            self._set_baud(want)
+            self._prev_baud = prev
+            self._switched_s = now_s
+
+    @property
+    def switch_pending(self) -> bool:
+        """A baud switch is waiting for the master to follow."""
+        return self._prev_baud is not None
+
+    def check_fallback(self, now_s: float):
+        """Return to the previous rate if the master never followed a switch."""
+        if self._prev_baud is not None and now_s - self._switched_s >= self.fallback_s:
+            self._set_baud(self._prev_baud)
+            self._prev_baud = None
+
+    def poll(self, now_s: float):
+        """Serve pending requests; call from a polling node loop."""
+        self.handle(self.uart.read(), now_s)
+        self.check_fallback(now_s)
+
+    async def serve(self, clock, reader=None):
+        """Serve requests as soon as the UART has data (see node_runtime).
+
+        `reader` needs an awaitable read(n); by default the UART is wrapped in an
+        asyncio StreamReader, which wakes this task on UART readiness.
+        """
+        if reader is None:
+            reader = asyncio.StreamReader(self.uart)
+        while True:
+            data = await reader.read(256)
+            self.handle(data, clock())
@@ -11,13 +11,14 @@ dependency on a master UX.
 from typing import Optional
 
 from firmware.common import config
+from firmware.common.clock import MONOTONIC
 from firmware.core.tank_sensor import TankLevel
 
 
 class TankMonitor:
-    def __init__(self, tl: Optional[TankLevel] = None, cfg: config.TankLevelConfig = config.tank):
+    def __init__(self, tl: Optional[TankLevel] = None, cfg: config.TankLevelConfig = config.tank, clock=MONOTONIC):
         self.cfg = cfg
-        self.tl = tl or TankLevel()
+        self.tl = tl or TankLevel(clock=clock)
         self.state: str = "unknown"  # ok|low|critical|unknown
         self.level_pct: Optional[float] = None
 
@@ -4,10 +4,13 @@ Sensor sends 4-byte frames at ~10Hz via UART (TTL): 0xFF, 0xXX, 0xYY, sum.
 Distance (mm) = 256 * XX + YY, valid range ~30..4500.
 
 We parse frames with resynchronization and expose level percent using config thresholds.
+Reads never wait for the sensor (see TankLevel), so they are safe to call from the
+node control loops.
 """
 
 from typing import Optional
 from firmware.common import config
+from firmware.common.clock import MONOTONIC, ticks_diff
 
 try:
     from machine import UART
@@ -18,41 +21,83 @@ except ImportError:  # allow import under CPython for tests/tools
 
 
 class DYPFrameParser:
+    """Incremental frame parser over a fixed ring buffer.
+
+    Bytes are appended as they arrive and frames are parsed as soon as they are
+    complete, so a partial frame simply waits for the next feed. When the ring
+    is full the oldest bytes are dropped (only the newest reading matters).
+    """
+
+    SIZE = 32
+
     def __init__(self):
-        self._buf = bytearray()
+        self._ring = bytearray(self.SIZE)
+        self._head = 0  # index of the oldest byte
+        self._count = 0
+        self.frames = 0
+        self.errors = 0
+
+    def _push(self, data):
+        ring = self._ring
+        size = self.SIZE
+        for b in data:
+            if self._count == size:
+                self._head = (self._head + 1) % size
+                self._count -= 1
+            ring[(self._head + self._count) % size] = b
+            self._count += 1
 
     def feed(self, data: bytes) -> Optional[int]:
-        """Feed bytes, return distance_mm if a valid frame is parsed else None."""
-        self._buf.extend(data)
-        # Attempt to parse frames from buffer
-        while len(self._buf) >= 4:
+        """Feed bytes, return the newest valid distance_mm they completed, else None."""
+        if data:
+            self._push(data)
+        ring = self._ring
+        size = self.SIZE
+        dist = None
+        while self._count >= 4:
+            h = self._head
             # sync to 0xFF
-            if self._buf[0] != 0xFF:
-                # drop until 0xFF
-                del self._buf[0]
+            if ring[h] != 0xFF:
+                self._head = (h + 1) % size
+                self._count -= 1
                 continue
-            frame = self._buf[:4]
-            s = (frame[0] + frame[1] + frame[2]) & 0xFF
-            if frame[3] != s:
+            hi = ring[(h + 1) % size]
+            lo = ring[(h + 2) % size]
+            if ring[(h + 3) % size] != (0xFF + hi + lo) & 0xFF:
                 # bad checksum, drop first byte
-                del self._buf[0]
+                self.errors += 1
+                self._head = (h + 1) % size
+                self._count -= 1
                 continue
-            # valid frame
-            dist = frame[1] * 256 + frame[2]
-            # pop frame
-            del self._buf[:4]
-            if 30 <= dist <= 4500:
-                return dist
+            self._head = (h + 4) % size
+            self._count -= 4
+            d = hi * 256 + lo
+            if 30 <= d <= 4500:
+                self.frames += 1
+                dist = d
             # else ignore out-of-range and continue
-        return None
+        return dist
 
 
 class TankLevel:
-    def __init__(self, uart=None, cfg: config.TankLevelConfig = config.tank):
+    """Non-blocking reader: each call drains what the UART already holds.
+
+    The UART driver buffers the sensor's bytes under interrupt; `read_level_percent`
+    takes them with one zero-timeout read, so it costs the same whether or not the
+    sensor is present. The smoothed level moves only when a new frame arrived
+    (the sensor's ~10 Hz, however often it is called) and reads as None once no
+    frame has been seen for `stale_ms`.
+    """
+
+    def __init__(self, uart=None, cfg: config.TankLevelConfig = config.tank, stale_ms: int = 500,
+                 clock=MONOTONIC):
         self.cfg = cfg
         self.uart = uart
         self.parser = DYPFrameParser()
+        self.stale_ms = stale_ms
+        self.clock = clock
         self._ema = None
+        self._last_frame_ms = None
 
         if self.uart is None and MICROPY:
             # Initialize UART from pins
@@ -63,26 +108,23 @@ class TankLevel:
                     baudrate=9600,
                     tx=pins.tank_uart_tx,
                     rx=pins.tank_uart_rx,
-                    timeout=100,
+                    timeout=0,
+                    rxbuf=64,
                 )
             except Exception:
                 self.uart = None
 
     def _read_distance_mm(self) -> Optional[int]:
+        """Newest distance received since the last call, without waiting for one."""
         if not self.uart:
             return None
-        # Try a few reads to handle partial frames
-        for _ in range(8):
-            try:
-                data = self.uart.read()
-            except Exception:
-                data = None
-            if not data:
-                continue
-            dist = self.parser.feed(data)
-            if dist is not None:
-                return dist
-        return None
+        try:
+            data = self.uart.read()
+        except Exception:
+            data = None
+        if not data:
+            return None
+        return self.parser.feed(data)
 
     def _distance_to_percent(self, dist_mm: int) -> float:
         full_d = float(self.cfg.full_distance_mm)
@@ -95,8 +137,14 @@ class TankLevel:
 
     def read_level_percent(self) -> Optional[float]:
         d = self._read_distance_mm()
+        now = self.clock.ticks_ms()
         if d is None:
-            return None
+            last = self._last_frame_ms
+            if last is None or ticks_diff(now, last) > self.stale_ms:
+                self._ema = None  # a sensor that comes back starts a fresh average
+                return None
+            return self._ema
+        self._last_frame_ms = now
         pct = self._distance_to_percent(d)
         a = self.cfg.smoothing_alpha
         if self._ema is None:
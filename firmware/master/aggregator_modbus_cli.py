@@ -15,20 +15,23 @@ try:
 except Exception:  # pragma: no cover
     serial = None
 
-from firmware.master.modbus_master import build_read_holding, parse_read_holding_response
+from firmware.master.modbus_master import ModbusMaster
+from firmware.core.modbus_schema import NODES
 from firmware.common import config
 
 
-def poll_once(ser, addr: int, start: int, count: int):
-    req = build_read_holding(addr, start, count)
-    ser.write(req)
-    ser.flush()
-    ser.timeout = 0.2
-    resp = ser.read(256)
-    if not resp:
-        return None
-    _, vals = parse_read_holding_response(resp)
-    return vals
+def poll_once(master: ModbusMaster, addr: int, start: int, count: int):
+    return master.read_holding(addr, start, count)
+
+
+def snapshot(master: ModbusMaster, count: int = 4) -> dict:
+    """Status block of every core node, decoded with the register schema; None if a node is silent."""
+    addrs = {"pump": config.bus.addr_pump, "autofill": config.bus.addr_autofill, "boiler": config.bus.addr_boiler}
+    out = {}
+    for kind, addr in addrs.items():
+        vals = poll_once(master, addr, 0, count)
+        out[kind] = NODES[kind].decode_holding(vals) if vals is not None else None
+    return out
 
 
 def main():
@@ -40,16 +43,8 @@ def main():
         print("pyserial not installed", file=sys.stderr)
         sys.exit(2)
     ser = serial.Serial(ns.port, baudrate=ns.baud, timeout=0.2)
-    # Basic snapshot
-    pump = poll_once(ser, config.bus.addr_pump, 0, 4) or (0, 0, 0)
-    af = poll_once(ser, config.bus.addr_autofill, 0, 4) or (0, 0, 0)
-    bo = poll_once(ser, config.bus.addr_boiler, 0, 4) or (0, 0)
-    out = {
-        "pump": {"status": pump[0], "reason": pump[1], "tank_ok": pump[2]},
-        "autofill": {"status": af[0], "reason": af[1], "tank_ok": af[2]},
-        "boiler": {"status": bo[0], "reason": bo[1]},
-    }
-    print(json.dumps(out))
+    master = ModbusMaster(ser, baudrate=ns.baud, timeout_s=0.2)
+    print(json.dumps(snapshot(master)))
 
 
 if __name__ == "__main__":
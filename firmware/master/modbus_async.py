@@ -0,0 +1,178 @@
+"""Asyncio Modbus RTU client (desktop master).
+
+One `AsyncModbusClient` per RS485 bus. Requests go through a per-bus queue and
+are answered through futures; a single worker per bus runs the blocking
+`ModbusMaster` transaction in that bus's own thread, so several buses poll
+concurrently while the event loop stays free for the tank/scale services.
+
+pyserial has no native asyncio API (pyserial-asyncio would be an extra
+dependency), hence the one-thread-per-bus executor. A transaction that has
+already reached the wire cannot be interrupted; it ends within the port timeout.
+
+Usage (example):
+  python -m firmware.master.modbus_async --port /dev/ttyUSB0 --port /dev/ttyUSB1
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+try:
+    import serial  # type: ignore
+except Exception:  # pragma: no cover
+    serial = None
+
+from firmware.master.modbus_master import (ModbusMaster, build_read_pdu, build_write_multiple_pdu,
+                                           build_read_write_multiple_pdu, decode_registers)
+from firmware.common import config
+
+
+class BusClosed(Exception):
+    pass
+
+
+class AsyncModbusClient:
+    def __init__(self, master: ModbusMaster, name: str = "bus", queue_size: int = 32):
+        self.master = master
+        self.name = name
+        self._q: Optional[asyncio.Queue] = None
+        self._queue_size = queue_size
+        self._worker: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    async def start(self):
+        if self._worker is not None:
+            return
+        self._q = asyncio.Queue(self._queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="modbus-" + self.name)
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self):
+        worker, self._worker = self._worker, None
+        if worker is not None:
+            worker.cancel()
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+        q = self._q
+        while q is not None and not q.empty():
+            _, _, fut = q.get_nowait()
+            if not fut.done():
+                fut.set_exception(BusClosed(self.name))
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            # A transaction already on the wire ends within the port timeout: wait
+            # for it off the event loop so the other buses keep running
+            await asyncio.get_running_loop().run_in_executor(None, executor.shutdown, True)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        q = self._q
+        while True:
+            addr, pdu, fut = await q.get()
+            if fut.done():  # cancelled or timed out while queued: never hits the wire
+                continue
+            try:
+                res = await loop.run_in_executor(self._executor, self.master.transact, addr, pdu)
+            except asyncio.CancelledError:
+                if not fut.done():
+                    fut.set_exception(BusClosed(self.name))
+                raise
+            except Exception as e:
+                if not fut.done():
+                    fut.set_exception(e)
+            else:
+                if not fut.done():
+                    fut.set_result(res)
+
+    async def transact(self, addr: int, pdu: bytes, timeout_s: Optional[float] = None) -> Optional[bytes]:
+        """Queue one request; resolve to the response PDU or None if the node stayed silent.
+
+        timeout_s bounds queueing plus transaction time and raises asyncio.TimeoutError.
+        """
+        if self._worker is None:
+            raise BusClosed(self.name)
+        if timeout_s is None:
+            return await self._submit(addr, pdu)
+        return await asyncio.wait_for(self._submit(addr, pdu), timeout_s)
+
+    async def _submit(self, addr: int, pdu: bytes) -> Optional[bytes]:
+        # Cancelled while queueing: never enqueued; while waiting: the future is
+        # cancelled with us, so the worker skips it
+        fut = asyncio.get_running_loop().create_future()
+        await self._q.put((addr, pdu, fut))
+        return await fut
+
+    async def _read_regs(self, addr: int, pdu: bytes, count: int, timeout_s: Optional[float]) -> Optional[Tuple[int, ...]]:
+        rpdu = await self.transact(addr, pdu, timeout_s)
+        if rpdu is None:
+            return None
+        return decode_registers(rpdu, count)
+
+    async def read_holding(self, addr: int, start: int, count: int, timeout_s: Optional[float] = None) -> Optional[Tuple[int, ...]]:
+        return await self._read_regs(addr, build_read_pdu(0x03, start, count), count, timeout_s)
+
+    async def read_input(self, addr: int, start: int, count: int, timeout_s: Optional[float] = None) -> Optional[Tuple[int, ...]]:
+        return await self._read_regs(addr, build_read_pdu(0x04, start, count), count, timeout_s)
+
+    async def write_single(self, addr: int, reg: int, value: int, timeout_s: Optional[float] = None) -> bool:
+        pdu = bytes([0x06, (reg >> 8) & 0xFF, reg & 0xFF, (value >> 8) & 0xFF, value & 0xFF])
+        return (await self.transact(addr, pdu, timeout_s)) is not None
+
+    async def write_multiple(self, addr: int, start: int, values, timeout_s: Optional[float] = None) -> bool:
+        return (await self.transact(addr, build_write_multiple_pdu(start, values), timeout_s)) is not None
+
+    async def read_write_multiple(self, addr: int, read_start: int, read_count: int, write_start: int, values,
+                                  timeout_s: Optional[float] = None) -> Optional[Tuple[int, ...]]:
+        pdu = build_read_write_multiple_pdu(read_start, read_count, write_start, values)
+        return await self._read_regs(addr, pdu, read_count, timeout_s)
+
+
+async def snapshot(client: AsyncModbusClient, addrs=None, count: int = 4, timeout_s: float = 1.0):
+    """Read the status block of every node on one bus; None for nodes that did not answer."""
+    addrs = addrs or (config.bus.addr_pump, config.bus.addr_autofill, config.bus.addr_boiler)
+    out = {}
+    for a in addrs:
+        try:
+            out[a] = await client.read_holding(a, 0, count, timeout_s)
+        except Exception:
+            out[a] = None
+    return out
+
+
+async def _main(ports: List[str], baud: int):
+    clients = [AsyncModbusClient(ModbusMaster(serial.Serial(p, baudrate=baud, timeout=0.2), baudrate=baud), name=p) for p in ports]
+    for c in clients:
+        await c.start()
+    try:
+        snaps = await asyncio.gather(*(snapshot(c) for c in clients))
+    finally:
+        for c in clients:
+            await c.close()
+    print(json.dumps({p: {str(a): (list(v) if v else None) for a, v in s.items()} for p, s in zip(ports, snaps)}))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", action="append", required=True, help="repeat for each bus")
+    ap.add_argument("--baud", type=int, default=config.bus.baudrate)
+    ns = ap.parse_args()
+    if serial is None:
+        print("pyserial not installed", file=sys.stderr)
+        sys.exit(2)
+    asyncio.run(_main(ns.port, ns.baud))
+
+
+if __name__ == "__main__":
+    main()
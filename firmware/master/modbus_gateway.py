@@ -0,0 +1,361 @@
+"""Modbus TCP / JSON gateway with a shared register mirror (desktop master).
+
+One process owns the RS485 port (through `AsyncModbusClient`) and keeps an
+in-memory mirror of node registers with a timestamp per register. Local clients
+talk to the gateway instead of the serial port:
+- Modbus TCP (MBAP framing, unit id = node address): 0x03/0x04 are answered from
+  the mirror when fresh enough; 0x06/0x10/0x17 are forwarded to the bus.
+- JSON lines: {"op": "read", "addr": 1, "start": 0, "count": 4, "func": 3, "max_age": 0.5}
+  {"op": "write", "addr": 1, "start": 8, "values": [1]}  {"op": "snapshot"}
+
+A stale read goes to the bus once, however many clients asked for it at the same
+time. A background task refreshes each node's status block so the common reads
+never touch the bus. Writes invalidate the mirrored registers they touched once
+they complete; a read already on the bus when a write starts may still hold the
+old values, so it is neither joined by later readers nor stored in the mirror.
+
+Usage (example):
+  python -m firmware.master.modbus_gateway --port /dev/ttyUSB0 --tcp-port 5020 --json-port 5021
+"""
+
+import argparse
+import asyncio
+import json
+import struct
+import sys
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+try:
+    import serial  # type: ignore
+except Exception:  # pragma: no cover
+    serial = None
+
+from firmware.master.modbus_async import AsyncModbusClient
+from firmware.master.modbus_master import ModbusMaster, ModbusException
+from firmware.common import config
+
+EXC_ILLEGAL_FUNCTION = 0x01
+EXC_ILLEGAL_VALUE = 0x03
+EXC_TARGET_NO_RESPONSE = 0x0B
+
+
+class GatewayError(Exception):
+    def __init__(self, code: int):
+        super().__init__("exception_0x%02x" % code)
+        self.code = code
+
+
+class RegisterMirror:
+    """Last known register values per (node, bank) with the time each was read."""
+
+    def __init__(self):
+        self._banks: Dict[Tuple[int, int], Dict[int, Tuple[int, float]]] = {}
+
+    def update(self, addr: int, func: int, start: int, values, ts: float):
+        bank = self._banks.setdefault((addr, func), {})
+        for i, v in enumerate(values):
+            bank[start + i] = (v, ts)
+
+    def invalidate(self, addr: int, func: int, start: int, count: int):
+        bank = self._banks.get((addr, func))
+        if bank:
+            for r in range(start, start + count):
+                bank.pop(r, None)
+
+    def get(self, addr: int, func: int, start: int, count: int, max_age_s: float, now: float) -> Optional[Tuple[Tuple[int, ...], float]]:
+        """(values, age of the oldest register) if all are mirrored and fresh enough, else None."""
+        bank = self._banks.get((addr, func))
+        if not bank:
+            return None
+        vals = []
+        oldest = now
+        for r in range(start, start + count):
+            e = bank.get(r)
+            if e is None or now - e[1] > max_age_s:
+                return None
+            vals.append(e[0])
+            if e[1] < oldest:
+                oldest = e[1]
+        return tuple(vals), now - oldest
+
+    def snapshot(self, now: float) -> dict:
+        out = {}
+        for (addr, func), bank in sorted(self._banks.items()):
+            out.setdefault(str(addr), {})[str(func)] = {str(r): {"value": v, "age_s": round(now - ts, 3)} for r, (v, ts) in sorted(bank.items())}
+        return out
+
+
+class Gateway:
+    def __init__(self, client: AsyncModbusClient, max_age_s: float = 2.0, refresh_period_s: float = config.poll.idle_period_s,
+                 nodes=(config.bus.addr_pump, config.bus.addr_autofill, config.bus.addr_boiler), block=(0, 4),
+                 clock: Callable[[], float] = time.monotonic, bus_timeout_s: float = 2.0):
+        self.client = client
+        self.max_age_s = max_age_s
+        self.refresh_period_s = refresh_period_s
+        self.nodes = tuple(nodes)
+        self.block = block
+        self.clock = clock
+        self.bus_timeout_s = bus_timeout_s
+        self.mirror = RegisterMirror()
+        self._inflight: Dict[Tuple[int, int, int, int], asyncio.Future] = {}
+        self._epoch: Dict[int, int] = {}  # per node, bumped when a write starts
+        self._servers = []
+        self._refresh_task: Optional[asyncio.Task] = None
+        # Statistics
+        self.mirror_hits = 0
+        self.bus_reads = 0
+        self.bus_writes = 0
+
+    # --- Bus access -----------------------------------------------------
+    async def _bus_read(self, addr: int, func: int, start: int, count: int) -> Tuple[int, ...]:
+        self.bus_reads += 1
+        epoch = self._epoch.get(addr, 0)
+        try:
+            if func == 0x03:
+                vals = await self.client.read_holding(addr, start, count, self.bus_timeout_s)
+            else:
+                vals = await self.client.read_input(addr, start, count, self.bus_timeout_s)
+        except ModbusException as e:
+            raise GatewayError(e.code)
+        except (ValueError, asyncio.TimeoutError):
+            vals = None
+        if vals is None:
+            raise GatewayError(EXC_TARGET_NO_RESPONSE)
+        if self._epoch.get(addr, 0) == epoch:
+            self.mirror.update(addr, func, start, vals, self.clock())
+        return vals
+
+    def _forget(self, key, fut):
+        # A write may already have replaced this entry with a newer read
+        if self._inflight.get(key) is fut:
+            del self._inflight[key]
+
+    async def read(self, addr: int, func: int, start: int, count: int, max_age_s: Optional[float] = None) -> Tuple[Tuple[int, ...], float]:
+        """Registers from the mirror if fresh, otherwise from the bus (shared with concurrent callers)."""
+        max_age = self.max_age_s if max_age_s is None else max_age_s
+        hit = self.mirror.get(addr, func, start, count, max_age, self.clock())
+        if hit is not None:
+            self.mirror_hits += 1
+            return hit
+        key = (addr, func, start, count)
+        fut = self._inflight.get(key)
+        if fut is None:
+            fut = asyncio.ensure_future(self._bus_read(addr, func, start, count))
+            self._inflight[key] = fut
+            fut.add_done_callback(lambda f, k=key: self._forget(k, f))
+        vals = await asyncio.shield(fut)
+        return vals, 0.0
+
+    def _begin_write(self, addr: int, start: int, count: int):
+        # Reads already queued may return pre-write values: keep them out of the
+        # mirror and let later readers queue behind the write instead of joining them
+        self.bus_writes += 1
+        self._epoch[addr] = self._epoch.get(addr, 0) + 1
+        end = start + count
+        for key in [k for k in self._inflight if k[0] == addr and k[1] == 0x03 and k[2] < end and start < k[2] + k[3]]:
+            del self._inflight[key]
+
+    async def write(self, addr: int, start: int, values) -> None:
+        self._begin_write(addr, start, len(values))
+        try:
+            if len(values) == 1:
+                ok = await self.client.write_single(addr, start, values[0], self.bus_timeout_s)
+            else:
+                ok = await self.client.write_multiple(addr, start, values, self.bus_timeout_s)
+        except ModbusException as e:
+            raise GatewayError(e.code)
+        except (ValueError, asyncio.TimeoutError):
+            ok = False
+        finally:
+            self.mirror.invalidate(addr, 0x03, start, len(values))
+        if not ok:
+            raise GatewayError(EXC_TARGET_NO_RESPONSE)
+
+    async def read_write(self, addr: int, rstart: int, rcount: int, wstart: int, values) -> Tuple[int, ...]:
+        self._begin_write(addr, wstart, len(values))
+        try:
+            vals = await self.client.read_write_multiple(addr, rstart, rcount, wstart, values, self.bus_timeout_s)
+        except ModbusException as e:
+            raise GatewayError(e.code)
+        except (ValueError, asyncio.TimeoutError):
+            vals = None
+        finally:
+            self.mirror.invalidate(addr, 0x03, wstart, len(values))
+        if vals is None:
+            raise GatewayError(EXC_TARGET_NO_RESPONSE)
+        self.mirror.update(addr, 0x03, rstart, vals, self.clock())
+        return vals
+
+    async def _refresh_loop(self):
+        start, count = self.block
+        while True:
+            for addr in self.nodes:
+                try:
+                    await self._bus_read(addr, 0x03, start, count)
+                except GatewayError:
+                    pass
+            await asyncio.sleep(self.refresh_period_s)
+
+    # --- Modbus TCP -----------------------------------------------------
+    async def handle_pdu(self, unit: int, pdu: bytes) -> bytes:
+        """Response PDU (normal or exception) for a Modbus TCP request PDU."""
+        func = pdu[0] if pdu else 0
+        try:
+            if func in (0x03, 0x04):
+                if len(pdu) != 5:
+                    raise GatewayError(EXC_ILLEGAL_VALUE)
+                start, count = struct.unpack(">HH", pdu[1:5])
+                if not 1 <= count <= 125:
+                    raise GatewayError(EXC_ILLEGAL_VALUE)
+                vals, _ = await self.read(unit, func, start, count)
+                return struct.pack(">BB%dH" % count, func, 2 * count, *vals)
+            if func == 0x06:
+                if len(pdu) != 5:
+                    raise GatewayError(EXC_ILLEGAL_VALUE)
+                reg, val = struct.unpack(">HH", pdu[1:5])
+                await self.write(unit, reg, (val,))
+                return bytes(pdu)
+            if func == 0x10:
+                if len(pdu) < 6:
+                    raise GatewayError(EXC_ILLEGAL_VALUE)
+                start, count, nbytes = struct.unpack(">HHB", pdu[1:6])
+                if nbytes != 2 * count or len(pdu) != 6 + nbytes or not 1 <= count <= 123:
+                    raise GatewayError(EXC_ILLEGAL_VALUE)
+                await self.write(unit, start, struct.unpack(">%dH" % count, pdu[6:]))
+                return bytes(pdu[:5])
+            if func == 0x17:
+                if len(pdu) < 10:
+                    raise GatewayError(EXC_ILLEGAL_VALUE)
+                rstart, rcount, wstart, wcount, nbytes = struct.unpack(">HHHHB", pdu[1:10])
+                if nbytes != 2 * wcount or len(pdu) != 10 + nbytes or not 1 <= rcount <= 125:
+                    raise GatewayError(EXC_ILLEGAL_VALUE)
+                vals = await self.read_write(unit, rstart, rcount, wstart, struct.unpack(">%dH" % wcount, pdu[10:]))
+                return struct.pack(">BB%dH" % rcount, func, 2 * rcount, *vals)
+            raise GatewayError(EXC_ILLEGAL_FUNCTION)
+        except GatewayError as e:
+            return bytes([(func | 0x80) & 0xFF, e.code])
+
+    async def _tcp_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                hdr = await reader.readexactly(7)
+                tid, proto, length, unit = struct.unpack(">HHHB", hdr)
+                if length < 2 or length > 254:
+                    break
+                pdu = await reader.readexactly(length - 1)
+                if proto != 0:
+                    continue
+                rpdu = await self.handle_pdu(unit, pdu)
+                writer.write(struct.pack(">HHHB", tid, 0, len(rpdu) + 1, unit) + rpdu)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    # --- JSON lines -----------------------------------------------------
+    async def handle_json(self, req: dict) -> dict:
+        op = req.get("op")
+        try:
+            if op == "read":
+                func, count = int(req.get("func", 3)), int(req.get("count", 1))
+                if func not in (0x03, 0x04) or not 1 <= count <= 125:
+                    raise ValueError(func, count)
+                vals, age = await self.read(int(req["addr"]), func, int(req.get("start", 0)), count, req.get("max_age"))
+                return {"values": list(vals), "age_s": round(age, 3)}
+            if op == "write":
+                values = [int(v) & 0xFFFF for v in req["values"]]
+                if not 1 <= len(values) <= 123:
+                    raise ValueError(len(values))
+                await self.write(int(req["addr"]), int(req["start"]), values)
+                return {"ok": True}
+            if op == "snapshot":
+                return {"mirror": self.mirror.snapshot(self.clock())}
+            if op == "stats":
+                return {"mirror_hits": self.mirror_hits, "bus_reads": self.bus_reads, "bus_writes": self.bus_writes,
+                        "nodes": self.client.master.stats_dict()}
+        except GatewayError as e:
+            return {"error": str(e)}
+        except (KeyError, TypeError, ValueError):
+            return {"error": "bad_request"}
+        return {"error": "unknown_op"}
+
+    async def _json_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    req = json.loads(line)
+                except ValueError:
+                    out = {"error": "bad_json"}
+                else:
+                    out = await self.handle_json(req) if isinstance(req, dict) else {"error": "bad_request"}
+                writer.write((json.dumps(out) + "\n").encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    # --- Lifecycle ------------------------------------------------------
+    async def start(self, host: str = "127.0.0.1", tcp_port: Optional[int] = 5020, json_port: Optional[int] = 5021, refresh: bool = True):
+        """Start servers (port 0 picks a free port, None disables) and the refresh task."""
+        if tcp_port is not None:
+            self._servers.append(await asyncio.start_server(self._tcp_client, host, tcp_port))
+        if json_port is not None:
+            self._servers.append(await asyncio.start_server(self._json_client, host, json_port))
+        if refresh:
+            self._refresh_task = asyncio.ensure_future(self._refresh_loop())
+        return [s.sockets[0].getsockname()[1] for s in self._servers]
+
+    async def close(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+        for s in self._servers:
+            s.close()
+            await s.wait_closed()
+        self._servers = []
+
+
+async def _main(ns):
+    client = AsyncModbusClient(ModbusMaster(serial.Serial(ns.port, baudrate=ns.baud, timeout=0.2), baudrate=ns.baud), name=ns.port)
+    await client.start()
+    gw = Gateway(client, max_age_s=ns.max_age, refresh_period_s=ns.refresh)
+    ports = await gw.start(ns.host, ns.tcp_port, ns.json_port)
+    print(json.dumps({"listening": ports}))
+    sys.stdout.flush()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await gw.close()
+        await client.close()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", required=True)
+    ap.add_argument("--baud", type=int, default=config.bus.baudrate)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--tcp-port", type=int, default=5020)
+    ap.add_argument("--json-port", type=int, default=5021)
+    ap.add_argument("--max-age", type=float, default=2.0, help="seconds a mirrored register counts as fresh")
+    ap.add_argument("--refresh", type=float, default=config.poll.idle_period_s, help="status block refresh period (s)")
+    ns = ap.parse_args()
+    if serial is None:
+        print("pyserial not installed", file=sys.stderr)
+        sys.exit(2)
+    try:
+        asyncio.run(_main(ns))
+    except KeyboardInterrupt:  # pragma: no cover
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,68 @@
 """Simple Modbus RTU master (desktop CPython) using pyserial (optional).
 
 For unit tests, we only rely on frame builders and leave serial optional.
+
+`ModbusMaster` runs request/response transactions on an open port. It knows the
+response length for each request it sends, so a read returns as soon as the
+last byte arrives instead of waiting out the port timeout. It also keeps per-node
+outcome counts and a round-trip latency histogram (`stats`), finds the rate nodes
+answer at (`detect_baudrate`) and moves the whole bus to another rate
+(`switch_baudrate`).
 """
 
-from typing import Tuple
-from firmware.core.modbus_rtu import build_adu, crc16, check_and_strip_adu
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from firmware.core.modbus_rtu import (
+    build_adu, check_and_strip_adu, frame_gap_us, DIAG_BASE, DIAG_COUNT, DIAG_NAMES, DIAG_SUB_CLEAR_COUNTERS,
+)
+from firmware.core.modbus_maps import REG_BAUD
+from firmware.common import config
+
+
+class ModbusException(Exception):
+    """Node answered with a Modbus exception response."""
+
+    def __init__(self, addr: int, func: int, code: int):
+        super().__init__("modbus_exception addr=%d func=0x%02x code=0x%02x" % (addr, func, code))
+        self.addr = addr
+        self.func = func
+        self.code = code
+
+
+def build_read_pdu(func: int, start: int, count: int) -> bytes:
+    return bytes([func, (start >> 8) & 0xFF, start & 0xFF, (count >> 8) & 0xFF, count & 0xFF])
+
+
+def build_write_multiple_pdu(start: int, values) -> bytes:
+    by = bytearray([0x10, (start >> 8) & 0xFF, start & 0xFF, 0, len(values), 2 * len(values)])
+    for v in values:
+        by.append((v >> 8) & 0xFF)
+        by.append(v & 0xFF)
+    return bytes(by)
+
+
+def build_read_write_multiple_pdu(read_start: int, read_count: int, write_start: int, values) -> bytes:
+    by = bytearray([0x17, (read_start >> 8) & 0xFF, read_start & 0xFF, 0, read_count,
+                    (write_start >> 8) & 0xFF, write_start & 0xFF, 0, len(values), 2 * len(values)])
+    for v in values:
+        by.append((v >> 8) & 0xFF)
+        by.append(v & 0xFF)
+    return bytes(by)
+
+
+def decode_registers(rpdu: bytes, count: int) -> Tuple[int, ...]:
+    """Register values from a 0x03/0x04/0x17 response PDU."""
+    if rpdu[1] != 2 * count or len(rpdu) != 2 + 2 * count:
+        raise ValueError("bad_len")
+    return tuple((rpdu[i] << 8) | rpdu[i + 1] for i in range(2, 2 + 2 * count, 2))
 
 
 def build_read_holding(addr: int, start: int, count: int) -> bytes:
-    pdu = bytes([0x03, (start >> 8) & 0xFF, start & 0xFF, (count >> 8) & 0xFF, count & 0xFF])
-    return build_adu(addr, pdu)
+    return build_adu(addr, build_read_pdu(0x03, start, count))
+
+
+def build_read_input(addr: int, start: int, count: int) -> bytes:
+    return build_adu(addr, build_read_pdu(0x04, start, count))
 
 
 def parse_read_holding_response(frame: bytes) -> Tuple[int, Tuple[int, ...]]:
@@ -25,3 +78,380 @@ def parse_read_holding_response(frame: bytes) -> Tuple[int, Tuple[int, ...]]:
         vals.append((pdu[i] << 8) | pdu[i + 1])
         i += 2
     return addr, tuple(vals)
+
+
+def expected_response_len(pdu: bytes) -> int:
+    """Full ADU length of a normal response to the request `pdu`."""
+    func = pdu[0]
+    if func in (0x03, 0x04, 0x17):
+        count = (pdu[3] << 8) | pdu[4]
+        return 5 + 2 * count
+    if func in (0x06, 0x08, 0x10):
+        return 8
+    raise ValueError("unsupported_func")
+
+
+# Upper bounds (ms) of the latency histogram buckets; one more bucket collects the rest
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class NodeStats:
+    """Transaction outcomes and round-trip latency histogram for one node address.
+
+    Latency is recorded for every complete response (normal or exception), from
+    before the request is written until the last response byte is read.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.ok = 0
+        self.timeouts = 0
+        self.exceptions = 0
+        self.errors = 0  # corrupt or mismatched responses
+        self.hist = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.latency_sum_s = 0.0
+        self.latency_max_s = 0.0
+
+    def record(self, latency_s: float):
+        ms = latency_s * 1000.0
+        i = 0
+        for edge in LATENCY_BUCKETS_MS:
+            if ms <= edge:
+                break
+            i += 1
+        self.hist[i] += 1
+        self.latency_sum_s += latency_s
+        if latency_s > self.latency_max_s:
+            self.latency_max_s = latency_s
+
+    def percentile_ms(self, pct: float) -> Optional[float]:
+        """Upper bound of the bucket holding the pct-th percentile; None if empty or beyond the last bound."""
+        total = sum(self.hist)
+        if not total:
+            return None
+        rank = pct / 100.0 * total
+        seen = 0
+        for i, n in enumerate(self.hist):
+            seen += n
+            if seen >= rank and n:
+                return float(LATENCY_BUCKETS_MS[i]) if i < len(LATENCY_BUCKETS_MS) else None
+        return None
+
+    def as_dict(self) -> dict:
+        n = sum(self.hist)
+        return {
+            "requests": self.requests,
+            "ok": self.ok,
+            "timeouts": self.timeouts,
+            "exceptions": self.exceptions,
+            "errors": self.errors,
+            "latency_ms": {
+                "mean": round(self.latency_sum_s / n * 1000.0, 3) if n else None,
+                "max": round(self.latency_max_s * 1000.0, 3) if n else None,
+                "p50": self.percentile_ms(50),
+                "p90": self.percentile_ms(90),
+                "p99": self.percentile_ms(99),
+                "buckets": dict(zip([str(b) for b in LATENCY_BUCKETS_MS] + ["inf"], self.hist)),
+            },
+        }
+
+
+class ModbusMaster:
+    """Request/response transactions over a pyserial-like port.
+
+    The port needs write(), read(n) and a writable `timeout`; flush() and
+    reset_input_buffer() are used when present.
+
+    timeout_s: how long to wait for the first bytes of a response (node turnaround).
+    char_gap_s: allowed silence between response bytes once a response has started.
+      USB-RS485 adapters deliver bytes in USB packets, so this is well above the
+      wire-level 1.5-character time.
+    clock, sleep: time source (seconds) for latency measurement and for keeping the
+      3.5-character silence between a response and the next request.
+    """
+
+    def __init__(self, ser, baudrate: int = config.bus.baudrate, timeout_s: float = 0.1, char_gap_s: float = 0.02,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.ser = ser
+        self.baudrate = baudrate
+        self.timeout_s = timeout_s
+        self.char_gap_s = char_gap_s
+        self.clock = clock
+        self.sleep = sleep
+        self.stats: Dict[int, NodeStats] = {}
+        self._idle_at_s = None
+        self.set_baudrate(baudrate)
+
+    def set_baudrate(self, baudrate: int):
+        """Retime the master (and the port, if it has a `baudrate` attribute) for a new rate."""
+        self.baudrate = baudrate
+        self._char_s = 11.0 / baudrate
+        self.frame_gap_s = frame_gap_us(baudrate) / 1e6
+        if hasattr(self.ser, "baudrate") and self.ser.baudrate != baudrate:
+            self.ser.baudrate = baudrate
+
+    def wire_time_s(self, request_len: int, response_len: int) -> float:
+        """Bus time of one transaction at the current rate, including the inter-frame gap."""
+        return (request_len + response_len) * self._char_s + self.frame_gap_s
+
+    def node_stats(self, addr: int) -> NodeStats:
+        st = self.stats.get(addr)
+        if st is None:
+            st = self.stats[addr] = NodeStats()
+        return st
+
+    def stats_dict(self) -> dict:
+        return {str(a): st.as_dict() for a, st in sorted(self.stats.items())}
+
+    def wait_idle(self):
+        """Block until the inter-frame gap after the last response has passed."""
+        if self._idle_at_s is not None:
+            wait = self._idle_at_s - self.clock()
+            if wait > 0:
+                self.sleep(wait)
+
+    def _read(self, n: int, timeout_s: float) -> bytes:
+        self.ser.timeout = timeout_s
+        return self.ser.read(n) or b""
+
+    def read_response(self, expected_len: int) -> Optional[bytes]:
+        """Read one response of `expected_len` bytes, stopping early on an exception frame.
+
+        Returns None when the node stays silent or the response is cut short.
+        """
+        # Address, function and first data byte: enough to spot a 5-byte exception frame
+        head = self._read(3, self.timeout_s + 3 * self._char_s)
+        if len(head) < 3:
+            return None
+        total = 5 if head[1] & 0x80 else expected_len
+        rest = total - len(head)
+        if rest <= 0:
+            return head
+        tail = self._read(rest, rest * self._char_s + self.char_gap_s)
+        if len(tail) < rest:
+            return None
+        return head + tail
+
+    def transact(self, addr: int, pdu: bytes) -> Optional[bytes]:
+        """Send `pdu` to `addr` and return the response PDU, or None on timeout.
+
+        Raises ModbusException for exception responses and ValueError for
+        corrupt or mismatched frames. The outcome is counted in `stats[addr]`.
+        """
+        self.wait_idle()
+        st = self.node_stats(addr)
+        st.requests += 1
+        t0 = self.clock()
+        try:
+            rpdu = self._transact(addr, pdu)
+        except ModbusException:
+            st.exceptions += 1
+            st.record(self.clock() - t0)
+            raise
+        except ValueError:
+            st.errors += 1
+            raise
+        if rpdu is None:
+            st.timeouts += 1
+        else:
+            st.ok += 1
+            st.record(self.clock() - t0)
+        return rpdu
+
+    def _transact(self, addr: int, pdu: bytes) -> Optional[bytes]:
+        ser = self.ser
+        reset = getattr(ser, "reset_input_buffer", None)
+        if reset is not None:
+            reset()  # stale bytes would shift the exact-length read
+        ser.write(build_adu(addr, pdu))
+        flush = getattr(ser, "flush", None)
+        if flush is not None:
+            flush()
+        frame = self.read_response(expected_response_len(pdu))
+        self._idle_at_s = self.clock() + self.frame_gap_s
+        if frame is None:
+            return None
+        raddr, rpdu = check_and_strip_adu(frame)
+        if raddr != addr:
+            raise ValueError("bad_addr")
+        if rpdu[0] == pdu[0] | 0x80:
+            raise ModbusException(raddr, pdu[0], rpdu[1])
+        if rpdu[0] != pdu[0]:
+            raise ValueError("bad_func")
+        return rpdu
+
+    def _read_regs(self, addr: int, pdu: bytes, count: int) -> Optional[Tuple[int, ...]]:
+        rpdu = self.transact(addr, pdu)
+        if rpdu is None:
+            return None
+        return decode_registers(rpdu, count)
+
+    def read_holding(self, addr: int, start: int, count: int) -> Optional[Tuple[int, ...]]:
+        return self._read_regs(addr, build_read_pdu(0x03, start, count), count)
+
+    def read_input(self, addr: int, start: int, count: int) -> Optional[Tuple[int, ...]]:
+        return self._read_regs(addr, build_read_pdu(0x04, start, count), count)
+
+    def write_single(self, addr: int, reg: int, value: int) -> bool:
+        pdu = bytes([0x06, (reg >> 8) & 0xFF, reg & 0xFF, (value >> 8) & 0xFF, value & 0xFF])
+        return self.transact(addr, pdu) is not None
+
+    def write_multiple(self, addr: int, start: int, values) -> bool:
+        return self.transact(addr, build_write_multiple_pdu(start, values)) is not None
+
+    def read_write_multiple(self, addr: int, read_start: int, read_count: int, write_start: int, values) -> Optional[Tuple[int, ...]]:
+        """0x17: write `values` at write_start, then read back read_count registers, in one round trip."""
+        return self._read_regs(addr, build_read_write_multiple_pdu(read_start, read_count, write_start, values), read_count)
+
+    def diagnostic(self, addr: int, sub: int, data: int = 0) -> Optional[int]:
+        """0x08 Diagnostics: returns the 16-bit data field of the reply (a counter for the count sub-functions)."""
+        rpdu = self.transact(addr, bytes([0x08, (sub >> 8) & 0xFF, sub & 0xFF, (data >> 8) & 0xFF, data & 0xFF]))
+        if rpdu is None:
+            return None
+        if len(rpdu) != 5 or ((rpdu[1] << 8) | rpdu[2]) != sub:
+            raise ValueError("bad_diag")
+        return (rpdu[3] << 8) | rpdu[4]
+
+    def read_diag_counters(self, addr: int) -> Optional[dict]:
+        """The node's bus counters from its diagnostics register block."""
+        vals = self.read_input(addr, DIAG_BASE, DIAG_COUNT)
+        if vals is None:
+            return None
+        return dict(zip(DIAG_NAMES, vals))
+
+    def clear_diag_counters(self, addr: int) -> bool:
+        return self.diagnostic(addr, DIAG_SUB_CLEAR_COUNTERS) is not None
+
+    def _answers(self, addr: int) -> bool:
+        try:
+            return self.read_holding(addr, REG_BAUD, 1) is not None
+        except ModbusException:
+            return True  # an exception frame still decoded at this rate
+        except ValueError:
+            return False  # garbage: wrong rate
+
+    def detect_baudrate(self, addrs: Iterable[int], candidates: Optional[Iterable[int]] = None) -> Dict[int, Optional[int]]:
+        """Probe each node at the candidate rates; returns addr -> rate it answered at (None if silent).
+
+        The current rate is tried first, then the others fastest first. The master is
+        left at the rate most nodes answered at.
+        """
+        addrs = list(addrs)
+        rates = list(candidates or config.bus.baudrates)
+        rates.sort(reverse=True)
+        if self.baudrate in rates:
+            rates.remove(self.baudrate)
+            rates.insert(0, self.baudrate)
+        found: Dict[int, Optional[int]] = {a: None for a in addrs}
+        for rate in rates:
+            pending = [a for a in addrs if found[a] is None]
+            if not pending:
+                break
+            self.set_baudrate(rate)
+            for a in pending:
+                if self._answers(a):
+                    found[a] = rate
+        counts = {}
+        for rate in found.values():
+            if rate is not None:
+                counts[rate] = counts.get(rate, 0) + 1
+        if counts:
+            self.set_baudrate(max(counts, key=lambda r: counts[r]))
+        return found
+
+    def switch_baudrate(self, addrs: Iterable[int], baudrate: int, settle_s: float = 0.05) -> Optional[Dict[int, bool]]:
+        """Move every node in `addrs` and the master to `baudrate`.
+
+        All nodes must first report the current rate in REG_BAUD; otherwise nothing
+        is changed and None is returned. Each node then gets the new rate (it
+        acknowledges at the old one and switches), the master follows after
+        `settle_s`, and each node is checked at the new rate. Returns addr -> answered.
+        Nodes that miss the switch fall back by themselves (Rs485Link.fallback_s).
+        """
+        if baudrate not in config.bus.baudrates:
+            raise ValueError("unsupported_baud")
+        addrs = list(addrs)
+        code = self.baudrate // 100
+        for a in addrs:
+            try:
+                if self.read_holding(a, REG_BAUD, 1) != (code,):
+                    return None
+            except (ModbusException, ValueError):
+                return None
+        for a in addrs:
+            try:
+                self.write_single(a, REG_BAUD, baudrate // 100)
+            except (ModbusException, ValueError):
+                pass  # checked below at the new rate
+        self.set_baudrate(baudrate)
+        self.sleep(settle_s)
+        out = {}
+        for a in addrs:
+            try:
+                out[a] = self.read_holding(a, REG_BAUD, 1) == (baudrate // 100,)
+            except (ModbusException, ValueError):
+                out[a] = False
+        return out
+
+
+class WriteCoalescer:
+    """Collects register writes and sends each run of adjacent registers as one request.
+
+    Later writes to the same register replace earlier ones. A run of one register
+    goes out as 0x06 (shorter on the wire), longer runs as 0x10.
+    """
+
+    MAX_RUN = 123  # 0x10 quantity limit
+
+    def __init__(self):
+        self._pending = {}  # addr -> {reg: value}
+
+    def write(self, addr: int, start: int, values):
+        regs = self._pending.setdefault(addr, {})
+        for i, v in enumerate(values):
+            regs[start + i] = v & 0xFFFF
+
+    def runs(self, addr: int):
+        """Pending writes for `addr` as a list of (start, values) runs."""
+        regs = self._pending.get(addr)
+        if not regs:
+            return []
+        out = []
+        start = None
+        vals = []
+        for r in sorted(regs):
+            if start is not None and r == start + len(vals) and len(vals) < self.MAX_RUN:
+                vals.append(regs[r])
+                continue
+            if start is not None:
+                out.append((start, tuple(vals)))
+            start = r
+            vals = [regs[r]]
+        out.append((start, tuple(vals)))
+        return out
+
+    def flush(self, master: ModbusMaster) -> bool:
+        """Send all pending writes; True if every node acknowledged.
+
+        Runs that fail (no answer, exception response, garbled frame) stay pending
+        so the next flush retries them; the other runs are still sent.
+        """
+        ok_all = True
+        for addr in list(self._pending):
+            for start, vals in self.runs(addr):
+                try:
+                    if len(vals) == 1:
+                        ok = master.write_single(addr, start, vals[0])
+                    else:
+                        ok = master.write_multiple(addr, start, vals)
+                except (ModbusException, ValueError):
+                    ok = False
+                if ok:
+                    regs = self._pending[addr]
+                    for i in range(len(vals)):
+                        del regs[start + i]
+                else:
+                    ok_all = False
+            if not self._pending[addr]:
+                del self._pending[addr]
+        return ok_all
@@ -0,0 +1,210 @@
+"""Persistent Modbus polling scheduler (desktop master).
+
+Keeps one `ModbusMaster` (and its serial port) open and polls each node's
+status block on its own period:
+- status 1 (pump run, autofill fill, boiler heat/hold) -> active_period_s
+- status 3 (fault) or no response -> fault_period_s (timeouts back off exponentially up to it)
+- anything else -> idle_period_s
+
+After every transaction the next poll is held back by wire_time / max_utilisation,
+so the poller never occupies more than that fraction of the bus.
+
+With by_exception=True a node that has been read once is polled through its
+change-sequence register only (one register instead of the block); the full
+block is fetched only when the sequence moves.
+
+Usage (example):
+  python -m firmware.master.modbus_poller --port /dev/ttyUSB0
+"""
+
+import argparse
+import json
+import sys
+import time
+from typing import Callable, List, Optional, Tuple
+
+try:
+    import serial  # type: ignore
+except Exception:  # pragma: no cover
+    serial = None
+
+from firmware.master.modbus_master import ModbusMaster, ModbusException
+from firmware.core.modbus_maps import REG_SEQ
+from firmware.core.modbus_schema import NODES
+from firmware.common import config
+
+STATUS_ACTIVE = 1
+STATUS_FAULT = 3
+
+
+class PollNode:
+    def __init__(self, name: str, addr: int, start: int = 0, count: int = 4, seq_reg: Optional[int] = REG_SEQ):
+        self.name = name
+        self.addr = addr
+        self.start = start
+        self.count = count
+        self.seq_reg = seq_reg  # change-sequence register inside [start, start+count), or None
+        self.values: Optional[Tuple[int, ...]] = None
+        self.last_ok_s: Optional[float] = None
+        self.next_due_s = 0.0
+        self.period_s = 0.0
+        self.failures = 0
+
+    @property
+    def status(self) -> Optional[int]:
+        return self.values[0] if self.values else None
+
+    @property
+    def seq(self) -> Optional[int]:
+        if not self.values or self.seq_reg is None:
+            return None
+        return self.values[self.seq_reg - self.start]
+
+
+def default_nodes() -> List[PollNode]:
+    return [
+        PollNode("pump", config.bus.addr_pump),
+        PollNode("autofill", config.bus.addr_autofill),
+        PollNode("boiler", config.bus.addr_boiler),
+    ]
+
+
+class Poller:
+    """Schedules read-holding polls for a set of nodes over one ModbusMaster.
+
+    on_update(node, changed) is called after every successful poll.
+    clock/sleep are injectable for tests.
+    """
+
+    def __init__(self, master: ModbusMaster, nodes: List[PollNode], cfg: config.PollConfig = config.poll,
+                 on_update: Optional[Callable[[PollNode, bool], None]] = None,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep,
+                 by_exception: bool = False):
+        self.master = master
+        self.by_exception = by_exception
+        self.nodes = nodes
+        self.cfg = cfg
+        self.on_update = on_update
+        self.clock = clock
+        self.sleep = sleep
+        self._bus_free_s = 0.0
+        self.polls = 0
+        self.timeouts = 0
+        self.wire_s = 0.0
+
+    def _wire_time_s(self, count: int) -> float:
+        # 8-byte request + (5 + 2*count)-byte response at the master's current rate
+        return self.master.wire_time_s(8, 5 + 2 * count) + self.cfg.turnaround_s
+
+    def _read(self, node: PollNode, start: int, count: int) -> Optional[Tuple[int, ...]]:
+        self.polls += 1
+        self.wire_s += self._wire_time_s(count)
+        try:
+            return self.master.read_holding(node.addr, start, count)
+        except (ModbusException, ValueError):
+            return None
+
+    def _period_for(self, node: PollNode) -> float:
+        cfg = self.cfg
+        if node.failures:
+            return min(cfg.fault_period_s, cfg.idle_period_s * (2 ** (node.failures - 1)))
+        status = node.status
+        if status == STATUS_ACTIVE:
+            return cfg.active_period_s
+        if status == STATUS_FAULT:
+            return cfg.fault_period_s
+        return cfg.idle_period_s
+
+    def next_due(self) -> Tuple[Optional[PollNode], float]:
+        """Node to poll next and the time it may start."""
+        best = None
+        for n in self.nodes:
+            if best is None or n.next_due_s < best.next_due_s:
+                best = n
+        if best is None:
+            return None, self._bus_free_s
+        return best, max(best.next_due_s, self._bus_free_s)
+
+    def poll(self, node: PollNode) -> bool:
+        """Poll one node now and reschedule it. Returns True if the node answered."""
+        t0 = self.clock()
+        wire0 = self.wire_s
+        vals = None
+        known_seq = node.seq if self.by_exception else None
+        if known_seq is not None:
+            seq = self._read(node, node.seq_reg, 1)
+            if seq is not None and seq[0] == known_seq:
+                vals = node.values  # nothing changed since the last block read
+            elif seq is not None:
+                vals = self._read(node, node.start, node.count)
+        else:
+            vals = self._read(node, node.start, node.count)
+        now = self.clock()
+        self._bus_free_s = t0 + (self.wire_s - wire0) / self.cfg.max_utilisation
+        if vals is None:
+            self.timeouts += 1
+            node.failures += 1
+        else:
+            changed = vals != node.values
+            node.values = vals
+            node.failures = 0
+            node.last_ok_s = now
+        node.period_s = self._period_for(node)
+        # Anchor on the previous due time so periods don't drift with bus latency
+        nxt = node.next_due_s + node.period_s
+        node.next_due_s = nxt if nxt > t0 else t0 + node.period_s
+        if vals is not None and self.on_update is not None:
+            self.on_update(node, changed)
+        return vals is not None
+
+    def step(self) -> Optional[PollNode]:
+        """Wait until the next poll is due, run it, and return the polled node."""
+        node, due = self.next_due()
+        if node is None:
+            return None
+        delay = due - self.clock()
+        if delay > 0:
+            self.sleep(delay)
+        self.poll(node)
+        return node
+
+    def run(self, max_polls: Optional[int] = None):
+        n = 0
+        while max_polls is None or n < max_polls:
+            if self.step() is None:
+                return
+            n += 1
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", required=True)
+    ap.add_argument("--baud", type=int, default=config.bus.baudrate)
+    ap.add_argument("--all", action="store_true", help="print every poll, not only changes")
+    ap.add_argument("--by-exception", action="store_true", help="poll the change-sequence register, read blocks only on change")
+    ns = ap.parse_args()
+    if serial is None:
+        print("pyserial not installed", file=sys.stderr)
+        sys.exit(2)
+    ser = serial.Serial(ns.port, baudrate=ns.baud, timeout=0.2)
+    master = ModbusMaster(ser, baudrate=ns.baud)
+
+    def on_update(node: PollNode, changed: bool):
+        if changed or ns.all:
+            rec = {"ts": time.time(), "node": node.name, "regs": list(node.values)}
+            schema = NODES.get(node.name)
+            if schema is not None:
+                rec.update(schema.decode_holding(node.values, node.start))
+            sys.stdout.write(json.dumps(rec) + "\n")
+            sys.stdout.flush()
+
+    try:
+        Poller(master, default_nodes(), on_update=on_update, by_exception=ns.by_exception).run()
+    except KeyboardInterrupt:  # pragma: no cover
+        pass
+    # Per-node outcome counts and latency histogram for tuning poll rates and baud
+    print(json.dumps(master.stats_dict()), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import pytest
+
+from firmware.core.hal_mpy import HAL, AdcFilter
+
+
+class NoisyAdc:
+    """Steady level with occasional spikes, the ESP32 ADC's typical failure mode."""
+
+    def __init__(self, level, spikes=()):
+        self.level = level
+        self.spikes = dict(spikes)
+        self.n = 0
+
+    def read(self):
+        v = self.spikes.get(self.n, self.level)
+        self.n += 1
+        return v
+
+
+def test_median_rejects_spikes():
+    adc = NoisyAdc(1000, {1: 4095, 5: 0, 9: 4095})
+    f = AdcFilter(adc.read, burst=7, trim=3, ema_shift=0)
+    assert f.value == 1000 and adc.n == 7 and sorted(f.buf) == list(f.buf)
+    assert f.sample() == 1000 and f.bursts == 2
+
+
+def test_trimmed_mean_and_integer_ema():
+    adc = NoisyAdc(1000, {0: 3000})
+    f = AdcFilter(adc.read, burst=8, trim=2, ema_shift=2)
+    assert f.value == 1000  # the spike is trimmed away
+    adc.level = 1400
+    assert [f.sample() for _ in range(3)] == [1100, 1175, 1231]
+    with pytest.raises(ValueError):
+        AdcFilter(adc.read, burst=4, trim=2)
+
+
+def test_hal_serves_latest_filtered_value():
+    hal = HAL()
+    adc = NoisyAdc(150)
+    hal.temp_filter = AdcFilter(adc.read, burst=4, trim=1, ema_shift=0)
+    reads = adc.n
+    assert hal.read_boiler_counts() == 150 and adc.n == reads  # no ADC access on read
+    adc.level = 160
+    hal.sample_adcs()
+    assert hal.read_boiler_counts() == 160 and adc.n == reads + 4
@@ -1,5 +1,7 @@
 import time
 
+from firmware.common.clock import SimClock
+
 from firmware.core.autofill_controller import AutofillController
 
 
@@ -41,3 +43,22 @@ def test_autofill_rate_limit():
     # Immediately low again -> inhibit by rate limit
     s, r = c.tick(t0 + 2, probe_wet=False)
     assert s == "inhibit" and r == "rate_limit" and hal.valve_state is False
+
+
+def test_refill_interval_in_simulated_time():
+    clk = SimClock()
+    hal = AutofillHAL()
+    c = AutofillController(hal, clock=clk)
+    c.step(clk.ticks_ms(), False)
+    clk.advance(3000)
+    c.step(clk.ticks_ms(), True)
+    assert c.state == "ok" and hal.valve_state is False
+    refilled_at = None
+    while refilled_at is None:
+        clk.advance(100)
+        c.step(clk.ticks_ms(), False)
+        if c.state == "fill":
+            refilled_at = clk.ticks_ms()
+        else:
+            assert c.reason == "rate_limit"
+    assert refilled_at == 3000 + c.cfg.min_refill_interval_s * 1000
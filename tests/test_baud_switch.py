@@ -0,0 +1,105 @@
+from firmware.core.modbus_maps import PumpMap, REG_BAUD
+from firmware.core.modbus_rtu import SimpleSlave, build_adu
+from firmware.core.rs485_link import Rs485Link
+from firmware.master.modbus_master import ModbusMaster
+
+
+class NodeUart:
+    def __init__(self, baudrate):
+        self.baudrate = baudrate
+        self.rx = bytearray()
+        self.tx = bytearray()
+
+    def init(self, baudrate):
+        self.baudrate = baudrate
+
+    def read(self):
+        out = bytes(self.rx)
+        self.rx.clear()
+        return out or None
+
+    def write(self, data):
+        self.tx.extend(data)
+
+    def flush(self):
+        pass
+
+
+def _garble(data):
+    # What a UART makes of a frame sent at another rate
+    return bytes(b ^ 0x5A for b in data)
+
+
+class MultiRateBus:
+    """Master port plus nodes that each run at their own rate; the master only
+    understands nodes at its current rate."""
+
+    def __init__(self, rates):
+        self.baudrate = rates[0]
+        self.timeout = None
+        self.rx = bytearray()
+        self.now = 0.0
+        self.links = []
+        for addr, rate in enumerate(rates, 1):
+            m = PumpMap()
+            link = Rs485Link(NodeUart(rate), None, SimpleSlave(addr, m.read_image, m.write), m.reg, baudrate=rate)
+            self.links.append(link)
+
+    def reset_input_buffer(self):
+        self.rx.clear()
+
+    def write(self, data):
+        for link in self.links:
+            link.uart.rx.extend(data if link.uart.baudrate == self.baudrate else _garble(data))
+            rate = link.uart.baudrate  # the response goes out before any switch
+            link.poll(self.now)
+            if link.uart.tx:
+                self.rx.extend(link.uart.tx if rate == self.baudrate else _garble(link.uart.tx))
+                link.uart.tx.clear()
+
+    def read(self, n):
+        out = bytes(self.rx[:n])
+        del self.rx[:n]
+        return out
+
+
+def test_switch_moves_all_nodes_and_master():
+    bus = MultiRateBus([9600, 9600, 9600])
+    master = ModbusMaster(bus, baudrate=9600, sleep=lambda s: None)
+    res = master.switch_baudrate((1, 2, 3), 115200)
+    assert res == {1: True, 2: True, 3: True}
+    assert bus.baudrate == 115200 and master.baudrate == 115200
+    assert [link.baudrate for link in bus.links] == [115200] * 3
+    assert master.read_holding(2, REG_BAUD, 1) == (1152,)
+
+
+def test_switch_aborts_when_a_node_is_missing():
+    bus = MultiRateBus([9600, 38400])
+    master = ModbusMaster(bus, baudrate=9600, timeout_s=0.01, sleep=lambda s: None)
+    assert master.switch_baudrate((1, 2), 115200) is None
+    assert [link.baudrate for link in bus.links] == [9600, 38400] and master.baudrate == 9600
+
+
+def test_detect_finds_each_nodes_rate():
+    bus = MultiRateBus([38400, 115200, 115200])
+    master = ModbusMaster(bus, baudrate=9600, timeout_s=0.01)
+    assert master.detect_baudrate((1, 2, 3, 4)) == {1: 38400, 2: 115200, 3: 115200, 4: None}
+    assert master.baudrate == 115200
+
+
+def test_node_rejects_unsupported_rate_and_falls_back_without_master():
+    m = PumpMap()
+    uart = NodeUart(9600)
+    link = Rs485Link(uart, None, SimpleSlave(1, m.read_image, m.write, gap_us=4011), m.reg, fallback_s=10.0)
+    uart.rx.extend(build_adu(1, bytes([0x06, 0, REG_BAUD, 0, 50])))
+    link.poll(0.0)
+    assert uart.tx[1] == 0x86 and link.baudrate == 9600
+    uart.tx.clear()
+    uart.rx.extend(build_adu(1, bytes([0x06, 0, REG_BAUD, 0, 192])))
+    link.poll(0.0)
+    assert uart.tx[1] == 0x06  # acknowledged at the old rate
+    assert uart.baudrate == 19200 and link.slave.gap_us == 2006
+    link.poll(5.0)
+    assert uart.baudrate == 19200
+    link.poll(10.0)  # nobody followed: back to the previous rate
+    assert uart.baudrate == 9600 and m.reg[REG_BAUD] == 96 and link.slave.gap_us == 4011
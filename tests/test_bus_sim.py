@@ -0,0 +1,66 @@
+from firmware.core.modbus_rtu import SimpleSlave, frame_gap_us
+from firmware.core.modbus_maps import PumpMap
+from firmware.master.modbus_poller import Poller, PollNode
+from tools.bus_sim import VirtualBus, SimNode, SimSerial, MeasuredMaster, attach_default_nodes, percentile, report
+
+
+def test_clean_bus_roundtrip_and_byte_timing():
+    bus = VirtualBus(9600)
+    maps = attach_default_nodes(bus, turnaround_us=1000.0)
+    maps["pump"].publish(1, 0, True)
+    master = MeasuredMaster(SimSerial(bus, de_turnaround_us=100.0))
+    assert master.read_holding(1, 0, 4) == (1, 0, 1, 1)
+    # 8-byte request + 13-byte response on the wire plus both turnarounds
+    expected = 21 * bus.char_us + 1000.0 + 100.0
+    assert abs(master.latencies_us[0] - expected) < 1.0
+    assert master.read_holding(9, 0, 4) is None and master.timeouts == 1
+
+
+def test_collision_between_nodes_sharing_an_address():
+    bus = VirtualBus(9600)
+    for _ in range(2):
+        m = PumpMap()
+        SimNode(bus, SimpleSlave(1, m.read_image, m.write, gap_us=frame_gap_us(9600)), turnaround_us=1000.0)
+    master = MeasuredMaster(SimSerial(bus))
+    try:
+        res = master.read_holding(1, 0, 4)
+    except ValueError:
+        res = None
+    assert res is None and bus.collisions > 0
+
+
+def test_noise_shows_up_as_errors_in_report():
+    bus = VirtualBus(9600, noise_ber=2e-3, seed=3)
+    attach_default_nodes(bus)
+    master = MeasuredMaster(SimSerial(bus))
+    for _ in range(200):
+        try:
+            master.read_holding(2, 0, 4)
+        except ValueError:
+            pass
+    r = report(bus, master, bus.now_us)
+    assert r["transactions"] == 200
+    assert 0 < r["error_rate"] < 0.5 and r["bit_errors"] > 0
+    assert r["latency_ms"]["p50"] is not None
+
+
+def test_poller_on_virtual_bus_respects_utilisation():
+    bus = VirtualBus(9600)
+    maps = attach_default_nodes(bus)
+    maps["pump"].publish(1, 0, True)
+    master = MeasuredMaster(SimSerial(bus))
+    nodes = [PollNode("pump", 1), PollNode("autofill", 2), PollNode("boiler", 3)]
+    p = Poller(master, nodes, clock=bus.now_s, sleep=bus.sleep)
+    while bus.now_us < 10e6:
+        p.step()
+    r = report(bus, master, bus.now_us)
+    assert r["timeouts"] == 0 and r["ok"] > 100
+    assert r["utilisation"] <= 0.5
+
+
+def test_percentile_nearest_rank():
+    ten = list(range(1, 11))
+    hundred = list(range(1, 101))
+    assert [percentile(ten, p) for p in (0, 10, 50, 51, 90, 99, 100)] == [1, 1, 5, 6, 9, 10, 10]
+    assert [percentile(hundred, p) for p in (7, 50, 90, 99, 100)] == [7, 50, 90, 99, 100]
+    assert percentile([3.0], 99) == 3.0 and percentile([], 50) is None
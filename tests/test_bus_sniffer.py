@@ -0,0 +1,66 @@
+from firmware.core.modbus_rtu import build_adu
+from firmware.master.modbus_master import ModbusException, build_read_holding
+from tools.bus_sim import VirtualBus, SimSerial, MeasuredMaster, attach_default_nodes
+from tools.bus_sniffer import BusSniffer, read_capture, write_capture_line
+
+
+class Tap:
+    """Receive-only station on the virtual bus feeding a sniffer byte by byte."""
+
+    def __init__(self, bus, sniffer):
+        self.sniffer = sniffer
+        self.txns = []
+        bus.attach(self)
+
+    def on_byte(self, b, t_us):
+        self.txns.extend(self.sniffer.feed(bytes((b,)), t_us))
+
+
+def test_pairs_transactions_and_times_them_on_virtual_bus():
+    bus = VirtualBus(115200)
+    attach_default_nodes(bus, turnaround_us=500.0)
+    tap = Tap(bus, BusSniffer(115200))
+    master = MeasuredMaster(SimSerial(bus))
+    master.read_holding(1, 0, 4)
+    master.write_single(2, 8, 5)
+    try:
+        master.read_holding(3, 100, 4)
+    except ModbusException:
+        pass
+    master.read_holding(9, 0, 4)  # nobody home
+    master.read_holding(1, 0, 1)
+    txns = tap.txns
+    assert [(t.addr, t.func, t.timeout, t.exception) for t in txns] == [
+        (1, 3, False, None), (2, 6, False, None), (3, 3, False, 2), (9, 3, True, None), (1, 3, False, None)]
+    first = txns[0]
+    assert abs(first.req_us - 8 * bus.char_us) < 1e-6 and abs(first.rsp_us - 13 * bus.char_us) < 1e-6
+    assert abs(first.turnaround_us - 500.0) < 1e-6
+    assert abs(first.latency_us - master.latencies_us[0] + 100.0) < 1e-6  # master also counts its DE turnaround
+    st = tap.sniffer.stats()
+    assert st["timeouts"] == 1 and st["exceptions"] == 1 and st["orphans"] == 0
+    assert 0 < st["utilisation"] < 1 and st["nodes"]["1"]["ok"] == 2
+
+
+def test_chunked_reads_noise_and_capture_roundtrip(tmp_path):
+    char_us = 11e6 / 9600
+    req = build_read_holding(1, 0, 2)
+    rsp = build_adu(1, bytes([0x03, 4, 0, 1, 0, 2]))
+    diag = build_adu(1, bytes([0x2B, 0x0E, 0x01, 0x00]))  # unknown to the sizing tables
+    stream = [
+        (10_000.0, b"\xff\x00" + req[:3]),
+        (10_000.0 + 6 * char_us, req[3:]),
+        (40_000.0, rsp),
+        (60_000.0, diag),
+    ]
+    path = tmp_path / "bus.cap"
+    with open(path, "w") as f:
+        for t, data in stream:
+            write_capture_line(f, t, data)
+    sn = BusSniffer(9600)
+    txns = []
+    for t, data in read_capture(str(path)):
+        txns.extend(sn.feed(data, t))
+    txns.extend(sn.flush())
+    assert [(t.addr, t.func, t.timeout) for t in txns] == [(1, 3, False), (1, 0x2B, True)]
+    assert abs(txns[0].turnaround_us - (40_000.0 - 9 * char_us - (10_000.0 + 6 * char_us))) < 1.0
+    assert sn.resyncs == 1 and sn.frames == 3
@@ -0,0 +1,52 @@
+from firmware.core.gc_monitor import GcMonitor
+
+
+class Heap:
+    def __init__(self, free=100000):
+        self.free = free
+        self.collected = 0
+
+    def mem_free(self):
+        return self.free
+
+    def collect(self):
+        self.collected += 1
+        self.free = 100000
+
+
+class Clock:
+    def __init__(self):
+        self.t = 0
+
+    def ticks_us(self):
+        self.t += 700  # each reading 700 us later: a collection "takes" 700 us
+        return self.t
+
+
+def test_counts_allocations_and_collects_in_slack_over_budget():
+    heap = Heap()
+    m = GcMonitor(budget_bytes=1000, mem_free=heap.mem_free, collect=heap.collect, clock=Clock())
+    for used in (0, 400, 0, 700):
+        m.begin()
+        heap.free -= used
+        m.end()
+        m.idle()
+    assert m.ticks == 4 and m.alloc_ticks == 2 and m.max_alloc_bytes == 700 and m.total_alloc_bytes == 1100
+    assert heap.collected == 1 and m.collections == 1 and m.pause_us == 700
+    # An automatic collection inside a tick shows up as a rise in free heap
+    m.begin()
+    heap.free += 5000
+    m.end()
+    d = m.as_dict()
+    assert d["auto_collections"] == 1 and d["alloc_bytes"] == 0 and d["mem_free"] == 105000
+    assert d["max_pause_us"] == d["mean_pause_us"] == 700
+
+
+def test_without_mem_free_collects_every_budget_ticks():
+    heap = Heap()
+    m = GcMonitor(collect=heap.collect, clock=Clock(), budget_ticks=5)
+    for _ in range(12):
+        m.begin()
+        m.end()
+        m.idle()
+    assert heap.collected == 2 and m.collections == 2 and m.as_dict()["mem_free"] is None
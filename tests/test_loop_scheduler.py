@@ -0,0 +1,57 @@
+from firmware.core.loop_scheduler import LoopScheduler
+
+
+class FakeTicks:
+    def __init__(self, t=1000):
+        self.t = t
+
+    def ticks_ms(self):
+        return self.t
+
+
+def test_fixed_rate_does_not_drift_with_work():
+    clk = FakeTicks()
+    s = LoopScheduler(50, clk)
+    s.start()
+    stamps = []
+    for _ in range(10):
+        stamps.append(s.begin())
+        clk.t += 12  # work
+        clk.t += s.end()  # sleep exactly as asked
+    assert stamps == [1000 + i * 50 for i in range(10)] and s.now_s() == 0.5
+    assert s.overruns == 0 and s.max_work_ms == 12 and s.max_jitter_ms == 0
+
+
+def test_jitter_and_overruns_skip_missed_slots():
+    clk = FakeTicks()
+    s = LoopScheduler(50, clk)
+    s.start()
+    s.begin()
+    clk.t += 10
+    clk.t += s.end() + 3  # woke 3 ms late
+    assert s.begin() == 1053 and s.jitter_ms == 3 and s.now_s() == 0.053
+    clk.t += 120  # work overran two deadlines (100 and 150)
+    assert s.end() == 27  # next slot on the grid is 200 ms, not 100 or 150
+    assert s.overruns == 1 and s.skipped == 2
+    clk.t += 27
+    assert s.begin() == 1200 and s.jitter_ms == 0
+    d = s.as_dict()
+    assert d["runs"] == 3 and d["max_jitter_ms"] == 3 and d["mean_jitter_ms"] == 1.0 and d["max_work_ms"] == 120
+
+
+def test_timestamps_survive_tick_wrap():
+    from firmware.core import loop_scheduler as ls
+
+    period = 1 << 30  # MicroPython ticks_ms wrap on the ESP32
+    clk = FakeTicks(period - 20)
+    orig = ls.ticks_diff, ls.ticks_add
+    ls.ticks_diff = lambda a, b: ((a - b + period // 2) % period) - period // 2
+    ls.ticks_add = lambda t, d: (t + d) % period
+    try:
+        s = LoopScheduler(50, clk)
+        s.start()
+        s.begin()
+        clk.t = (clk.t + s.end()) % period
+        assert clk.t == 30 and s.begin() == 30 and s.now_s() == 0.05
+    finally:
+        ls.ticks_diff, ls.ticks_add = orig
@@ -1,4 +1,4 @@
-from firmware.core.modbus_rtu import crc16, build_adu, SimpleSlave
+from firmware.core.modbus_rtu import crc16, crc16_update, crc16_scan, rtu_frame_lens, CRC16_INIT, build_adu, check_and_strip_adu, frame_gap_us, RtuFrameDecoder, SimpleSlave, DIAG_BASE
 from firmware.master.modbus_master import build_read_holding, parse_read_holding_response
 
 
@@ -8,6 +8,49 @@ def test_crc16_known_vector():
     assert crc16(data) == 0xC5CD
 
 
+def _crc16_bitwise(data: bytes) -> int:
+    crc = 0xFFFF
+    for b in data:
+        crc ^= b
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+
+def test_crc16_table_matches_bitwise_and_is_incremental():
+    data = bytes(range(256)) + b"\x01\x03\x00\x00\x00\x0a"
+    assert crc16_update(CRC16_INIT, data) == _crc16_bitwise(data)
+    crc = CRC16_INIT
+    for i in range(0, len(data), 7):
+        crc = crc16_update(crc, data[i:i + 7])
+    assert crc == _crc16_bitwise(data)
+
+
+def test_crc16_scan_and_frame_lens_for_unknown_direction():
+    frame = build_adu(1, bytes([0x2B, 0x0E, 0x01, 0x00]))
+    buf = bytearray(b"\xff" + frame + b"\x01\x03")
+    assert crc16_scan(buf, 1, len(buf), 256) == len(frame)
+    assert crc16_scan(buf, 1, len(frame), 256) == 0  # the CRC is not complete yet
+    assert crc16_scan(buf, 1, len(buf), 4) == 0
+    assert rtu_frame_lens(buf, 1, len(buf)) == (-1, -1)
+    assert rtu_frame_lens(build_read_holding(1, 0, 4), 0, 8) == (8, -1)
+    assert rtu_frame_lens(b"\x01\x83\x02", 0, 3) == (5, 5)
+
+
+def test_adu_roundtrip_and_bad_crc():
+    adu = build_adu(1, bytes([0x03, 0x00, 0x00, 0x00, 0x0A]))
+    assert adu[-2:] == bytes([0xC5, 0xCD])
+    assert check_and_strip_adu(adu) == (1, bytes([0x03, 0x00, 0x00, 0x00, 0x0A]))
+    bad = bytearray(adu)
+    bad[3] ^= 0x01
+    try:
+        check_and_strip_adu(bytes(bad))
+    except ValueError as e:
+        assert str(e) == "bad_crc"
+    else:
+        raise AssertionError("expected bad_crc")
+
+
 def test_slave_read_holding_roundtrip():
     # Setup a simple map
     regs = list(range(0, 20))
@@ -26,3 +69,137 @@ def test_slave_read_holding_roundtrip():
     assert resp is not None
     addr, vals = parse_read_holding_response(resp)
     assert addr == 1 and vals == (0, 1, 2, 3)
+
+
+def _slave(addr=1):
+    regs = list(range(0, 20))
+    writes = []
+
+    def read_cb(start, count):
+        if start + count > len(regs):
+            return False, ()
+        return True, tuple(regs[start:start + count])
+
+    def write_cb(start, values):
+        writes.append((start, values))
+        return True
+
+    return SimpleSlave(addr, read_cb, write_cb), writes
+
+
+def test_decoder_skips_foreign_traffic_and_garbage():
+    slave, _ = _slave(1)
+    other_req = build_read_holding(2, 0, 4)
+    other_rsp = build_adu(2, bytes([0x03, 0x08, 0, 1, 0, 1, 0, 1, 3, 1]))
+    stream = b"\x00\x01\xff" + other_req + other_rsp + build_read_holding(1, 2, 2)
+    resp = slave.feed_uart(stream)
+    assert parse_read_holding_response(resp) == (1, (2, 3))
+
+
+def test_decoder_split_and_multiple_frames():
+    dec = RtuFrameDecoder(1)
+    req = build_read_holding(1, 0, 4)
+    wr = build_adu(1, bytes([0x10, 0, 8, 0, 2, 4, 0, 7, 0, 9]))
+    assert dec.feed(req[:3]) == []
+    frames = dec.feed(req[3:] + wr)
+    assert [pdu[0] for _, pdu in frames] == [0x03, 0x10]
+
+
+def test_decoder_gap_discards_partial_frame():
+    dec = RtuFrameDecoder(1, gap_us=frame_gap_us(9600))
+    req = build_read_holding(1, 0, 4)
+    assert dec.feed(req[:5], now_us=0) == []
+    # Silence longer than 3.5 chars: the partial frame is dropped
+    assert dec.feed(req, now_us=10_000) == [(1, req[1:-2])]
+    # Foreign frame start: ignored until the next gap, even if our frame follows without one
+    assert dec.feed(build_read_holding(2, 0, 4) + req, now_us=20_000) == []
+    assert dec.feed(req, now_us=30_000) == [(1, req[1:-2])]
+
+
+def test_slave_empty_polls_do_not_hide_the_gap():
+    regs = list(range(20))
+    slave = SimpleSlave(1, lambda s, c: (True, tuple(regs[s:s + c])), lambda s, v: True,
+                        gap_us=frame_gap_us(9600))
+    assert slave.feed_uart(build_read_holding(2, 0, 4), now_us=0) is None
+    t = 0
+    for _ in range(100):  # UART polled every 0.5 ms with nothing received
+        t += 500
+        assert slave.feed_uart(b"", now_us=t) is None
+    resp = slave.feed_uart(build_read_holding(1, 2, 2), now_us=t + 500)
+    assert parse_read_holding_response(resp) == (1, (2, 3))
+
+
+class NoDelBytearray(bytearray):
+    """MicroPython-like buffer: slices cannot be deleted."""
+
+    def __delitem__(self, key):
+        raise TypeError("'bytearray' object doesn't support item deletion")
+
+    def __getitem__(self, key):
+        out = super().__getitem__(key)
+        return NoDelBytearray(out) if isinstance(key, slice) else out
+
+
+def test_decoder_compacts_without_deleting_slices():
+    dec = RtuFrameDecoder(1, max_frame=16)
+    dec._buf = NoDelBytearray()
+    req = build_read_holding(1, 0, 4)
+    assert dec.feed(b"\x00\xff" + req[:5]) == []
+    assert dec.feed(req[5:] + req) == [(1, req[1:-2])] * 2
+    # A write announcing 100 registers overflows max_frame while it waits for the rest
+    big = bytes([1, 0x10, 0, 0, 0, 100, 200]) + bytes(20)
+    assert dec.feed(big) == [] and len(dec._buf) <= 16 and dec.resyncs == 1
+    assert isinstance(dec._buf, NoDelBytearray)
+
+
+def test_slave_unknown_function_exception_and_writes():
+    slave, writes = _slave(1)
+    resp = slave.feed_uart(build_adu(1, bytes([0x2B, 0x0E, 0x01, 0x00])))
+    assert check_and_strip_adu(resp) == (1, bytes([0xAB, 0x01]))
+    resp = slave.feed_uart(build_adu(1, bytes([0x06, 0, 9, 0, 5])))
+    assert resp is not None and writes == [(9, (5,))]
+
+
+def test_decoder_sizes_read_input_and_read_write_multiple():
+    dec = RtuFrameDecoder(1)
+    rd = build_adu(1, bytes([0x04, 0, 0, 0, 2]))
+    rw = build_adu(1, bytes([0x17, 0, 0, 0, 4, 0, 8, 0, 2, 4, 0, 1, 0, 2]))
+    frames = dec.feed(rd + rw)
+    assert [pdu[0] for _, pdu in frames] == [0x04, 0x17]
+
+
+def test_decoder_counters_timed():
+    dec = RtuFrameDecoder(1, gap_us=frame_gap_us(9600))
+    req = build_read_holding(1, 0, 4)
+    bad = bytearray(req)
+    bad[-1] ^= 0xFF
+    dec.feed(req, now_us=0)
+    dec.feed(build_read_holding(2, 0, 4), now_us=10_000)
+    dec.feed(bytes(bad), now_us=20_000)
+    dec.feed(req[:5], now_us=30_000)
+    dec.feed(req, now_us=40_000)  # gap cuts the partial frame
+    assert (dec.frames, dec.foreign, dec.crc_errors, dec.resyncs) == (2, 1, 1, 1)
+
+
+def test_slave_diagnostics_block_and_function_08():
+    slave, _ = _slave(1)
+    bad = bytearray(build_read_holding(1, 0, 4))
+    bad[-1] ^= 0xFF
+    slave.feed_uart(bytes(bad))
+    slave.feed_uart(build_read_holding(1, 0, 4) + build_read_holding(2, 0, 4))
+    slave.feed_uart(build_adu(1, bytes([0x2B, 0x0E, 0x01, 0x00])))
+    resp = slave.feed_uart(build_adu(1, bytes([0x04, DIAG_BASE >> 8, 0, 0, 5])))
+    _, pdu = check_and_strip_adu(resp)
+    # frames (incl. this read), crc_errors, foreign, exceptions, resyncs
+    assert pdu == bytes([0x04, 10, 0, 3, 0, 1, 0, 1, 0, 1, 0, 0])
+    resp = slave.feed_uart(build_adu(1, bytes([0x08, 0, 0x0C, 0, 0])))
+    assert check_and_strip_adu(resp) == (1, bytes([0x08, 0, 0x0C, 0, 1]))
+    resp = slave.feed_uart(build_adu(1, bytes([0x08, 0, 0x0E, 0, 0])))
+    assert check_and_strip_adu(resp) == (1, bytes([0x08, 0, 0x0E, 0, 5]))
+    # Echo and clear
+    resp = slave.feed_uart(build_adu(1, bytes([0x08, 0, 0x00, 0x12, 0x34])))
+    assert check_and_strip_adu(resp) == (1, bytes([0x08, 0, 0, 0x12, 0x34]))
+    slave.feed_uart(build_adu(1, bytes([0x08, 0, 0x0A, 0, 0])))
+    assert slave.diag_counters() == (0, 0, 0, 0, 0)
+    resp = slave.feed_uart(build_adu(1, bytes([0x08, 0, 0x55, 0, 0])))
+    assert check_and_strip_adu(resp) == (1, bytes([0x88, 0x01]))
@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+import pytest
+
+from firmware.core.modbus_rtu import SimpleSlave
+from firmware.master.modbus_master import ModbusMaster
+from firmware.master.modbus_async import AsyncModbusClient, BusClosed, snapshot
+
+
+class SlowSerial:
+    """Blocking fake port: each response takes `delay_s` to arrive."""
+
+    def __init__(self, regs, delay_s=0.05):
+        self.slave = SimpleSlave(1, lambda s, c: (True, tuple(regs[s:s + c])), lambda s, v: True)
+        self.delay_s = delay_s
+        self.rx = bytearray()
+        self.timeout = None
+        self.writes = 0
+
+    def write(self, data):
+        self.writes += 1
+        resp = self.slave.feed_uart(data)
+        if resp:
+            self.rx.extend(resp)
+
+    def read(self, n):
+        if len(self.rx) == 0 or n == 3:
+            time.sleep(self.delay_s)
+        out = bytes(self.rx[:n])
+        del self.rx[:n]
+        return out
+
+
+def test_two_buses_poll_concurrently():
+    async def run():
+        a = AsyncModbusClient(ModbusMaster(SlowSerial([1, 2, 3, 4])), name="a")
+        b = AsyncModbusClient(ModbusMaster(SlowSerial([5, 6, 7, 8])), name="b")
+        async with a, b:
+            t0 = time.monotonic()
+            ra, rb = await asyncio.gather(a.read_holding(1, 0, 4), b.read_holding(1, 0, 4))
+            return ra, rb, time.monotonic() - t0
+
+    ra, rb, dt = asyncio.run(run())
+    assert ra == (1, 2, 3, 4) and rb == (5, 6, 7, 8)
+    assert dt < 0.09  # two 50 ms transactions overlapped
+
+
+def test_queue_serialises_and_cancelled_requests_skip_the_wire():
+    async def run():
+        ser = SlowSerial([1, 2, 3, 4])
+        c = AsyncModbusClient(ModbusMaster(ser))
+        async with c:
+            first = asyncio.ensure_future(c.read_holding(1, 0, 1))
+            second = asyncio.ensure_future(c.read_holding(1, 1, 1))
+            await asyncio.sleep(0.01)
+            second.cancel()
+            assert await first == (1,)
+            # Times out while queued behind a slow transaction
+            blocker = asyncio.ensure_future(c.read_holding(1, 0, 1))
+            await asyncio.sleep(0.01)
+            with pytest.raises(asyncio.TimeoutError):
+                await c.read_holding(1, 0, 1, timeout_s=0.01)
+            await blocker
+            snap = await snapshot(c, addrs=(1, 2))
+        return ser, snap
+
+    ser, snap = asyncio.run(run())
+    assert snap[1] == (1, 2, 3, 4) and snap[2] is None
+    # first, blocker and the two snapshot reads; the cancelled and timed-out requests never went out
+    assert ser.writes == 4
+
+
+def test_closed_client_rejects_requests():
+    async def run():
+        c = AsyncModbusClient(ModbusMaster(SlowSerial([0])))
+        with pytest.raises(BusClosed):
+            await c.read_holding(1, 0, 1)
+
+    asyncio.run(run())
+
+
+def test_close_waits_for_the_wire_without_blocking_the_loop():
+    async def run():
+        a = AsyncModbusClient(ModbusMaster(SlowSerial([1], delay_s=0.3)), name="a")
+        b = AsyncModbusClient(ModbusMaster(SlowSerial([2])), name="b")
+        async with b:
+            await a.start()
+            pending = asyncio.ensure_future(a.read_holding(1, 0, 1))
+            await asyncio.sleep(0.01)  # a's transaction is on the wire
+            t0 = time.monotonic()
+            closing = asyncio.ensure_future(a.close())
+            assert await b.read_holding(1, 0, 1) == (2,)
+            dt = time.monotonic() - t0
+            await closing
+            with pytest.raises(BusClosed):
+                await pending
+        return dt
+
+    assert asyncio.run(run()) < 0.2
+
+
+def test_timeout_bounds_waiting_for_a_full_queue():
+    async def run():
+        ser = SlowSerial([1, 2, 3, 4], delay_s=0.1)
+        c = AsyncModbusClient(ModbusMaster(ser), queue_size=1)
+        async with c:
+            on_wire = asyncio.ensure_future(c.read_holding(1, 0, 1))
+            await asyncio.sleep(0.01)
+            queued = asyncio.ensure_future(c.read_holding(1, 1, 1))  # fills the queue
+            await asyncio.sleep(0)
+            t0 = time.monotonic()
+            with pytest.raises(asyncio.TimeoutError):
+                await c.read_holding(1, 2, 1, timeout_s=0.02)
+            dt = time.monotonic() - t0
+            assert await on_wire == (1,) and await queued == (2,)
+        return ser, dt
+
+    ser, dt = asyncio.run(run())
+    assert dt < 0.08 and ser.writes == 2  # the timed-out request never went out
@@ -0,0 +1,130 @@
+import asyncio
+import json
+import struct
+
+from firmware.core.modbus_maps import PumpMap
+from firmware.core.modbus_rtu import SimpleSlave
+from firmware.master.modbus_async import AsyncModbusClient
+from firmware.master.modbus_gateway import Gateway
+from firmware.master.modbus_master import ModbusMaster
+
+
+class MapSerial:
+    def __init__(self, m):
+        self.slave = SimpleSlave(1, m.read_image, m.write, input_cb=m.read_input_image)
+        self.rx = bytearray()
+        self.timeout = None
+        self.requests = 0
+
+    def write(self, data):
+        self.requests += 1
+        resp = self.slave.feed_uart(data)
+        if resp:
+            self.rx.extend(resp)
+
+    def read(self, n):
+        out = bytes(self.rx[:n])
+        del self.rx[:n]
+        return out
+
+
+class Clock:
+    t = 0.0
+
+    def __call__(self):
+        return self.t
+
+
+def _run(coro_fn):
+    m = PumpMap()
+    m.publish(1, 0, True)
+    ser = MapSerial(m)
+    clock = Clock()
+
+    async def run():
+        client = AsyncModbusClient(ModbusMaster(ser, timeout_s=0.01))
+        await client.start()
+        gw = Gateway(client, max_age_s=1.0, nodes=(1,), clock=clock)
+        tcp_port, json_port = await gw.start(tcp_port=0, json_port=0, refresh=False)
+        try:
+            return await coro_fn(gw, tcp_port, json_port, ser, m, clock)
+        finally:
+            await gw.close()
+            await client.close()
+
+    return asyncio.run(run())
+
+
+async def _mbap(port, requests):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    out = []
+    for tid, unit, pdu in requests:
+        writer.write(struct.pack(">HHHB", tid, 0, len(pdu) + 1, unit) + pdu)
+        hdr = await reader.readexactly(7)
+        rtid, _, length, runit = struct.unpack(">HHHB", hdr)
+        out.append((rtid, runit, await reader.readexactly(length - 1)))
+    writer.close()
+    return out
+
+
+def test_modbus_tcp_reads_are_served_from_the_mirror():
+    async def scenario(gw, tcp_port, json_port, ser, m, clock):
+        read = bytes([0x03, 0, 0, 0, 4])
+        r = await _mbap(tcp_port, [(1, 1, read), (2, 1, read)])
+        assert r[0] == (1, 1, bytes([0x03, 8, 0, 1, 0, 0, 0, 1, 0, 1]))
+        assert r[1] == (2, 1, r[0][2])
+        assert ser.requests == 1 and gw.mirror_hits == 1
+        clock.t = 5.0  # stale: goes back to the bus
+        await _mbap(tcp_port, [(3, 1, read)])
+        assert ser.requests == 2
+        # Writes are forwarded and invalidate the mirrored registers
+        r = await _mbap(tcp_port, [(4, 1, bytes([0x06, 0, 8, 0, 7])), (5, 1, bytes([0x03, 0, 8, 0, 1]))])
+        assert r[0][2] == bytes([0x06, 0, 8, 0, 7]) and r[1][2] == bytes([0x03, 2, 0, 7])
+        assert ser.requests == 4
+        # Silent node and unsupported function map to Modbus exceptions
+        r = await _mbap(tcp_port, [(6, 9, read), (7, 1, bytes([0x2B, 0x0E]))])
+        assert r[0][2] == bytes([0x83, 0x0B]) and r[1][2] == bytes([0xAB, 0x01])
+
+    _run(scenario)
+
+
+def test_concurrent_json_clients_share_one_bus_read():
+    async def scenario(gw, tcp_port, json_port, ser, m, clock):
+        async def client():
+            reader, writer = await asyncio.open_connection("127.0.0.1", json_port)
+            writer.write(b'{"op": "read", "addr": 1, "start": 0, "count": 4}\n')
+            out = json.loads(await reader.readline())
+            writer.close()
+            return out
+
+        outs = await asyncio.gather(*(client() for _ in range(5)))
+        assert all(o["values"] == [1, 0, 1, 1] for o in outs)
+        assert ser.requests == 1
+        assert await gw.handle_json({"op": "write", "addr": 1, "start": 8, "values": [3, 4]}) == {"ok": True}
+        assert m.reg[8] == 3 and m.reg[9] == 4
+        snap = await gw.handle_json({"op": "snapshot"})
+        assert snap["mirror"]["1"]["3"]["0"]["value"] == 1
+        assert (await gw.handle_json({"op": "nope"}))["error"] == "unknown_op"
+        for bad in ({"func": 6}, {"count": 0}, {"count": 126}):
+            req = dict({"op": "read", "addr": 1, "start": 0}, **bad)
+            assert await gw.handle_json(req) == {"error": "bad_request"}
+        for values in ([], list(range(124))):
+            assert await gw.handle_json({"op": "write", "addr": 1, "start": 0, "values": values}) == {"error": "bad_request"}
+        assert ser.requests == 2 and gw.bus_writes == 1
+
+    _run(scenario)
+
+
+def test_write_during_inflight_read_does_not_leave_stale_mirror():
+    async def scenario(gw, tcp_port, json_port, ser, m, clock):
+        stale = asyncio.ensure_future(gw.read(1, 3, 8, 1))
+        await asyncio.sleep(0)  # the read is queued on the bus
+        write = asyncio.ensure_future(gw.write(1, 8, (42,)))
+        await asyncio.sleep(0)
+        joined = asyncio.ensure_future(gw.read(1, 3, 8, 1))  # must queue behind the write
+        await write
+        assert await stale == ((0,), 0.0)
+        assert (await joined)[0] == (42,)
+        assert (await gw.read(1, 3, 8, 1))[0] == (42,)
+
+    _run(scenario)
@@ -0,0 +1,81 @@
+from firmware.core.modbus_maps import RegisterBank, PumpMap
+from firmware.core.modbus_rtu import SimpleSlave, build_adu
+from firmware.master.modbus_master import build_read_holding, parse_read_holding_response
+
+
+def test_register_bank_keeps_wire_image_in_sync():
+    b = RegisterBank(4)
+    b[1] = 0x1234
+    b[3] = 0x1ABCD  # truncated to 16 bits
+    assert b[1] == 0x1234 and b[3] == 0xABCD
+    assert bytes(b.image) == bytes([0, 0, 0x12, 0x34, 0, 0, 0xAB, 0xCD])
+    v = b.view(1, 2)
+    b[2] = 7
+    assert bytes(v) == bytes([0x12, 0x34, 0, 7])  # a view, not a copy
+    assert b.view(3, 2) is None and b.read(0, 2) == (True, (0, 0x1234))
+
+
+def test_map_write_only_reaches_command_area():
+    m = PumpMap()
+    assert m.write(0, (9,) * 10)
+    assert m.read(0, 10) == (True, (0,) * 8 + (9, 9))
+    assert not m.write(15, (1, 2))
+
+
+def test_slave_serves_image_reads():
+    m = PumpMap()
+    m.reg[0] = 1
+    m.reg[2] = 1
+    tuple_slave = SimpleSlave(1, m.read, m.write)
+    image_slave = SimpleSlave(1, m.read_image, m.write)
+    req = build_read_holding(1, 0, 4)
+    a = bytes(tuple_slave.feed_uart(req))
+    b = bytes(image_slave.feed_uart(req))
+    assert a == b
+    assert parse_read_holding_response(b) == (1, (1, 0, 1, 0))
+
+
+def test_generation_bumps_only_on_change():
+    m = PumpMap()
+    g = m.generation()
+    m.reg[0] = 0
+    assert m.generation() == g
+    m.reg[0] = 1
+    m.inp[0] = 5
+    assert m.generation() == g + 2
+
+
+def test_slave_reuses_cached_response_until_registers_change():
+    m = PumpMap()
+    calls = []
+
+    def read_image(start, count):
+        calls.append((start, count))
+        return m.read_image(start, count)
+
+    slave = SimpleSlave(1, read_image, m.write, input_cb=m.read_input_image, generation=m.generation)
+    req = build_read_holding(1, 0, 4)
+    first = bytes(slave.feed_uart(req))
+    assert bytes(slave.feed_uart(req)) == first and len(calls) == 1
+    m.reg[1] = 3  # status change invalidates
+    assert parse_read_holding_response(bytes(slave.feed_uart(req))) == (1, (0, 3, 0, 0))
+    assert len(calls) == 2
+    # A write through Modbus invalidates too
+    slave.feed_uart(build_read_holding(1, 8, 1))
+    slave.feed_uart(build_adu(1, bytes([0x06, 0, 8, 0, 9])))
+    assert parse_read_holding_response(bytes(slave.feed_uart(build_read_holding(1, 8, 1)))) == (1, (9,))
+    # Different windows get their own slots
+    for start in range(6):
+        slave.feed_uart(build_read_holding(1, start, 2))
+    assert len(slave._cache) == SimpleSlave.CACHE_SLOTS
+
+
+def test_publish_bumps_change_sequence_only_on_change():
+    m = PumpMap()
+    assert m.publish(1, 0, True)
+    assert m.reg[3] == 1
+    assert not m.publish(1, 0, True)
+    assert m.reg[3] == 1
+    assert m.publish(0, 0, True) and m.reg[3] == 2
+    m.reg[3] = 0xFFFF
+    assert m.publish(2, 3, False) and m.reg[3] == 0  # wraps
@@ -0,0 +1,184 @@
+import pytest
+
+from firmware.core.modbus_rtu import SimpleSlave, build_adu
+from firmware.core.modbus_maps import PumpMap
+from firmware.master.modbus_master import ModbusMaster, ModbusException, WriteCoalescer, expected_response_len, NodeStats
+
+
+class LoopbackSerial:
+    """Feeds written requests into SimpleSlave instances and serves their responses."""
+
+    def __init__(self, *slaves):
+        self.slaves = slaves
+        self.rx = bytearray()
+        self.timeout = None
+        self.reads = []
+        self.requests = []
+
+    def reset_input_buffer(self):
+        self.rx.clear()
+
+    def write(self, data):
+        self.requests.append(bytes(data))
+        for s in self.slaves:
+            resp = s.feed_uart(data)
+            if resp:
+                self.rx.extend(resp)
+
+    def flush(self):
+        pass
+
+    def read(self, n):
+        self.reads.append((n, self.timeout))
+        out = bytes(self.rx[:n])
+        del self.rx[:n]
+        return out
+
+
+def _slave(addr, regs):
+    def read_cb(start, count):
+        if start + count > len(regs):
+            return False, ()
+        return True, tuple(regs[start:start + count])
+
+    def write_cb(start, values):
+        if start + len(values) > len(regs):
+            return False
+        regs[start:start + len(values)] = values
+        return True
+
+    return SimpleSlave(addr, read_cb, write_cb)
+
+
+def test_expected_response_len():
+    assert expected_response_len(bytes([0x03, 0, 0, 0, 4])) == 13
+    assert expected_response_len(bytes([0x06, 0, 1, 0, 2])) == 8
+
+
+def test_read_holding_reads_exact_length():
+    ser = LoopbackSerial(_slave(1, [5, 6, 7, 8]), _slave(2, [0] * 4))
+    m = ModbusMaster(ser, baudrate=9600, timeout_s=0.2)
+    assert m.read_holding(1, 0, 4) == (5, 6, 7, 8)
+    # Header then exactly the remaining bytes; never a blind read(256)
+    assert [n for n, _ in ser.reads] == [3, 10]
+    assert ser.reads[1][1] < 0.2
+
+
+def test_exception_response_stops_early():
+    ser = LoopbackSerial(_slave(1, [0] * 4))
+    m = ModbusMaster(ser)
+    with pytest.raises(ModbusException) as ei:
+        m.read_holding(1, 2, 10)
+    assert ei.value.code == 0x02
+    assert [n for n, _ in ser.reads] == [3, 2]
+
+
+def test_timeout_and_write_single():
+    regs = [0] * 4
+    ser = LoopbackSerial(_slave(1, regs))
+    m = ModbusMaster(ser)
+    assert m.read_holding(9, 0, 4) is None
+    assert m.write_single(1, 3, 0x1234) and regs[3] == 0x1234
+
+
+def test_bad_crc_raises():
+    class Corrupt(LoopbackSerial):
+        def write(self, data):
+            frame = bytearray(build_adu(1, bytes([0x03, 0x02, 0, 1])))
+            frame[-1] ^= 0xFF
+            self.rx.extend(frame)
+
+    with pytest.raises(ValueError):
+        ModbusMaster(Corrupt()).read_holding(1, 0, 1)
+
+
+def test_read_input_and_read_write_multiple():
+    m = PumpMap()
+    m.inp[0] = 421
+    slave = SimpleSlave(1, m.read, m.write, input_cb=m.read_input)
+    ser = LoopbackSerial(slave)
+    master = ModbusMaster(ser)
+    assert master.read_input(1, 0, 2) == (421, 0)
+    # Write a command register and read it back with the status block in one round trip
+    assert master.read_write_multiple(1, 0, 9, 8, (7,)) == (0,) * 8 + (7,)
+    assert len(ser.requests) == 2
+
+
+def test_read_input_without_bank_is_illegal_function():
+    ser = LoopbackSerial(_slave(1, [0] * 4))
+    with pytest.raises(ModbusException) as ei:
+        ModbusMaster(ser).read_input(1, 0, 1)
+    assert ei.value.code == 0x01
+
+
+def test_write_coalescer_merges_adjacent_registers():
+    regs = [0] * 16
+    ser = LoopbackSerial(_slave(1, regs))
+    wc = WriteCoalescer()
+    wc.write(1, 8, (1,))
+    wc.write(1, 9, (2, 3))
+    wc.write(1, 8, (4,))  # overrides the pending value
+    wc.write(1, 14, (5,))
+    assert wc.runs(1) == [(8, (4, 2, 3)), (14, (5,))]
+    assert wc.flush(ModbusMaster(ser))
+    assert regs[8:11] == [4, 2, 3] and regs[14] == 5
+    assert [r[1] for r in ser.requests] == [0x10, 0x06]
+    assert wc.runs(1) == []
+
+
+def test_write_coalescer_keeps_failed_runs():
+    ser = LoopbackSerial()
+    wc = WriteCoalescer()
+    wc.write(2, 0, (1, 2))
+    assert not wc.flush(ModbusMaster(ser))
+    assert wc.runs(2) == [(0, (1, 2))]
+
+
+def test_write_coalescer_exception_response_keeps_run_and_sends_the_rest():
+    regs = [0] * 16
+    ser = LoopbackSerial(_slave(1, regs))
+    wc = WriteCoalescer()
+    wc.write(1, 14, (1, 2, 3))  # past the end of the map: illegal address exception
+    wc.write(1, 2, (7,))
+    wc.write(3, 0, (9,))  # silent node
+    assert not wc.flush(ModbusMaster(ser, timeout_s=0.01))
+    assert regs[2] == 7
+    assert wc.runs(1) == [(14, (1, 2, 3))] and wc.runs(3) == [(0, (9,))]
+
+
+def test_per_node_stats_and_latency_histogram():
+    t = [0.0]
+
+    def clock():
+        t[0] += 0.003  # every clock read advances 3 ms
+        return t[0]
+
+    regs = [1, 2, 3, 4]
+    master = ModbusMaster(LoopbackSerial(_slave(1, regs)), clock=clock, sleep=lambda s: None)
+    assert master.read_holding(1, 0, 4) == (1, 2, 3, 4)
+    with pytest.raises(ModbusException):
+        master.read_holding(1, 10, 4)
+    assert master.read_holding(7, 0, 1) is None
+    st = master.stats[1].as_dict()
+    assert (st["requests"], st["ok"], st["exceptions"], st["timeouts"]) == (2, 1, 1, 0)
+    # Three clock reads per transaction: start, end of response (gap bookkeeping), done
+    assert st["latency_ms"]["buckets"]["10"] == 2 and st["latency_ms"]["p50"] == 10.0
+    assert master.stats[7].timeouts == 1 and master.stats[7].percentile_ms(50) is None
+
+
+def test_latency_percentiles_from_buckets():
+    st = NodeStats()
+    for ms in (0.5, 3, 3, 8, 700):
+        st.record(ms / 1000.0)
+    assert st.hist[0] == 1 and st.hist[2] == 2 and st.hist[-1] == 1
+    assert st.percentile_ms(50) == 5.0 and st.percentile_ms(70) == 10.0
+    assert st.percentile_ms(99) is None  # beyond the last bucket bound
+
+
+def test_diagnostics_counters_over_the_bus():
+    master = ModbusMaster(LoopbackSerial(_slave(1, [0] * 4)))
+    master.read_holding(1, 0, 2)
+    assert master.diagnostic(1, 0x0E) == 2
+    assert master.read_diag_counters(1) == {"frames": 3, "crc_errors": 0, "foreign": 0, "exceptions": 0, "resyncs": 0}
+    assert master.clear_diag_counters(1)
+    assert master.diagnostic(1, 0x0B) == 1
@@ -0,0 +1,109 @@
+from firmware.common import config
+from firmware.core.modbus_rtu import SimpleSlave
+from firmware.master.modbus_master import ModbusMaster
+from firmware.master.modbus_poller import Poller, PollNode
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+    def sleep(self, dt):
+        self.t += dt
+
+
+class BusSerial:
+    def __init__(self, clock, slaves):
+        self.clock = clock
+        self.slaves = slaves
+        self.rx = bytearray()
+        self.timeout = None
+
+    def write(self, data):
+        for s in self.slaves:
+            resp = s.feed_uart(data)
+            if resp:
+                self.rx.extend(resp)
+
+    def read(self, n):
+        out = bytes(self.rx[:n])
+        del self.rx[:n]
+        if not out:
+            self.clock.t += self.timeout  # silent node: the read times out
+        return out
+
+
+def _setup(cfg=config.PollConfig()):
+    regs = {1: [0, 0, 1, 0], 2: [0, 0, 1, 0]}
+
+    def make(addr):
+        r = regs[addr]
+        return SimpleSlave(addr, lambda s, c: (True, tuple(r[s:s + c])), lambda s, v: True)
+
+    clock = FakeClock()
+    ser = BusSerial(clock, [make(1), make(2)])
+    nodes = [PollNode("pump", 1), PollNode("autofill", 2), PollNode("boiler", 3)]
+    seen = []
+    p = Poller(ModbusMaster(ser, baudrate=9600), nodes, cfg=cfg, on_update=lambda n, ch: seen.append((n.name, ch)),
+               clock=clock, sleep=clock.sleep)
+    return p, regs, clock, seen
+
+
+def _counts(p, seconds):
+    clock = p.clock
+    counts = {n.name: 0 for n in p.nodes}
+    end = clock.t + seconds
+    while clock.t < end:
+        counts[p.step().name] += 1
+    return counts
+
+
+def test_active_node_is_polled_faster_and_silent_node_backs_off():
+    p, regs, clock, seen = _setup()
+    regs[1][0] = 1  # pump running
+    c = _counts(p, 10.0)
+    assert c["pump"] >= 60
+    assert 8 <= c["autofill"] <= 12
+    assert c["boiler"] <= 4  # timeouts back off towards fault_period_s
+    assert ("pump", True) in seen
+    # Pump stops: falls back to the idle rate
+    regs[1][0] = 0
+    c = _counts(p, 10.0)
+    assert c["pump"] <= 12
+
+
+def test_bus_utilisation_stays_under_target():
+    cfg = config.PollConfig(active_period_s=0.0, max_utilisation=0.25)
+    p, regs, clock, _ = _setup(cfg)
+    regs[1][0] = regs[2][0] = 1
+    p.nodes.pop()  # drop the silent node: only wire time counts here
+    t0 = clock.t
+    p.run(max_polls=200)
+    # The last poll's hold-off has not elapsed yet, hence a little slack
+    assert 0.2 <= p.wire_s / (clock.t - t0) <= 0.26
+
+
+def test_report_by_exception_reads_block_only_when_sequence_moves():
+    from firmware.core.modbus_maps import PumpMap
+
+    m = PumpMap()
+    m.publish(0, 0, True)
+    clock = FakeClock()
+    ser = BusSerial(clock, [SimpleSlave(1, m.read_image, m.write)])
+    requests = []
+    write = ser.write
+    ser.write = lambda data: (requests.append((data[2] << 8 | data[3], data[5])), write(data))
+    seen = []
+    p = Poller(ModbusMaster(ser), [PollNode("pump", 1)], on_update=lambda n, ch: seen.append(ch),
+               clock=clock, sleep=clock.sleep, by_exception=True)
+    p.run(max_polls=5)
+    # First poll reads the block, later ones only the sequence register
+    assert requests == [(0, 4)] + [(3, 1)] * 4
+    assert seen == [True, False, False, False, False]
+    m.publish(1, 0, True)  # brew starts
+    p.run(max_polls=1)
+    assert requests[-2:] == [(3, 1), (0, 4)]
+    assert seen[-1] is True and p.nodes[0].status == 1
@@ -0,0 +1,55 @@
+from firmware.core.modbus_maps import PumpMap, BoilerMap, REG_SEQ, REG_BAUD
+from firmware.core.modbus_rtu import SimpleSlave
+from firmware.core.modbus_schema import PUMP, AUTOFILL, BOILER, for_addr
+from firmware.master.aggregator_modbus_cli import snapshot
+from firmware.master.modbus_master import ModbusMaster
+
+
+def test_node_encoders_match_published_codes():
+    assert [PUMP.status.encode(s) for s in ("idle", "run", "inhibit", "fault", "bogus")] == [0, 1, 2, 3, 0]
+    assert PUMP.reason.encode("pump_run_timeout") == 5 and PUMP.reason.encode(None) == 0
+    assert AUTOFILL.status.encode("fill") == 1 and AUTOFILL.reason.encode("fill_timeout") == 3
+    assert BOILER.status.encode("hold") == BOILER.status.encode("heat") == 1
+    level = PUMP.inputs["tank_level_pct"]
+    assert level.encode(None) == 0xFFFF and level.encode(52.34) == 523 and level.encode(7000) == 0xFFFE
+    pressure = BOILER.inputs["pressure_bar"]
+    assert pressure.encode(1.2345) == 1234 and pressure.encode(-0.1) == 0 and pressure.encode(99.0) == 0xFFFF
+
+
+def test_master_decodes_blocks_in_one_pass():
+    assert PUMP.decode_holding((1, 3, 1, 7)) == {"status": "run", "reason": "tank_not_ok", "tank_ok": True, "seq": 7}
+    assert BOILER.decode_holding((1, 9, 0, 2)) == {"status": "heat", "reason": 9, "seq": 2}
+    assert PUMP.decode_holding((4, 0), start=REG_SEQ) == {"seq": 4}
+    assert PUMP.decode_holding((1152,), start=REG_BAUD) == {"baud": 115200}
+    assert PUMP.decode_input((0xFFFF,)) == {"tank_level_pct": None}
+    assert PUMP.decode_input((523,)) == {"tank_level_pct": 52.3}
+    assert BOILER.decode_input((1234, 3)) == {"pressure_bar": 1.234, "overruns": 3}
+    assert for_addr(3) is BOILER and for_addr(99) is None
+
+
+def test_aggregator_snapshot_decodes_over_the_bus():
+    pump, boiler = PumpMap(), BoilerMap()
+    pump.publish(PUMP.status.encode("run"), PUMP.reason.encode(None), True)
+    boiler.publish(BOILER.status.encode("fault"), BOILER.reason.encode("heater_on_timeout"))
+    slaves = [SimpleSlave(1, pump.read_image, pump.write), SimpleSlave(3, boiler.read_image, boiler.write)]
+
+    class Port:
+        def __init__(self):
+            self.timeout = None
+            self.rx = bytearray()
+
+        def write(self, data):
+            for s in slaves:
+                r = s.feed_uart(data)
+                if r:
+                    self.rx.extend(r)
+
+        def read(self, n):
+            out = bytes(self.rx[:n])
+            del self.rx[:n]
+            return out
+
+    snap = snapshot(ModbusMaster(Port(), timeout_s=0.01))
+    assert snap["pump"] == {"status": "run", "reason": None, "tank_ok": True, "seq": 1}
+    assert snap["autofill"] is None
+    assert snap["boiler"]["status"] == "fault" and snap["boiler"]["reason"] == "heater_on_timeout"
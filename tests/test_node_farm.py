@@ -0,0 +1,29 @@
+import pytest
+
+pytest.importorskip("tty")  # pty transport is POSIX-only
+
+from firmware.master.modbus_master import build_read_holding, parse_read_holding_response  # noqa: E402
+from tools.node_farm import EmulatedNode, Farm, drive  # noqa: E402
+
+
+def test_emulated_pump_publishes_controller_state():
+    node = EmulatedNode("pump", 5)
+    node.hal.brew = True
+    node.step(100.0)
+    assert node.hal.pump_state is True
+    resp = node.feed(build_read_holding(5, 0, 4))
+    addr, vals = parse_read_holding_response(resp)
+    assert addr == 5 and vals[0] == 1 and vals[3] == 1  # run, change sequence bumped
+    assert node.feed(build_read_holding(6, 0, 4)) is None
+
+
+def test_farm_over_pty_serves_the_master():
+    farm = Farm(6, n_buses=2)
+    farm.start()
+    try:
+        r = drive(farm, seconds=0.5)
+    finally:
+        farm.stop()
+    assert r["buses"] == 2 and r["polls"] > 10
+    assert r["timeouts"] == 0 and r["errors"] == 0
+    assert all(n["requests"] > 0 for n in r["node_cpu"])
@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+from firmware.core.modbus_maps import PumpMap
+from firmware.core.modbus_rtu import SimpleSlave
+from firmware.core.gc_monitor import GcMonitor
+from firmware.core.node_runtime import NodeRuntime
+from firmware.core.rs485_link import Rs485Link
+from firmware.master.modbus_master import build_read_holding, parse_read_holding_response
+
+
+class QueueUart:
+    """UART stand-in: requests come from a queue (readiness), responses are timestamped."""
+
+    def __init__(self):
+        self.q = asyncio.Queue()
+        self.sent = []
+
+    async def read(self, n):
+        return await self.q.get()
+
+    def write(self, data):
+        self.sent.append((time.monotonic(), bytes(data)))
+
+    def flush(self):
+        pass
+
+
+def test_modbus_answered_between_control_ticks():
+    async def scenario():
+        m = PumpMap()
+        uart = QueueUart()
+        link = Rs485Link(uart, None, SimpleSlave(1, m.read_image, m.write), m.reg)
+        samples = []
+
+        def control(now):
+            m.publish(1, 0, True)
+
+        heap = {"free": 50000, "collects": 0}
+
+        def collect():
+            heap["collects"] += 1
+
+        gcm = GcMonitor(budget_bytes=0, mem_free=lambda: heap["free"], collect=collect)
+        rt = NodeRuntime(control, 200, link, sample=lambda: samples.append(1), sample_period_ms=20, reader=uart,
+                         gc_monitor=gcm)
+        task = asyncio.ensure_future(rt.run())
+        await asyncio.sleep(0.05)  # the control task is now sleeping out its 200 ms period
+        latencies = []
+        for _ in range(3):
+            t0 = time.monotonic()
+            uart.q.put_nowait(build_read_holding(1, 0, 4))
+            while len(uart.sent) <= len(latencies):
+                await asyncio.sleep(0.001)
+            latencies.append(uart.sent[-1][0] - t0)
+            await asyncio.sleep(0.03)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return rt, latencies, uart, samples, heap
+
+    rt, latencies, uart, samples, heap = asyncio.run(scenario())
+    assert parse_read_holding_response(uart.sent[0][1]) == (1, (1, 0, 1, 1))
+    assert max(latencies) < 0.05  # far below the 200 ms control period
+    assert rt.ticks in (1, 2) and len(samples) >= 5
+    assert rt.gc_monitor.ticks == rt.ticks and heap["collects"] == rt.ticks
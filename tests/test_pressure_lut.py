@@ -0,0 +1,43 @@
+from firmware.common import config
+from firmware.core.boiler_controller import BoilerController
+from firmware.core.hal_mpy import HAL
+from firmware.core.hal_stub import HAL as StubHAL
+from firmware.core.modbus_schema import BOILER
+from firmware.core.pressure_lut import PressureLut
+
+
+def _bar(c):
+    return HAL.steam_pressure_from_temp_c(HAL.temp_c_from_counts(c))
+
+
+def test_count_thresholds_match_float_decisions_for_every_count():
+    for cfg in (config.boiler, config.boiler._replace(target_bar=0.9, hysteresis_bar=0.05)):
+        lut = PressureLut(boiler=cfg)
+        on_below = cfg.target_bar - cfg.hysteresis_bar
+        off_above = cfg.target_bar + cfg.hysteresis_bar
+        for c in range(config.thermistor.adc_fullscale_counts + 1):
+            p = _bar(c)
+            plausible = cfg.sensor_min_bar <= p <= cfg.sensor_max_bar
+            assert (lut.plausible_lo <= c <= lut.plausible_hi) == plausible, c
+            if plausible:
+                assert (c > lut.heat_above) == (p < on_below), c
+                assert (c <= lut.idle_upto) == (p > off_above), c
+
+
+def test_mbar_table_matches_the_curve():
+    lut = PressureLut()
+    assert len(lut.table) < 300
+    for c in range(config.thermistor.adc_fullscale_counts + 1):
+        assert lut.mbar(c) == BOILER.inputs["pressure_bar"].encode(_bar(c)), c
+
+
+def test_boiler_step_counts_heats_and_idles():
+    lut = PressureLut()
+    hal = StubHAL()
+    c = BoilerController(hal, lut=lut)
+    c.step_counts(0, lut.heat_above + 1)
+    assert (c.state, c.reason) == ("heat", None) and hal.heater_state is True
+    c.step_counts(200, lut.idle_upto)
+    assert c.state == "idle" and hal.heater_state is False
+    c.step_counts(400, lut.plausible_hi + 1)
+    assert (c.state, c.reason) == ("fault", "sensor_out_of_range")
@@ -1,5 +1,7 @@
 import time
 
+from firmware.common.clock import SimClock
+
 from firmware.core.pump_controller import PumpController
 from firmware.core.hal_stub import HAL
 
@@ -51,3 +53,43 @@ def test_timeout_fault():
     # Exceed max_run_s
     s, r = c.tick(t0 + c.cfg.max_run_s + 1, brew_switch=True)
     assert s == "fault" and r == "pump_run_timeout" and hal.pump_state is False
+
+
+def test_step_updates_state_in_place_with_integer_ticks():
+    hal = HAL()
+    c = PumpController(hal)
+    c.step(1000, True)
+    assert (c.state, c.reason) == ("run", None) and hal.pump_state is True
+    c.step(2000, False)
+    assert (c.state, c.reason) == ("idle", None)
+    c.step(2000 + c.cfg.min_rest_s * 1000 - 1, True)
+    assert (c.state, c.reason) == ("inhibit", "rest")
+    # The per-minute ring forgets starts older than 60 s
+    t = 10000
+    for _ in range(c.cfg.max_starts_per_min):
+        c.step(t, True)
+        c.step(t + 100, False)
+        t += c.cfg.min_rest_s * 1000 + 200
+    c.step(t, True)
+    assert c.reason == "rate_limit"
+    c.step(10000 + 60001, True)
+    assert c.state == "run"
+
+
+def test_zero_starts_per_minute_blocks_every_start():
+    hal = HAL()
+    c = PumpController(hal, cfg=PumpController(hal).cfg._replace(max_starts_per_min=0))
+    c.step(1000, True)
+    assert (c.state, c.reason) == ("inhibit", "rate_limit") and hal.pump_state is False
+
+
+def test_max_run_timeout_in_simulated_time():
+    clk = SimClock()
+    hal = HAL()
+    c = PumpController(hal, clock=clk)
+    # 50 ms control ticks for the whole run, without waiting max_run_s in real time
+    while c.state != "fault":
+        c.step(clk.ticks_ms(), True)
+        clk.advance(50)
+    assert c.reason == "pump_run_timeout" and hal.pump_state is False
+    assert clk.ticks_ms() == c.cfg.max_run_s * 1000 + 100
@@ -1,3 +1,4 @@
+from firmware.common.clock import SimClock
 from firmware.common.safety import FaultLatch, Watchdog, RateLimiter
 import time
 
@@ -25,3 +26,97 @@ def test_rate_limiter():
     assert not r.allow()
     time.sleep(0.06)
     assert r.allow()
+
+
+def test_watchdog_and_rate_limiter_on_simulated_clock():
+    clk = SimClock(start_ms=5000)
+    w = Watchdog(timeout_s=2.0, clock=clk)
+    r = RateLimiter(min_interval_s=30.0, clock=clk)
+    assert r.allow() and not r.allow()
+    clk.advance(2000)
+    assert not w.expired()
+    clk.advance(1)
+    assert w.expired()
+    w.kick()
+    assert not w.expired()
+    clk.advance(28000)
+    assert r.allow()
+
+
+def test_sliding_window_counter():
+    from firmware.common.safety import SlidingWindowCounter
+
+    clk = SimClock()
+    w = SlidingWindowCounter(3, 60.0, clock=clk)
+    for _ in range(3):
+        assert w.try_acquire()
+        clk.advance(10000)
+    assert not w.allow()
+    clk.advance(30000)  # first event exactly 60 s ago: still inside the window
+    assert not w.try_acquire()
+    clk.advance(1)
+    assert w.try_acquire() and not w.allow()
+    assert len(w._times) == 3  # fixed memory however many events
+    assert not SlidingWindowCounter(0, 60.0, clock=clk).allow()
+
+
+def test_min_interval_and_token_bucket():
+    from firmware.common.safety import MinIntervalLimiter, TokenBucket
+
+    clk = SimClock()
+    m = MinIntervalLimiter(5.0, clock=clk)
+    assert m.ready()
+    m.mark()
+    clk.advance(4999)
+    assert not m.ready() and m.ready(now_ms=clk.ticks_ms() + 1)
+
+    b = TokenBucket(rate_per_s=0.1, burst=3, clock=clk)  # 6 per minute, 3 back to back
+    assert [b.try_acquire() for _ in range(4)] == [True, True, True, False]
+    clk.advance(9999)
+    assert not b.try_acquire()
+    clk.advance(1)
+    assert b.try_acquire() and b.tokens() == 0
+    clk.advance(3600 * 1000)
+    assert b.tokens() == 3 and b.try_acquire(3)
+
+
+def test_token_bucket_slow_rates():
+    from firmware.common.safety import TokenBucket
+
+    clk = SimClock()
+    b = TokenBucket(rate_per_s=1 / 1800, burst=1, clock=clk)  # one start per half hour
+    assert b.try_acquire() and not b.try_acquire()
+    for _ in range(1790):  # refilled a second at a time: remainders must add up
+        clk.advance(1000)
+        assert not b.try_acquire()
+    clk.advance(10 * 1000)
+    assert b.try_acquire()
+    b = TokenBucket(rate_per_s=0.0015, burst=1, clock=clk)
+    assert b.try_acquire()
+    clk.advance(666 * 1000)
+    assert not b.try_acquire()
+    clk.advance(1000)
+    assert b.try_acquire()
+
+
+def test_expired_stamps_survive_tick_wrap():
+    from firmware.common import safety
+    from firmware.common.safety import MinIntervalLimiter, SlidingWindowCounter
+
+    period = 1 << 30  # MicroPython ticks_ms wrap; ticks_diff is valid within +-2**29 ms
+    orig = safety.ticks_diff
+    safety.ticks_diff = lambda a, b: ((a - b + period // 2) % period) - period // 2
+    try:
+        m = MinIntervalLimiter(5.0, clock=SimClock())
+        w = SlidingWindowCounter(2, 60.0, clock=SimClock())
+        m.mark(0)
+        w.record(0)
+        w.record(1000)
+        assert not w.allow(2000)
+        for hour in range(1, 7 * 24 + 1):  # a week idle, expired from each control tick
+            t = hour * 3600 * 1000 % period
+            m.expire(t)
+            w.expire(t)
+        assert m.ready(t) and w.allow(t)
+    finally:
+        safety.ticks_diff = orig
@@ -1,6 +1,7 @@
 import pytest
 from firmware.core.tank_sensor import DYPFrameParser, TankLevel
 from firmware.common import config
+from firmware.common.clock import SimClock
 
 
 class FakeUART:
@@ -48,9 +49,67 @@ def test_tank_level_percent_mapping_and_smoothing():
         sample_hz=config.tank.sample_hz,
     )
     tl = TankLevel(uart=uart, cfg=cfg)
+    assert tl.read_level_percent() is None  # 3 bytes: frame not complete yet
     p1 = tl.read_level_percent()
     p2 = tl.read_level_percent()
     p3 = tl.read_level_percent()
     assert p1 is not None and 90 <= p1 <= 100
     assert p2 is not None and 20 <= p2 <= 80
     assert p3 is not None and 0 <= p3 <= 20
+
+
+class ChunkUART:
+    """Returns whatever has been queued since the last read, never blocks."""
+
+    def __init__(self):
+        self.pending = bytearray()
+        self.reads = 0
+
+    def put(self, dist):
+        hi, lo = dist >> 8, dist & 0xFF
+        self.pending.extend(bytes([0xFF, hi, lo, (0xFF + hi + lo) & 0xFF]))
+
+    def read(self):
+        self.reads += 1
+        if not self.pending:
+            return None
+        out = bytes(self.pending)
+        self.pending = bytearray()
+        return out
+
+
+def test_parser_returns_newest_frame_and_survives_ring_overflow():
+    p = DYPFrameParser()
+    u = ChunkUART()
+    for d in (100, 150, 180):
+        u.put(d)
+    assert p.feed(u.read()) == 180 and p.frames == 3
+    # More garbage than the ring holds, then a frame split across feeds
+    assert p.feed(b"\x01" * 100) is None
+    u.put(1234)
+    frame = u.read()
+    assert p.feed(frame[:2]) is None
+    assert p.feed(frame[2:]) == 1234
+
+
+def test_reader_holds_between_frames_and_goes_stale():
+    clk = SimClock()
+    u = ChunkUART()
+    tl = TankLevel(uart=u, stale_ms=500, clock=clk)
+    assert tl.read_level_percent() is None  # no sensor data: one read, no wait
+    u.put(40)
+    full = tl.read_level_percent()
+    assert full == 100.0
+    # Called every 50 ms, the level holds until the next 10 Hz frame
+    clk.advance(50)
+    assert tl.read_level_percent() == full
+    clk.advance(50)
+    u.put(200)
+    assert tl.read_level_percent() < full
+    clk.advance(600)
+    assert tl.read_level_percent() is None
+    assert u.reads == 5
+
+
+def test_reader_without_uart_returns_none():
+    assert TankLevel(uart=None).read_level_percent() is None
@@ -1,3 +1,5 @@
+import pytest
+
 from firmware.common.utils import Linearizer
 
 
@@ -8,3 +10,38 @@ def test_linearizer_basic():
     assert lin(5.0) == 50.0
     assert lin(10.0) == 100.0
     assert lin(11.0) == 100.0
+
+
+def test_linearizer_many_points_matches_linear_scan():
+    pts = [(i * 10.0, (i * 10.0) ** 1.5) for i in range(40)]
+    lin = Linearizer(list(reversed(pts)))
+
+    def scan(x):
+        for (x0, y0), (x1, y1) in zip(pts, pts[1:]):
+            if x0 <= x <= x1:
+                return y0 + (x - x0) / (x1 - x0) * (y1 - y0)
+
+    # Slowly rising input (segment cache), then jumps back and forth (bisection)
+    xs = [i * 0.37 for i in range(1000)] + [385.0, 3.0, 200.0, 10.0, 390.0]
+    for x in xs:
+        assert abs(lin(x) - scan(x)) < 1e-9
+    assert lin(1e6) == pts[-1][1] and lin(-5) == 0.0
+
+
+def test_linearizer_repeated_x_and_batch():
+    lin = Linearizer([(0.0, 0.0), (5.0, 10.0), (5.0, 20.0), (10.0, 30.0)])
+    assert lin(4.0) == 8.0 and lin(5.0) == 10.0 and lin(5.5) == 21.0 and lin(7.5) == 25.0
+    xs = [0.0, 2.5, 5.0, 6.0, 10.0]
+    assert lin.map(xs) == [lin(x) for x in xs]
+    lin = Linearizer([(0.0, 0.0), (10.0, 100.0)])
+    assert list(lin.map([-1.0, 2.5, 10.0, 12.0])) == [0.0, 25.0, 100.0, 100.0]
+
+
+def test_linearizer_batch_numpy():
+    np = pytest.importorskip("numpy")
+    lin = Linearizer([(0.0, 0.0), (10.0, 100.0), (20.0, 150.0)])
+    out = lin.map(np.array([-1.0, 5.0, 15.0, 30.0]))
+    assert isinstance(out, np.ndarray) and out.tolist() == [0.0, 50.0, 125.0, 150.0]
+    step = Linearizer([(0.0, 0.0), (5.0, 10.0), (5.0, 20.0), (10.0, 30.0)])
+    xs = [-1.0, 0.0, 2.5, 5.0, 6.0, 10.0, 11.0]
+    assert step.map(np.array(xs)).tolist() == [step(x) for x in xs]
@@ -0,0 +1,303 @@
+"""Virtual RS485 bus for end-to-end Modbus tests and polling what-ifs.
+
+Runs the real `SimpleSlave` nodes (with `PumpMap`/`AutofillMap`/`BoilerMap`) and
+the real `ModbusMaster`/`Poller` against a simulated half-duplex bus:
+- simulated time in microseconds; each character occupies 11 bit times on the wire
+- bytes reach every other station when their last bit is sent, with timestamps, so
+  the nodes' 3.5-character gap detection runs as on hardware
+- node turnaround (processing + DE enable) and master DE turnaround
+- random bit errors (noise_ber) and collisions: a byte that overlaps another
+  station's transmission is received corrupted
+
+Usage (example):
+  python -m tools.bus_sim --baud 9600 --seconds 60 --noise 1e-5 --by-exception
+"""
+
+import argparse
+import heapq
+import json
+import math
+import random
+from typing import Dict, List, Optional
+
+from firmware.common import config
+from firmware.core.modbus_maps import PumpMap, AutofillMap, BoilerMap
+from firmware.core.modbus_rtu import SimpleSlave, frame_gap_us
+from firmware.master.modbus_master import ModbusMaster, ModbusException
+from firmware.master.modbus_poller import Poller, PollNode
+
+
+class _Tx:
+    __slots__ = ("sender", "data", "start_us", "end_us", "idx")
+
+    def __init__(self, sender, data: bytes, start_us: float, char_us: float):
+        self.sender = sender
+        self.data = data
+        self.start_us = start_us
+        self.end_us = start_us + len(data) * char_us
+        self.idx = 0
+
+
+class VirtualBus:
+    def __init__(self, baudrate: int = config.bus.baudrate, noise_ber: float = 0.0, seed: int = 1, bits_per_char: int = 11):
+        self.baudrate = baudrate
+        self.char_us = bits_per_char * 1e6 / baudrate
+        self.noise_ber = noise_ber
+        self.rng = random.Random(seed)
+        self.now_us = 0.0
+        self.stations = []
+        self._txs: List[_Tx] = []
+        self._timers = []
+        self._timer_seq = 0
+        self._busy_until_us = 0.0
+        # Statistics
+        self.busy_us = 0.0
+        self.bytes_sent = 0
+        self.collisions = 0
+        self.bit_errors = 0
+
+    # Clock helpers (seconds) for Poller(clock=..., sleep=...)
+    def now_s(self) -> float:
+        return self.now_us / 1e6
+
+    def sleep(self, s: float):
+        self.run_until(self.now_us + s * 1e6)
+
+    def attach(self, station):
+        self.stations.append(station)
+        return station
+
+    def call_at(self, t_us: float, fn):
+        self._timer_seq += 1
+        heapq.heappush(self._timers, (t_us, self._timer_seq, fn))
+
+    def transmit(self, sender, data: bytes, start_us: float) -> float:
+        """Queue `data` on the wire from start_us; returns the time the last bit leaves."""
+        tx = _Tx(sender, bytes(data), max(start_us, self.now_us), self.char_us)
+        self._txs.append(tx)
+        # Wire occupancy: union of transmission intervals
+        busy_from = max(tx.start_us, self._busy_until_us)
+        if tx.end_us > busy_from:
+            self.busy_us += tx.end_us - busy_from
+            self._busy_until_us = tx.end_us
+        self.bytes_sent += len(tx.data)
+        return tx.end_us
+
+    def next_event_us(self) -> Optional[float]:
+        t = self._timers[0][0] if self._timers else None
+        for tx in self._txs:
+            if tx.idx < len(tx.data):
+                e = tx.start_us + (tx.idx + 1) * self.char_us
+                if t is None or e < t:
+                    t = e
+        return t
+
+    def run_until(self, t_us: float):
+        while True:
+            nxt = None
+            for tx in self._txs:
+                if tx.idx < len(tx.data):
+                    e = tx.start_us + (tx.idx + 1) * self.char_us
+                    if nxt is None or e < nxt[0]:
+                        nxt = (e, tx)
+            if self._timers and self._timers[0][0] <= t_us and (nxt is None or self._timers[0][0] <= nxt[0]):
+                te, _, fn = heapq.heappop(self._timers)
+                self.now_us = max(self.now_us, te)
+                fn()
+                continue
+            if nxt is None or nxt[0] > t_us:
+                break
+            self._deliver(nxt[1], nxt[0])
+        self.now_us = max(self.now_us, t_us)
+        # Keep finished transmissions one character longer for overlap checks
+        horizon = self.now_us - self.char_us
+        self._txs = [tx for tx in self._txs if tx.idx < len(tx.data) or tx.end_us > horizon]
+
+    def _deliver(self, tx: _Tx, t_us: float):
+        self.now_us = t_us
+        b = tx.data[tx.idx]
+        tx.idx += 1
+        s = t_us - self.char_us
+        for o in self._txs:
+            if o is not tx and o.start_us < t_us and o.end_us > s:
+                b ^= self.rng.randrange(1, 256)
+                self.collisions += 1
+                break
+        ber = self.noise_ber
+        if ber:
+            rnd = self.rng.random
+            for bit in range(8):
+                if rnd() < ber:
+                    b ^= 1 << bit
+                    self.bit_errors += 1
+        for st in self.stations:
+            if st is not tx.sender:
+                st.on_byte(b, t_us)
+
+
+class SimNode:
+    """A SimpleSlave attached to the bus; answers after `turnaround_us`."""
+
+    def __init__(self, bus: VirtualBus, slave: SimpleSlave, turnaround_us: float = 1000.0):
+        self.bus = bus
+        self.slave = slave
+        self.turnaround_us = turnaround_us
+        self.responses = 0
+        bus.attach(self)
+
+    def on_byte(self, b: int, t_us: float):
+        resp = self.slave.feed_uart(bytes((b,)), now_us=int(t_us))
+        if resp:
+            self.responses += 1
+            self.bus.transmit(self, bytes(resp), t_us + self.turnaround_us)
+
+
+class SimSerial:
+    """pyserial-like master port on the virtual bus (write/flush/read/timeout)."""
+
+    def __init__(self, bus: VirtualBus, de_turnaround_us: float = 100.0):
+        self.bus = bus
+        self.de_turnaround_us = de_turnaround_us
+        self.timeout: Optional[float] = None
+        self.rx = bytearray()
+        self._tx_end_us = 0.0
+        bus.attach(self)
+
+    def on_byte(self, b: int, t_us: float):
+        self.rx.append(b)
+
+    def reset_input_buffer(self):
+        self.rx.clear()
+
+    def write(self, data) -> int:
+        self._tx_end_us = self.bus.transmit(self, data, self.bus.now_us + self.de_turnaround_us)
+        return len(data)
+
+    def flush(self):
+        self.bus.run_until(self._tx_end_us)
+
+    def read(self, n: int) -> bytes:
+        bus = self.bus
+        deadline = bus.now_us + (self.timeout or 0.0) * 1e6
+        while len(self.rx) < n:
+            nxt = bus.next_event_us()
+            if nxt is None or nxt > deadline:
+                bus.run_until(deadline)
+                break
+            bus.run_until(nxt)
+        out = bytes(self.rx[:n])
+        del self.rx[:n]
+        return out
+
+
+class MeasuredMaster(ModbusMaster):
+    """ModbusMaster that records per-transaction outcome and latency in bus time."""
+
+    def __init__(self, ser: SimSerial, **kw):
+        kw.setdefault("clock", ser.bus.now_s)
+        kw.setdefault("sleep", ser.bus.sleep)
+        super().__init__(ser, baudrate=ser.bus.baudrate, **kw)
+        self.latencies_us: List[float] = []
+        self.timeouts = 0
+        self.corrupt = 0
+        self.exceptions = 0
+
+    def transact(self, addr: int, pdu: bytes):
+        bus = self.ser.bus
+        self.wait_idle()  # latency starts when the request may go out
+        t0 = bus.now_us
+        try:
+            r = super().transact(addr, pdu)
+        except ModbusException:
+            self.exceptions += 1
+            raise
+        except ValueError:
+            self.corrupt += 1
+            raise
+        if r is None:
+            self.timeouts += 1
+        else:
+            self.latencies_us.append(bus.now_us - t0)
+        return r
+
+
+def attach_default_nodes(bus: VirtualBus, turnaround_us: float = 1000.0) -> Dict[str, PumpMap]:
+    """Pump, autofill and boiler nodes with their real register maps at the configured addresses."""
+    maps = {"pump": PumpMap(), "autofill": AutofillMap(), "boiler": BoilerMap()}
+    addrs = {"pump": config.bus.addr_pump, "autofill": config.bus.addr_autofill, "boiler": config.bus.addr_boiler}
+    gap = frame_gap_us(bus.baudrate)
+    for name, m in maps.items():
+        slave = SimpleSlave(addrs[name], m.read_image, m.write, gap_us=gap, input_cb=m.read_input_image, generation=m.generation)
+        SimNode(bus, slave, turnaround_us)
+    return maps
+
+
+def percentile(sorted_vals: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile: the smallest value with at least pct % of the values at or below it."""
+    if not sorted_vals:
+        return None
+    n = len(sorted_vals)
+    # pct * n first: 0.07 * 100 would round up to rank 8
+    k = max(0, min(n - 1, math.ceil(pct * n / 100.0) - 1))
+    return sorted_vals[k]
+
+
+def report(bus: VirtualBus, master: MeasuredMaster, elapsed_us: float) -> dict:
+    lat = sorted(master.latencies_us)
+    total = len(lat) + master.timeouts + master.corrupt + master.exceptions
+    secs = elapsed_us / 1e6 if elapsed_us > 0 else 0.0
+
+    def ms(v):
+        return None if v is None else round(v / 1000.0, 3)
+
+    return {
+        "baudrate": bus.baudrate,
+        "sim_seconds": round(secs, 3),
+        "transactions": total,
+        "ok": len(lat),
+        "timeouts": master.timeouts,
+        "corrupt": master.corrupt,
+        "exceptions": master.exceptions,
+        "error_rate": round((total - len(lat)) / total, 4) if total else 0.0,
+        "throughput_tps": round(len(lat) / secs, 2) if secs else 0.0,
+        "utilisation": round(bus.busy_us / elapsed_us, 4) if elapsed_us > 0 else 0.0,
+        "latency_ms": {"p50": ms(percentile(lat, 50)), "p90": ms(percentile(lat, 90)),
+                       "p99": ms(percentile(lat, 99)), "max": ms(lat[-1] if lat else None)},
+        "collisions": bus.collisions,
+        "bit_errors": bus.bit_errors,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--baud", type=int, default=config.bus.baudrate)
+    ap.add_argument("--seconds", type=float, default=60.0)
+    ap.add_argument("--noise", type=float, default=0.0, help="bit error rate")
+    ap.add_argument("--node-turnaround-ms", type=float, default=1.0)
+    ap.add_argument("--by-exception", action="store_true")
+    ap.add_argument("--brew-every-s", type=float, default=20.0, help="toggle the pump between idle and run")
+    ap.add_argument("--seed", type=int, default=1)
+    ns = ap.parse_args()
+
+    bus = VirtualBus(ns.baud, noise_ber=ns.noise, seed=ns.seed)
+    maps = attach_default_nodes(bus, ns.node_turnaround_ms * 1000.0)
+    master = MeasuredMaster(SimSerial(bus))
+
+    def toggle():
+        pump = maps["pump"]
+        pump.publish(0 if pump.reg[0] else 1, 0, True)
+        bus.call_at(bus.now_us + ns.brew_every_s * 1e6, toggle)
+
+    if ns.brew_every_s > 0:
+        bus.call_at(ns.brew_every_s * 1e6, toggle)
+    nodes = [PollNode("pump", config.bus.addr_pump), PollNode("autofill", config.bus.addr_autofill),
+             PollNode("boiler", config.bus.addr_boiler)]
+    poller = Poller(master, nodes, clock=bus.now_s, sleep=bus.sleep, by_exception=ns.by_exception)
+    end_us = ns.seconds * 1e6
+    while bus.now_us < end_us:
+        poller.step()
+    print(json.dumps(report(bus, master, bus.now_us), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+"""Passive RS485 sniffer: frames, request/response pairing and timing.
+
+Listens on a receive-only RS485 adapter (or replays a capture), cuts the byte
+stream into RTU frames with the sizing and CRC from `firmware/core/modbus_rtu.py`,
+pairs each request with its response and reports per transaction:
+- req_ms / rsp_ms: frame durations on the wire at the configured baud
+- turnaround_ms: end of request to start of response (node turnaround)
+- latency_ms: start of request to end of response
+plus bus utilisation, timeouts, exceptions and per-node latency histograms.
+
+Byte times come from the read timestamps: the last byte of each chunk is taken to
+have arrived at the timestamp and earlier bytes one character time apart. With a
+USB adapter this is only as good as its latency timer (set it to 1 ms); captures
+with per-byte timestamps (e.g. from tools/bus_sim.py) are exact.
+
+Capture files are text, one read per line: "<t_us> <hex bytes>".
+
+Usage (examples):
+  python -m tools.bus_sniffer --port /dev/ttyUSB1 --baud 115200 --record shot.cap
+  python -m tools.bus_sniffer --replay shot.cap --baud 115200 --quiet
+"""
+
+import argparse
+import collections
+import json
+import sys
+import threading
+import time
+from typing import Iterator, List, Optional, Tuple
+
+try:
+    import serial  # type: ignore
+except Exception:  # pragma: no cover
+    serial = None
+
+from firmware.common import config
+from firmware.core.modbus_rtu import CRC16_INIT, crc16_scan, crc16_update, rtu_frame_lens
+from firmware.master.modbus_master import NodeStats
+
+
+class Transaction:
+    """One request and its response (or timeout). Times in microseconds."""
+
+    __slots__ = ("addr", "func", "start_us", "req_us", "turnaround_us", "rsp_us", "latency_us", "exception", "timeout")
+
+    def __init__(self, addr: int, func: int, start_us: float, req_us: float):
+        self.addr = addr
+        self.func = func
+        self.start_us = start_us
+        self.req_us = req_us
+        self.turnaround_us = None
+        self.rsp_us = None
+        self.latency_us = None
+        self.exception = None
+        self.timeout = False
+
+    def as_dict(self) -> dict:
+        def ms(v):
+            return None if v is None else round(v / 1000.0, 3)
+
+        return {
+            "t": round(self.start_us / 1e6, 6),
+            "addr": self.addr,
+            "func": self.func,
+            "req_ms": ms(self.req_us),
+            "turnaround_ms": ms(self.turnaround_us),
+            "rsp_ms": ms(self.rsp_us),
+            "latency_ms": ms(self.latency_us),
+            "exception": self.exception,
+            "timeout": self.timeout,
+        }
+
+
+class BusSniffer:
+    """Incremental frame splitter and request/response matcher for both directions of a bus.
+
+    feed() takes whatever the port returned plus the time its last byte arrived and
+    returns the transactions completed by it. Bytes stay in one bytearray that is
+    compacted as frames are consumed; only chunk boundaries are stored for timing.
+
+    Frames with function codes the stack can't size are found by CRC scan, up to
+    SCAN_MAX bytes; longer ones are skipped as noise.
+    """
+
+    SCAN_MAX = 64
+
+    def __init__(self, baudrate: int = config.bus.baudrate, max_frame: int = 256, bits_per_char: int = 11):
+        self.char_us = bits_per_char * 1e6 / baudrate
+        self.max_frame = max_frame
+        self._buf = bytearray()
+        self._base = 0  # absolute stream index of _buf[0]
+        self._chunks = collections.deque()  # (absolute end index, t_us of last byte)
+        self._pending: Optional[Tuple[int, int, float, float]] = None  # addr, func, start_us, end_us
+        self._hunt = False
+        self._t0_us = None
+        self._t_last_us = 0.0
+        self.node_stats = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.frames = 0
+        self.bytes = 0
+        self.wire_us = 0.0
+        self.transactions = 0
+        self.timeouts = 0
+        self.exceptions = 0
+        self.orphans = 0  # responses without a matching request
+        self.resyncs = 0
+        self._window_us = self._t_last_us
+
+    def _byte_end_us(self, j: int) -> float:
+        for end, t in self._chunks:
+            if j < end:
+                return t - (end - 1 - j) * self.char_us
+        return self._t_last_us
+
+    def _frame_at(self, buf, i: int, n: int) -> Tuple[int, Optional[bool]]:
+        """(length, is_response) of a CRC-valid frame at buf[i]; length 0 = need more, -1 = no frame here."""
+        lq, lr = rtu_frame_lens(buf, i, n)
+        need = False
+        best = 0
+        for ln in ((lq,) if lq == lr else (lq, lr)):
+            if ln == 0 or n - i < ln:
+                need = True
+            elif ln > 0 and (not best or ln < best) and crc16_update(CRC16_INIT, memoryview(buf)[i:i + ln]) == 0:
+                best = ln
+        if best:
+            return best, (None if lq == lr else best == lr)
+        if need:
+            return 0, None
+        if lq < 0 and lr < 0 and 1 <= buf[i] <= 247 and buf[i + 1] < 0x80:
+            # Function we can't size: the first prefix with a zero CRC register is the frame
+            ln = crc16_scan(buf, i, n, self.SCAN_MAX)
+            if ln:
+                return ln, None
+            if n - i < self.SCAN_MAX:
+                return 0, None
+        return -1, None
+
+    def _on_frame(self, addr: int, func: int, payload0: int, start_us: float, end_us: float, is_rsp: Optional[bool], out: List[Transaction]):
+        self.frames += 1
+        self.wire_us += end_us - start_us
+        p = self._pending
+        if is_rsp is None:
+            is_rsp = p is not None and p[0] == addr and p[1] == func & 0x7F
+        if is_rsp:
+            if p is None or p[0] != addr or p[1] != func & 0x7F:
+                self.orphans += 1
+                return
+            self._pending = None
+            tx = Transaction(addr, p[1], p[2], p[3] - p[2])
+            tx.rsp_us = end_us - start_us
+            tx.turnaround_us = max(0.0, start_us - p[3])
+            tx.latency_us = end_us - p[2]
+            st = self.node_stats.get(addr)
+            if st is None:
+                st = self.node_stats[addr] = NodeStats()
+            st.requests += 1
+            if func & 0x80:
+                tx.exception = payload0
+                self.exceptions += 1
+                st.exceptions += 1
+            else:
+                st.ok += 1
+            st.record(tx.latency_us / 1e6)
+            self.transactions += 1
+            out.append(tx)
+            return
+        self._close_pending(out)
+        if addr != 0:  # broadcasts get no response
+            self._pending = (addr, func, start_us, end_us)
+
+    def _close_pending(self, out: List[Transaction]):
+        p = self._pending
+        if p is None:
+            return
+        self._pending = None
+        tx = Transaction(p[0], p[1], p[2], p[3] - p[2])
+        tx.timeout = True
+        self.timeouts += 1
+        self.transactions += 1
+        st = self.node_stats.get(p[0])
+        if st is None:
+            st = self.node_stats[p[0]] = NodeStats()
+        st.requests += 1
+        st.timeouts += 1
+        out.append(tx)
+
+    def feed(self, data, t_us: float) -> List[Transaction]:
+        out: List[Transaction] = []
+        if not data:
+            return out
+        if self._t0_us is None:
+            self._t0_us = t_us - len(data) * self.char_us
+            self._window_us = self._t0_us
+        buf = self._buf
+        buf.extend(data)
+        self.bytes += len(data)
+        self._t_last_us = t_us
+        self._chunks.append((self._base + len(buf), t_us))
+        n = len(buf)
+        i = 0
+        while n - i >= 4:
+            ln, is_rsp = self._frame_at(buf, i, n)
+            if ln == 0:
+                break
+            if ln < 0:
+                if not self._hunt:
+                    self.resyncs += 1
+                    self._hunt = True
+                i += 1
+                continue
+            self._hunt = False
+            end_us = self._byte_end_us(self._base + i + ln - 1)
+            self._on_frame(buf[i], buf[i + 1], buf[i + 2], end_us - ln * self.char_us, end_us, is_rsp, out)
+            i += ln
+        if i:
+            del buf[:i]
+            self._base += i
+        if len(buf) > self.max_frame:
+            drop = len(buf) - self.max_frame
+            del buf[:drop]
+            self._base += drop
+            self.resyncs += 1
+        chunks = self._chunks
+        while chunks and chunks[0][0] <= self._base:
+            chunks.popleft()
+        return out
+
+    def flush(self) -> List[Transaction]:
+        """End of capture: a request still waiting for its response counts as a timeout."""
+        out: List[Transaction] = []
+        self._close_pending(out)
+        return out
+
+    def stats(self, now_us: Optional[float] = None, reset: bool = False) -> dict:
+        """Counters since the last reset; utilisation is wire time over that window."""
+        now_us = self._t_last_us if now_us is None else now_us
+        span = now_us - self._window_us
+        out = {
+            "frames": self.frames,
+            "bytes": self.bytes,
+            "transactions": self.transactions,
+            "timeouts": self.timeouts,
+            "exceptions": self.exceptions,
+            "orphans": self.orphans,
+            "resyncs": self.resyncs,
+            "utilisation": round(self.wire_us / span, 4) if span > 0 else 0.0,
+            "nodes": {str(a): st.as_dict() for a, st in sorted(self.node_stats.items())},
+        }
+        if reset:
+            self.node_stats = {}
+            self.reset_stats()
+            self._window_us = now_us
+        return out
+
+
+def read_capture(path: str) -> Iterator[Tuple[float, bytes]]:
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            t, _, hexdata = line.partition(" ")
+            yield float(t), bytes.fromhex(hexdata)
+
+
+def write_capture_line(f, t_us: float, data: bytes):
+    f.write("%d %s\n" % (t_us, data.hex()))
+
+
+def _reader(ser, q: collections.deque, stop: threading.Event):
+    # Keeps the port drained even while the main thread is busy printing
+    while not stop.is_set():
+        data = ser.read(max(1, ser.in_waiting))
+        if data:
+            q.append((time.perf_counter_ns() // 1000, data))
+
+
+def _emit(obj: dict):
+    sys.stdout.write(json.dumps(obj) + "\n")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--port")
+    src.add_argument("--replay", help="capture file to analyse instead of a port")
+    ap.add_argument("--baud", type=int, default=config.bus.baudrate)
+    ap.add_argument("--record", help="also write the raw reads to this capture file")
+    ap.add_argument("--interval", type=float, default=1.0, help="seconds between stats lines")
+    ap.add_argument("--quiet", action="store_true", help="stats lines only, no per-transaction output")
+    ns = ap.parse_args()
+
+    sniffer = BusSniffer(ns.baud)
+    rec = open(ns.record, "w") if ns.record else None
+    next_stats = [None]
+
+    def handle(t_us: float, data: bytes):
+        if rec is not None:
+            write_capture_line(rec, t_us, data)
+        for tx in sniffer.feed(data, t_us):
+            if not ns.quiet:
+                _emit({"txn": tx.as_dict()})
+        if next_stats[0] is None:
+            next_stats[0] = t_us + ns.interval * 1e6
+        elif t_us >= next_stats[0]:
+            _emit({"stats": sniffer.stats(t_us, reset=True)})
+            next_stats[0] = t_us + ns.interval * 1e6
+
+    try:
+        if ns.replay:
+            for t_us, data in read_capture(ns.replay):
+                handle(t_us, data)
+        else:
+            if serial is None:
+                print("pyserial not installed", file=sys.stderr)
+                sys.exit(2)
+            ser = serial.Serial(ns.port, baudrate=ns.baud, timeout=0.05)
+            q = collections.deque()
+            stop = threading.Event()
+            th = threading.Thread(target=_reader, args=(ser, q, stop), daemon=True)
+            th.start()
+            try:
+                while True:
+                    if q:
+                        handle(*q.popleft())
+                    else:
+                        time.sleep(0.002)
+                        sys.stdout.flush()
+            except KeyboardInterrupt:  # pragma: no cover
+                stop.set()
+        for tx in sniffer.flush():
+            if not ns.quiet:
+                _emit({"txn": tx.as_dict()})
+        _emit({"stats": sniffer.stats()})
+    finally:
+        if rec is not None:
+            rec.close()
+
+
+if __name__ == "__main__":
+    main()
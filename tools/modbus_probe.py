@@ -1,9 +1,15 @@
 """Quick Modbus probe tool.
 
 Sends a single Read Holding Registers to a node and prints the values.
+With --diag, prints the node's bus diagnostics counters instead. --detect finds the
+rate each core node answers at; --switch-baud moves all core nodes and the master to a
+new rate.
 
 Usage examples:
   python tools/modbus_probe.py --port /dev/tty.usbserial-1101 --addr 1 --start 0 --count 4
+  python tools/modbus_probe.py --port /dev/tty.usbserial-1101 --addr 1 --diag
+  python tools/modbus_probe.py --port /dev/tty.usbserial-1101 --detect
+  python tools/modbus_probe.py --port /dev/tty.usbserial-1101 --switch-baud 115200
 """
 
 import argparse
@@ -14,35 +20,52 @@ try:
 except Exception:  # pragma: no cover
     serial = None
 
-from firmware.master.modbus_master import build_read_holding, parse_read_holding_response
+from firmware.master.modbus_master import ModbusMaster
+from firmware.common import config
 
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--port", required=True)
-    ap.add_argument("--addr", type=int, required=True)
+    ap.add_argument("--addr", type=int)
     ap.add_argument("--start", type=int, default=0)
     ap.add_argument("--count", type=int, default=4)
-    ap.add_argument("--baud", type=int, default=9600)
+    ap.add_argument("--baud", type=int, default=config.bus.baudrate)
     ap.add_argument("--timeout", type=float, default=0.4)
+    ap.add_argument("--diag", action="store_true", help="read the node's bus diagnostics counters")
+    ap.add_argument("--detect", action="store_true", help="probe the core nodes at every supported rate")
+    ap.add_argument("--switch-baud", type=int, choices=config.bus.baudrates, help="move the core nodes to this rate")
     ns = ap.parse_args()
+    if ns.addr is None and not (ns.detect or ns.switch_baud):
+        ap.error("--addr is required")
     if serial is None:
         print("pyserial not installed", file=sys.stderr)
         sys.exit(2)
     ser = serial.Serial(ns.port, baudrate=ns.baud, timeout=ns.timeout)
-    req = build_read_holding(ns.addr, ns.start, ns.count)
-    ser.write(req)
-    ser.flush()
-    resp = ser.read(256)
-    if not resp:
-        print("no response")
-        sys.exit(1)
+    master = ModbusMaster(ser, baudrate=ns.baud, timeout_s=ns.timeout)
+    nodes = (config.bus.addr_pump, config.bus.addr_autofill, config.bus.addr_boiler)
+    if ns.detect:
+        print(f"rates={master.detect_baudrate(nodes)}")
+        return
+    if ns.switch_baud:
+        res = master.switch_baudrate(nodes, ns.switch_baud)
+        if res is None:
+            print(f"not switched: some node did not report {master.baudrate} baud")
+            sys.exit(1)
+        print(f"baud={ns.switch_baud} answered={res}")
+        sys.exit(0 if all(res.values()) else 1)
     try:
-        addr, vals = parse_read_holding_response(resp)
+        if ns.diag:
+            vals = master.read_diag_counters(ns.addr)
+        else:
+            vals = master.read_holding(ns.addr, ns.start, ns.count)
     except Exception as e:  # pragma: no cover
         print(f"bad response: {e}")
         sys.exit(3)
-    print(f"addr={addr} vals={vals}")
+    if vals is None:
+        print("no response")
+        sys.exit(1)
+    print(f"addr={ns.addr} vals={vals}")
 
 
 if __name__ == "__main__":
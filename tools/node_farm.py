@@ -0,0 +1,409 @@
+"""Modbus node emulator farm for load-testing the master side.
+
+Spawns many emulated nodes, each running the real Boiler/Pump/Autofill controller
+with a simulated HAL behind a `SimpleSlave` and the real register map, grouped
+onto buses. Each bus is exposed as a pseudo-terminal (point pyserial, the
+aggregator CLI or the poller at the printed /dev/pts path) or a local TCP socket
+(`socket://127.0.0.1:PORT`, for pyserial's serial_for_url).
+
+A script drives input changes (brew switch, probe, pressure) over time; the
+built-in one cycles every node through its active and idle states.
+
+With --drive, an internal load driver polls every node through
+`aggregator_modbus_cli.poll_once`/`ModbusMaster`, one thread per bus, and prints
+sustained polls/s, latency distribution and CPU time per emulated node.
+
+Usage (examples):
+  python -m tools.node_farm --nodes 48 --buses 4              # serve until Ctrl-C
+  python -m tools.node_farm --nodes 48 --buses 4 --drive --seconds 30
+"""
+
+import argparse
+import json
+import os
+import select
+import socket
+import sys
+import threading
+import time
+from typing import List, Optional
+
+try:
+    import termios
+    import tty
+except ImportError:  # pragma: no cover - not on Windows
+    termios = None
+    tty = None
+
+from firmware.core.autofill_controller import AutofillController
+from firmware.core.boiler_controller import BoilerController
+from firmware.core.pump_controller import PumpController
+from firmware.core.modbus_maps import PumpMap, AutofillMap, BoilerMap
+from firmware.core.modbus_rtu import SimpleSlave
+from firmware.core.modbus_schema import NODES
+from firmware.master.aggregator_modbus_cli import poll_once
+from firmware.master.modbus_master import ModbusMaster
+from tools.bus_sim import percentile
+
+KINDS = ("pump", "autofill", "boiler")
+
+
+def _cpu_time() -> float:
+    try:
+        return time.thread_time()
+    except (AttributeError, OSError):  # pragma: no cover
+        return time.perf_counter()
+
+
+class SimHAL:
+    """Actuator mirror plus scripted sensor inputs."""
+
+    def __init__(self):
+        self.heater_state = False
+        self.fill_valve_state = False
+        self.pump_state = False
+        self.brew = False
+        self.wet = True
+        self.p_bar = 1.0
+        self.tank_ok = True
+
+    def heater(self, on: bool):
+        self.heater_state = bool(on)
+
+    def fill_valve(self, on: bool):
+        self.fill_valve_state = bool(on)
+
+    def pump(self, on: bool):
+        self.pump_state = bool(on)
+
+    def brew_switch(self) -> bool:
+        return self.brew
+
+    def probe_wet(self) -> bool:
+        return self.wet
+
+    def pressure_bar(self) -> float:
+        return self.p_bar
+
+
+class EmulatedNode:
+    def __init__(self, kind: str, addr: int):
+        self.kind = kind
+        self.addr = addr
+        self.hal = SimHAL()
+        self.schema = NODES[kind]
+        if kind == "pump":
+            self.map = PumpMap()
+            self.ctrl = PumpController(self.hal)
+        elif kind == "autofill":
+            self.map = AutofillMap()
+            self.ctrl = AutofillController(self.hal)
+        else:
+            self.map = BoilerMap()
+            self.ctrl = BoilerController(self.hal)
+        m = self.map
+        self.slave = SimpleSlave(addr, m.read_image, m.write, input_cb=m.read_input_image, generation=m.generation)
+        self.cpu_s = 0.0
+        self.requests = 0
+
+    def step(self, now_s: float):
+        t = _cpu_time()
+        hal = self.hal
+        if self.kind == "pump":
+            state, reason = self.ctrl.tick(now_s=now_s, brew_switch=hal.brew, tank_ok=hal.tank_ok)
+            self.map.publish(self.schema.status.encode(state), self.schema.reason.encode(reason), hal.tank_ok)
+        elif self.kind == "autofill":
+            state, reason = self.ctrl.tick(now_s=now_s, probe_wet=hal.wet, tank_ok=hal.tank_ok)
+            self.map.publish(self.schema.status.encode(state), self.schema.reason.encode(reason), hal.tank_ok)
+        else:
+            state, reason = self.ctrl.tick(now_s=now_s, p_bar=hal.p_bar, autofill_active=False)
+            self.map.publish(self.schema.status.encode(state), self.schema.reason.encode(reason))
+            self.map.inp[0] = self.schema.inputs["pressure_bar"].encode(hal.p_bar)
+        self.cpu_s += _cpu_time() - t
+
+    def feed(self, data: bytes) -> Optional[bytes]:
+        t = _cpu_time()
+        resp = self.slave.feed_uart(data)
+        if resp:
+            resp = bytes(resp)
+            self.requests += 1
+        self.cpu_s += _cpu_time() - t
+        return resp
+
+
+def default_script(nodes: List[EmulatedNode], period_s: float = 20.0):
+    """Events (t_s, node_index, attr, value): each node spends half of every period active,
+    phases staggered across the farm."""
+    events = []
+    n = max(1, len(nodes))
+    for i, node in enumerate(nodes):
+        phase = period_s * i / n
+        active = {"pump": ("brew", True, False), "autofill": ("wet", False, True), "boiler": ("p_bar", 0.8, 1.3)}[node.kind]
+        attr, on, off = active
+        events.append((phase, i, attr, on))
+        events.append((phase + period_s / 2, i, attr, off))
+    return sorted(events, key=lambda e: e[0]), period_s
+
+
+class FarmBus:
+    """Hosts several emulated nodes on one shared byte stream (pty or TCP)."""
+
+    def __init__(self, nodes: List[EmulatedNode], transport: str = "pty"):
+        self.nodes = nodes
+        self.lock = threading.Lock()
+        self._conn = None
+        if transport == "pty":
+            self._fd, self._slave_fd = os.openpty()
+            tty.setraw(self._slave_fd)
+            self.path = os.ttyname(self._slave_fd)
+            self._sock = None
+        else:
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._sock.bind(("127.0.0.1", 0))
+            self._sock.listen(1)
+            self.path = "socket://127.0.0.1:%d" % self._sock.getsockname()[1]
+            self._fd = None
+
+    def _read(self, timeout_s: float) -> bytes:
+        if self._sock is None:
+            r, _, _ = select.select([self._fd], [], [], timeout_s)
+            return os.read(self._fd, 512) if r else b""
+        if self._conn is None:
+            r, _, _ = select.select([self._sock], [], [], timeout_s)
+            if r:
+                self._conn, _ = self._sock.accept()
+            return b""
+        r, _, _ = select.select([self._conn], [], [], timeout_s)
+        if not r:
+            return b""
+        data = self._conn.recv(512)
+        if not data:
+            self._conn.close()
+            self._conn = None
+        return data
+
+    def _write(self, data: bytes):
+        if self._sock is None:
+            os.write(self._fd, data)
+        elif self._conn is not None:
+            self._conn.sendall(data)
+
+    def serve(self, stop: threading.Event):
+        while not stop.is_set():
+            data = self._read(0.05)
+            if not data:
+                continue
+            with self.lock:
+                for node in self.nodes:
+                    resp = node.feed(data)
+                    if resp:
+                        self._write(resp)
+
+    def close(self):
+        for fd in (self._fd, getattr(self, "_slave_fd", None)):
+            if fd is not None:
+                os.close(fd)
+        if self._conn is not None:
+            self._conn.close()
+        if self._sock is not None:
+            self._sock.close()
+
+
+class Farm:
+    def __init__(self, n_nodes: int, n_buses: int = 1, transport: str = "pty"):
+        per_bus = (n_nodes + n_buses - 1) // n_buses
+        if per_bus > 247:
+            raise ValueError("too many nodes per bus")
+        self.nodes = [EmulatedNode(KINDS[i % 3], i % per_bus + 1) for i in range(n_nodes)]
+        self.buses = [FarmBus(self.nodes[b * per_bus:(b + 1) * per_bus], transport) for b in range(n_buses)]
+        self.buses = [b for b in self.buses if b.nodes]
+        self.script, self.script_period_s = default_script(self.nodes)
+        self.tick_s = 0.05
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self.t0 = 0.0
+
+    def _ticker(self):
+        bus_of = {}
+        for b in self.buses:
+            for node in b.nodes:
+                bus_of[id(node)] = b
+        k = 0
+        cycle = 0
+        while not self._stop.is_set():
+            now = time.monotonic() - self.t0
+            while k < len(self.script) and self.script[k][0] + cycle * self.script_period_s <= now:
+                _, i, attr, value = self.script[k]
+                setattr(self.nodes[i].hal, attr, value)
+                k += 1
+                if k == len(self.script):
+                    k = 0
+                    cycle += 1
+            for b in self.buses:
+                with b.lock:
+                    for node in b.nodes:
+                        node.step(now)
+            self._stop.wait(self.tick_s)
+
+    def start(self):
+        self.t0 = time.monotonic()
+        self._threads = [threading.Thread(target=b.serve, args=(self._stop,), daemon=True) for b in self.buses]
+        self._threads.append(threading.Thread(target=self._ticker, daemon=True))
+        for t in self._threads:
+            t.start()
+
+    def stop(self):
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout=1.0)
+        for b in self.buses:
+            b.close()
+
+    def node_stats(self, elapsed_s: float):
+        return [{"kind": n.kind, "addr": n.addr, "requests": n.requests,
+                 "cpu_ms_per_s": round(1000.0 * n.cpu_s / elapsed_s, 3) if elapsed_s else 0.0} for n in self.nodes]
+
+
+class FdPort:
+    """Minimal pyserial-like port over a pty path or socket:// URL (no pyserial needed)."""
+
+    def __init__(self, path: str):
+        self.timeout: Optional[float] = None
+        if path.startswith("socket://"):
+            host, port = path[len("socket://"):].rsplit(":", 1)
+            self._sock = socket.create_connection((host, int(port)))
+            self._fd = self._sock.fileno()
+        else:
+            self._sock = None
+            self._fd = os.open(path, os.O_RDWR | os.O_NOCTTY)
+            tty.setraw(self._fd)
+        self._rx = bytearray()
+
+    def reset_input_buffer(self):
+        while True:
+            r, _, _ = select.select([self._fd], [], [], 0)
+            if not r or not self._recv():
+                break
+        self._rx.clear()
+
+    def _recv(self) -> bytes:
+        data = self._sock.recv(512) if self._sock is not None else os.read(self._fd, 512)
+        self._rx.extend(data)
+        return data
+
+    def write(self, data) -> int:
+        if self._sock is not None:
+            self._sock.sendall(data)
+        else:
+            os.write(self._fd, data)
+        return len(data)
+
+    def read(self, n: int) -> bytes:
+        deadline = time.monotonic() + (self.timeout or 0.0)
+        while len(self._rx) < n:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            r, _, _ = select.select([self._fd], [], [], left)
+            if r and not self._recv():
+                break
+        out = bytes(self._rx[:n])
+        del self._rx[:n]
+        return out
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+        else:
+            os.close(self._fd)
+
+
+def drive(farm: Farm, seconds: float, timeout_s: float = 0.2) -> dict:
+    """Poll every node round robin, one thread per bus, and report sustained load figures."""
+    results = []
+    lock = threading.Lock()
+
+    def run_bus(bus: FarmBus):
+        port = FdPort(bus.path)
+        master = ModbusMaster(port, timeout_s=timeout_s)
+        lat, timeouts, errors = [], 0, 0
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            for node in bus.nodes:
+                t = time.perf_counter()
+                try:
+                    vals = poll_once(master, node.addr, 0, 4)
+                except Exception:
+                    errors += 1
+                    continue
+                if vals is None:
+                    timeouts += 1
+                else:
+                    lat.append(time.perf_counter() - t)
+        port.close()
+        with lock:
+            results.append((lat, timeouts, errors))
+
+    threads = [threading.Thread(target=run_bus, args=(b,)) for b in farm.buses]
+    t0 = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - t0
+    lat = sorted(x for r in results for x in r[0])
+
+    def ms(v):
+        return None if v is None else round(v * 1000.0, 3)
+
+    return {
+        "nodes": len(farm.nodes),
+        "buses": len(farm.buses),
+        "seconds": round(elapsed, 3),
+        "polls": len(lat),
+        "polls_per_s": round(len(lat) / elapsed, 1) if elapsed else 0.0,
+        "timeouts": sum(r[1] for r in results),
+        "errors": sum(r[2] for r in results),
+        "latency_ms": {"p50": ms(percentile(lat, 50)), "p90": ms(percentile(lat, 90)),
+                       "p99": ms(percentile(lat, 99)), "max": ms(lat[-1] if lat else None)},
+        "node_cpu": farm.node_stats(elapsed),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--nodes", type=int, default=24)
+    ap.add_argument("--buses", type=int, default=1)
+    ap.add_argument("--transport", choices=("pty", "tcp"), default="pty")
+    ap.add_argument("--script", help="JSON list of {t, node, attr, value} events (replaces the default)")
+    ap.add_argument("--script-period", type=float, default=20.0, help="seconds before the script repeats")
+    ap.add_argument("--drive", action="store_true", help="run the internal load driver and print a report")
+    ap.add_argument("--seconds", type=float, default=30.0)
+    ns = ap.parse_args()
+    if ns.transport == "pty" and tty is None:
+        print("pty transport needs a POSIX system; use --transport tcp", file=sys.stderr)
+        sys.exit(2)
+    farm = Farm(ns.nodes, ns.buses, ns.transport)
+    if ns.script:
+        with open(ns.script) as f:
+            farm.script = sorted(((e["t"], e["node"], e["attr"], e["value"]) for e in json.load(f)), key=lambda e: e[0])
+        farm.script_period_s = ns.script_period
+    farm.start()
+    try:
+        if ns.drive:
+            print(json.dumps(drive(farm, ns.seconds), indent=2))
+        else:
+            for b in farm.buses:
+                print(json.dumps({"port": b.path, "addrs": [n.addr for n in b.nodes]}))
+            sys.stdout.flush()
+            while True:
+                time.sleep(1.0)
+    except KeyboardInterrupt:  # pragma: no cover
+        pass
+    finally:
+        farm.stop()
+
+
+if __name__ == "__main__":
+    main()